@@ -1,13 +1,18 @@
 import os
 import sys
+import time
 
-from PyQt6.QtWidgets import QApplication
 
-from boardy3.database.database_manager import DatabaseManager
-from boardy3.ui.main_window import MainWindow
+def launch_app():
+    started = time.perf_counter()
 
+    # Qt is only imported for the GUI so the command line interface
+    # starts without it
+    from PyQt6.QtWidgets import QApplication
+
+    from boardy3.database.database_manager import DatabaseManager
+    from boardy3.ui.main_window import MainWindow
 
-def launch_app():
     # Add dll to PATH before running code
     dll_directory = os.path.abspath("bin")
     os.environ["PATH"] = dll_directory + os.pathsep + os.environ["PATH"]
@@ -15,7 +20,12 @@ def launch_app():
     app = QApplication(sys.argv)
 
     db_manager = DatabaseManager()
-    main_win = MainWindow(db_manager)
+    main_win = MainWindow(db_manager, started)
     main_win.show()
 
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+
+    # Let queued writes finish before exiting
+    db_manager.close()
+
+    sys.exit(exit_code)
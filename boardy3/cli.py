@@ -0,0 +1,504 @@
+"""
+Command line interface for bulk operations without the GUI.
+
+Run with `python -m boardy3 <command>`. Qt is never imported, and the
+heavier modules only once the command that needs them runs.
+
+Progress goes to stderr as text, or with --json every progress event
+and result is written to stdout as one JSON object per line.
+"""
+import argparse
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from typing import TYPE_CHECKING, Any, TextIO, TypeVar
+
+if TYPE_CHECKING:
+    from boardy3.database.database_manager import DatabaseManager
+    from boardy3.database.models import ImageRecord
+    from boardy3.database.search import SearchQuery
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Records fetched per query when walking a search result
+RECORD_BATCH_SIZE = 500
+# Items queued per worker, so huge inputs are not all submitted at once
+QUEUED_PER_JOB = 4
+DEFAULT_JOBS = min(os.cpu_count() or 1, 8)
+
+EXIT_OK = 0
+# Some items failed or did not verify
+EXIT_PROBLEMS = 1
+
+
+class Progress:
+    """
+    Reports the items of a command as they finish.
+
+    Item statuses are counted for the closing summary. Statuses listed
+    in problems make the command exit with EXIT_PROBLEMS.
+    """
+
+    def __init__(
+            self,
+            command: str,
+            as_json: bool,
+            problems: Iterable[str] = ("failed",),
+            out: TextIO | None = None,
+            err: TextIO | None = None
+    ) -> None:
+        self.command = command
+        self.as_json = as_json
+        self.problems = frozenset(problems)
+        self.out = out or sys.stdout
+        self.err = err or sys.stderr
+
+        self.total: int | None = None
+        self.done = 0
+        self.counts: dict[str, int] = {}
+        self.started = time.perf_counter()
+
+
+    def item(self, source: Any, status: str, error: str | None = None) -> None:
+        self.done += 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+
+        if self.as_json:
+            self.emit({
+                "event": "item", "command": self.command,
+                "done": self.done, "total": self.total,
+                "source": source, "status": status, "error": error
+            })
+        elif status in self.problems:
+            total = self.total if self.total is not None else "?"
+            message = f"[{self.done}/{total}] {status}: {source}"
+            print(f"{message} ({error})" if error else message, file=self.err)
+
+
+    def summary(self) -> int:
+        elapsed = time.perf_counter() - self.started
+        if self.as_json:
+            self.emit({
+                "event": "summary", "command": self.command,
+                "done": self.done, "counts": self.counts,
+                "elapsed": round(elapsed, 3)
+            })
+        else:
+            counts = ", ".join(f"{count} {status}" for status, count in sorted(self.counts.items()))
+            print(f"{self.command}: {self.done} items in {elapsed:.1f}s ({counts or 'nothing to do'})", file=self.err)
+
+        if any(self.counts.get(status) for status in self.problems):
+            return EXIT_PROBLEMS
+        return EXIT_OK
+
+
+    def emit(self, event: dict[str, Any]) -> None:
+        print(json.dumps(event), file=self.out, flush=True)
+
+
+def run_parallel(
+        items: Iterable[T],
+        function: Callable[[T], R],
+        jobs: int
+) -> Iterator[R]:
+    """
+    Apply function to every item on up to jobs threads and yield the
+    results as they finish. Items are consumed lazily, so work starts
+    while a directory is still being scanned.
+    """
+    if jobs <= 1:
+        yield from map(function, items)
+        return
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending: set[Future] = set()
+        for item in items:
+            pending.add(executor.submit(function, item))
+            if len(pending) >= jobs * QUEUED_PER_JOB:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield future.result()
+
+        for future in pending:
+            yield future.result()
+
+
+def iter_records(
+        db_manager: "DatabaseManager",
+        query: "SearchQuery",
+        offset: int = 0,
+        limit: int | None = None
+) -> Iterator["ImageRecord"]:
+    """Yield the records of a search in result order."""
+    result_ids = db_manager.get_result_ids(query)
+    end = len(result_ids) if limit is None else min(offset + limit, len(result_ids))
+
+    for start in range(offset, end, RECORD_BATCH_SIZE):
+        ids = result_ids[start:min(start + RECORD_BATCH_SIZE, end)]
+        yield from db_manager.get_image_records(list(ids))
+
+
+def read_lines(sources: list[str]) -> Iterator[str]:
+    """
+    Yield the given arguments, replacing "-" with the lines of stdin.
+    Blank lines are skipped.
+    """
+    for source in sources:
+        lines = sys.stdin if source == "-" else (source,)
+        for line in lines:
+            if line.strip():
+                yield line.strip()
+
+
+def build_query(args: argparse.Namespace) -> "SearchQuery":
+    from boardy3.database.search import SearchQuery
+
+    is_video = {"all": None, "images": False, "videos": True}[args.type]
+    return SearchQuery(
+        tags=tuple(args.tags),
+        sort=args.sort,
+        is_video=is_video,
+        mime_type=args.mime_type,
+        min_width=args.min_width,
+        min_height=args.min_height
+    )
+
+
+def cmd_import(db_manager: "DatabaseManager", args: argparse.Namespace) -> int:
+    from boardy3.database.importer import find_files, import_file
+
+    def find_paths() -> Iterator[str]:
+        for path in args.paths:
+            if os.path.isdir(path):
+                yield from find_files(path)
+            else:
+                yield path
+
+    progress = Progress("import", args.json, out=args.out)
+    with db_manager.storage_profile_scope(args.profile):
+        for result in run_parallel(
+                find_paths(),
+                lambda path: import_file(db_manager, path, args.tag, videos=not args.no_videos, mode=args.mode),
+                args.jobs
+        ):
+            progress.item(*result)
+
+    return progress.summary()
+
+
+def cmd_import_urls(db_manager: "DatabaseManager", args: argparse.Namespace) -> int:
+    from boardy3.database.importer import create_session, import_url
+
+    # One session is shared so the download rate limit applies to all
+    # threads together
+    session = create_session()
+
+    progress = Progress("import-urls", args.json, out=args.out)
+    with db_manager.storage_profile_scope(args.profile):
+        for result in run_parallel(
+                read_lines(args.urls),
+                lambda url: import_url(db_manager, session, url, args.tag),
+                args.jobs
+        ):
+            progress.item(*result)
+
+    return progress.summary()
+
+
+def cmd_search(db_manager: "DatabaseManager", args: argparse.Namespace) -> int:
+    for record in iter_records(db_manager, build_query(args), args.offset, args.limit):
+        path = db_manager.get_image_path(record.filename)
+        if args.json:
+            print(json.dumps({
+                "id": record.id,
+                "filename": record.filename,
+                "path": path,
+                "is_video": record.is_video,
+                "width": record.width,
+                "height": record.height
+            }), file=args.out)
+        else:
+            # The id comes first so the output can be piped into `tag -`
+            print(f"{record.id}\t{path}", file=args.out)
+
+    return EXIT_OK
+
+
+def cmd_tag(db_manager: "DatabaseManager", args: argparse.Namespace) -> int:
+    from boardy3.database.exceptions import DatabaseItemDoesNotExist
+
+    if not args.add and not args.remove:
+        print("tag: nothing to do, give --add or --remove.", file=sys.stderr)
+        return EXIT_PROBLEMS
+
+    tags_to_add = [
+        db_manager.get_tag_by_name(name) or db_manager.add_tag(name)
+        for name in args.add
+    ]
+    tag_ids_to_remove = [
+        tag.id for name in args.remove
+        if (tag := db_manager.get_tag_by_name(name)) is not None
+    ]
+
+    progress = Progress("tag", args.json, out=args.out)
+    for line in read_lines(args.ids):
+        # Lines of `search` output start with the image id
+        source = str(json.loads(line)["id"]) if line.startswith("{") else line.split()[0]
+        try:
+            image_id = int(source)
+            if db_manager.get_image_record(image_id) is None:
+                raise DatabaseItemDoesNotExist(f"Image id <{image_id}> does not exist.")
+
+            for tag in tags_to_add:
+                db_manager.add_tag_to_image(tag, image_id)
+            if tag_ids_to_remove:
+                db_manager.remove_tags_from_image(tag_ids_to_remove, image_id)
+        except (ValueError, DatabaseItemDoesNotExist) as e:
+            progress.item(source, "failed", str(e))
+        else:
+            progress.item(image_id, "tagged")
+
+    return progress.summary()
+
+
+def cmd_export(db_manager: "DatabaseManager", args: argparse.Namespace) -> int:
+    os.makedirs(args.destination, exist_ok=True)
+
+    def export(record: "ImageRecord") -> tuple[str, str, str | None]:
+        source = db_manager.get_image_path(record.filename)
+        destination = os.path.join(args.destination, record.filename)
+        packed = db_manager.is_packed(record.filename)
+        try:
+            # Files are named by their content, so an existing file with
+            # the same name and size is the same file
+            if os.path.exists(destination) and os.path.getsize(destination) == (
+                    len(db_manager.read_image_data(record.filename)) if packed
+                    else os.path.getsize(source)
+            ):
+                return source, "exists", None
+            if packed:
+                with open(destination, "wb") as outfile:
+                    outfile.write(db_manager.read_image_data(record.filename))
+            else:
+                shutil.copy2(source, destination)
+        except OSError as e:
+            return source, "failed", str(e)
+        return source, "exported", None
+
+    progress = Progress("export", args.json, out=args.out)
+    for result in run_parallel(
+            iter_records(db_manager, build_query(args), limit=args.limit),
+            export,
+            args.jobs
+    ):
+        progress.item(*result)
+
+    return progress.summary()
+
+
+def cmd_verify(db_manager: "DatabaseManager", args: argparse.Namespace) -> int:
+    from boardy3.database.search import SearchQuery
+
+    def verify(record: "ImageRecord") -> tuple[int, str, str | None]:
+        path = db_manager.get_image_path(record.filename)
+        packed = db_manager.is_packed(record.filename)
+        if not packed and not os.path.isfile(path):
+            return record.id, "missing", path
+
+        if args.hash:
+            # Files are named by the hex sha256 of their content
+            digest = record.filename[:64]
+            if hashlib.sha256(db_manager.read_image_data(record.filename)).hexdigest() != digest:
+                return record.id, "corrupt", path
+
+        # Stills fall back to the original, videos cannot be shown without
+        if record.is_video and not os.path.isfile(db_manager.get_thumbnail_path(record.filename)):
+            return record.id, "missing_thumbnail", path
+
+        return record.id, "ok", None
+
+    progress = Progress(
+        "verify", args.json, problems=("missing", "corrupt", "missing_thumbnail"),
+        out=args.out
+    )
+    progress.total = db_manager.get_images_count()
+    for result in run_parallel(iter_records(db_manager, SearchQuery()), verify, args.jobs):
+        progress.item(*result)
+
+    return progress.summary()
+
+
+def cmd_serve(db_manager: "DatabaseManager", args: argparse.Namespace) -> int:
+    from boardy3.server import serve
+
+    serve(
+        db_manager, args.host, args.port, args.workers,
+        on_ready=lambda url: print(f"serve: browsing the library at {url}, Ctrl+C to stop", file=sys.stderr)
+    )
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from boardy3.database.search import DEFAULT_SORT, SORT_ORDERS
+    from boardy3.database.storage import STORAGE_PROFILES
+    from boardy3.database.transfer import IMPORT_MODES
+    from boardy3.server import DEFAULT_HOST, DEFAULT_PORT
+
+    parser = argparse.ArgumentParser(
+        prog="boardy3",
+        description="Manage a Boardy3 library without the GUI."
+    )
+    parser.add_argument(
+        "-C", "--directory",
+        help="run in DIRECTORY, the folder holding the instance and db folders"
+    )
+    parser.add_argument(
+        "--json", action="store_true",
+        help="write progress and results to stdout as JSON lines"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="also show the logs")
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    def add_jobs(subparser: argparse.ArgumentParser) -> None:
+        subparser.add_argument(
+            "-j", "--jobs", type=int, default=DEFAULT_JOBS,
+            help=f"number of files processed at once (default: {DEFAULT_JOBS})"
+        )
+
+    def add_import_options(subparser: argparse.ArgumentParser) -> None:
+        subparser.add_argument(
+            "-t", "--tag", action="append", default=[],
+            help="tag every imported image, may be repeated"
+        )
+        subparser.add_argument(
+            "--profile", choices=sorted(STORAGE_PROFILES), default="bulk-import",
+            help="storage profile used during the import (default: bulk-import)"
+        )
+        add_jobs(subparser)
+
+    def add_search_options(subparser: argparse.ArgumentParser) -> None:
+        subparser.add_argument("tags", nargs="*", help="tags every result must have")
+        subparser.add_argument("--sort", choices=list(SORT_ORDERS), default=DEFAULT_SORT)
+        subparser.add_argument("--type", choices=["all", "images", "videos"], default="all")
+        subparser.add_argument("--mime-type", help="MIME type prefix such as image/png")
+        subparser.add_argument("--min-width", type=int)
+        subparser.add_argument("--min-height", type=int)
+        subparser.add_argument("--limit", type=int, help="return at most LIMIT results")
+
+    import_parser = subparsers.add_parser(
+        "import", help="import files and directories",
+        description="Import image and video files. Directories are searched recursively."
+    )
+    import_parser.add_argument("paths", nargs="+", help="files or directories")
+    import_parser.add_argument("--no-videos", action="store_true", help="only import images")
+    import_parser.add_argument(
+        "--mode", choices=IMPORT_MODES,
+        help="how files are stored: copied, reflinked, hardlinked or moved into the library, "
+             "falling back to a copy where the filesystem cannot (default: $BOARDY3_IMPORT_MODE or copy)"
+    )
+    add_import_options(import_parser)
+    import_parser.set_defaults(handler=cmd_import)
+
+    urls_parser = subparsers.add_parser(
+        "import-urls", help="download and import images",
+        description="Download and import images. Use - to read urls from stdin, one per line."
+    )
+    urls_parser.add_argument("urls", nargs="+", help="image urls, or -")
+    add_import_options(urls_parser)
+    urls_parser.set_defaults(handler=cmd_import_urls)
+
+    search_parser = subparsers.add_parser(
+        "search", help="list matching images",
+        description="Print the id and path of every matching image."
+    )
+    add_search_options(search_parser)
+    search_parser.add_argument("--offset", type=int, default=0, help="skip the first OFFSET results")
+    search_parser.set_defaults(handler=cmd_search)
+
+    tag_parser = subparsers.add_parser(
+        "tag", help="add or remove tags",
+        description="Add or remove tags of images. Use - to read ids from stdin, such as the output of search."
+    )
+    tag_parser.add_argument("ids", nargs="+", help="image ids, or -")
+    tag_parser.add_argument("-a", "--add", nargs="+", default=[], metavar="TAG")
+    tag_parser.add_argument("-r", "--remove", nargs="+", default=[], metavar="TAG")
+    tag_parser.set_defaults(handler=cmd_tag)
+
+    export_parser = subparsers.add_parser(
+        "export", help="copy matching images to a directory",
+        description="Copy the files of matching images into a directory."
+    )
+    export_parser.add_argument("destination", help="directory the files are copied to")
+    add_search_options(export_parser)
+    add_jobs(export_parser)
+    export_parser.set_defaults(handler=cmd_export)
+
+    verify_parser = subparsers.add_parser(
+        "verify", help="check the library files",
+        description="Check that every image has its file, and every video its thumbnail."
+    )
+    verify_parser.add_argument(
+        "--hash", action="store_true",
+        help="also check file contents against their hash, reading every file"
+    )
+    add_jobs(verify_parser)
+    verify_parser.set_defaults(handler=cmd_verify)
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="browse the library over HTTP",
+        description="Serve search, image, thumbnail and tag endpoints read-only over HTTP."
+    )
+    serve_parser.add_argument(
+        "--host", default=DEFAULT_HOST,
+        help=f"address to listen on, 0.0.0.0 for every interface (default: {DEFAULT_HOST})"
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT,
+        help=f"port to listen on, 0 for any free port (default: {DEFAULT_PORT})"
+    )
+    serve_parser.add_argument(
+        "--workers", type=int,
+        help="threads reading the database and files (default: the read connection pool size)"
+    )
+    serve_parser.set_defaults(handler=cmd_serve)
+
+    return parser
+
+
+def main(
+        argv: list[str] | None = None,
+        db_manager: "DatabaseManager | None" = None,
+        out: TextIO | None = None
+) -> int:
+    """
+    Run a command and return its exit code. A db_manager may be given
+    to run against an open database, which is then left open.
+    """
+    args = build_parser().parse_args(argv)
+    args.out = out or sys.stdout
+
+    if not args.verbose:
+        # Failures are reported per item, the logs would repeat them
+        logging.disable(max(logging.root.manager.disable, logging.ERROR))
+    if args.directory:
+        os.chdir(args.directory)
+
+    if db_manager is not None:
+        return args.handler(db_manager, args)
+
+    from boardy3.database.database_manager import DatabaseManager
+
+    db_manager = DatabaseManager()
+    try:
+        return args.handler(db_manager, args)
+    finally:
+        # Let queued writes finish before exiting
+        db_manager.close()
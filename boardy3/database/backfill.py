@@ -0,0 +1,557 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+from typing import Any, NamedTuple, Sequence
+
+from sqlalchemy import Row, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.exceptions import ProxyCreationException, ThumbnailCreationException
+from boardy3.database.media_info import probe_media
+from boardy3.database.models import BackfillCheckpoint, Image
+from boardy3.database.packstore import pack_key
+from boardy3.database.proxies import PROXY_MAX_SIZE
+from boardy3.database.transfer import LINKED_MODES
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class BackfillResult(NamedTuple):
+    """Outcome of processing one image."""
+    values: dict[str, Any] | None = None    # Image columns to update
+    bytes_read: int = 0
+
+
+class BackfillProgress(NamedTuple):
+    job: str
+    processed: int      # Images scanned so far, across restarts
+    total: int
+    rate: float         # Images per second during this run
+    eta: float | None   # Seconds
+
+
+    @property
+    def done(self) -> bool:
+        return self.processed >= self.total
+
+
+    def __str__(self) -> str:
+        text = f"{self.job}: {self.processed}/{self.total}"
+        if self.eta is not None and not self.done:
+            text += f" ({self.rate:.1f}/s, about {format_duration(self.eta)} left)"
+        return text
+
+
+class BackfillJob:
+    """
+    Derived data to produce for images already in the database.
+
+    process() runs on worker threads and must not use the database. Its
+    result is written back by apply() on the writer thread.
+    """
+    name = "backfill"
+    # Whether apply() changes columns that searches read
+    invalidates_reads = True
+
+    def __init__(self, db_manager: DatabaseManager) -> None:
+        self.db_manager = db_manager
+
+
+    @property
+    def checkpoint_name(self) -> str:
+        """
+        Name the job's checkpoint is saved under. Jobs whose pending rows
+        depend on a setting include it, so changing the setting starts a
+        new scan.
+        """
+        return self.name
+
+
+    def pending_filter(self) -> Any:
+        """
+        Return a condition on Image selecting the rows that may need
+        work, or None to scan every row.
+        """
+        return None
+
+
+    def should_stop(self) -> bool:
+        """
+        Return True to end the job before its next batch, for example
+        once its storage is full. The job resumes from its checkpoint
+        the next time it runs.
+        """
+        return False
+
+
+    def process(self, row: Row) -> BackfillResult | None:
+        raise NotImplementedError()
+
+
+    def finish(self) -> None:
+        """Called on the runner thread once every row has been processed."""
+
+
+    def apply(self, session: Session, image_id: int, values: dict[str, Any]) -> None:
+        session.execute(update(Image).where(Image.id == image_id).values(**values))
+
+
+class MediaMetadataBackfill(BackfillJob):
+    """Probe media properties of images imported before they were recorded."""
+    name = "media_metadata"
+
+    # Probing reads headers, not whole files
+    PROBE_BYTES = 64 * 1024
+
+    def pending_filter(self) -> Any:
+        return Image.file_size.is_(None)
+
+
+    def process(self, row: Row) -> BackfillResult | None:
+        if not self.db_manager.is_packed(row.filename) \
+                and not os.path.exists(self.db_manager.get_image_path(row.filename)):
+            logger.warning(f"Missing file for image id <{row.id}>.")
+            return None
+
+        with self.db_manager.image_file(row.filename) as image_path:
+            media_info = probe_media(image_path, row.is_video)
+        return BackfillResult(media_info._asdict(), self.PROBE_BYTES)
+
+
+class ThumbnailBackfill(BackfillJob):
+    """Create gallery thumbnails missing from the thumbnail directory."""
+    name = "thumbnails"
+    invalidates_reads = False
+
+    def process(self, row: Row) -> BackfillResult | None:
+        if os.path.exists(self.db_manager.get_thumbnail_path(row.filename)):
+            return None
+
+        image_path = self.db_manager.get_image_path(row.filename)
+        packed = self.db_manager.is_packed(row.filename)
+        if not packed and not os.path.exists(image_path):
+            logger.warning(f"Missing file for image id <{row.id}>.")
+            return None
+
+        try:
+            self.db_manager.generate_thumbnail(row.filename, row.is_video)
+        except ThumbnailCreationException:
+            return None
+
+        return BackfillResult(bytes_read=row.file_size or (0 if packed else os.path.getsize(image_path)))
+
+
+class ThumbnailPackBackfill(BackfillJob):
+    """
+    Copy thumbnail files made before the thumbnail pack existed into it,
+    and compact the pack once deletes have left enough dead space.
+    """
+    name = "thumbnail_pack"
+    invalidates_reads = False
+
+    def process(self, row: Row) -> BackfillResult | None:
+        if pack_key(row.filename) in self.db_manager.thumbnail_pack:
+            return None
+
+        thumbnail_path = self.db_manager.get_thumbnail_path(row.filename)
+        if not self.db_manager.pack_thumbnail(row.filename):
+            return None
+
+        return BackfillResult(bytes_read=os.path.getsize(thumbnail_path))
+
+
+    def finish(self) -> None:
+        if self.db_manager.thumbnail_pack.should_compact():
+            self.db_manager.thumbnail_pack.compact()
+
+
+class OriginalPackBackfill(BackfillJob):
+    """
+    Move the files of small stills into the original pack once packing
+    is turned on, and compact the pack once deletes have left enough
+    dead space.
+    """
+    name = "original_pack"
+    invalidates_reads = False
+
+    @property
+    def checkpoint_name(self) -> str:
+        # Rows skipped as too large are scanned again once the limit is
+        # raised
+        return f"{self.name}:{self.db_manager.pack_max_bytes}"
+
+
+    def pending_filter(self) -> Any:
+        # Stills not yet probed are checked by the size of their file.
+        # Linked files would only be copied into the pack.
+        return Image.is_video.is_(False) \
+            & or_(Image.file_size.is_(None), Image.file_size <= self.db_manager.pack_max_bytes) \
+            & or_(Image.storage_mode.is_(None), Image.storage_mode.not_in(LINKED_MODES))
+
+
+    def should_stop(self) -> bool:
+        # With packing turned off after the fact, no row is pending and
+        # the job only compacts
+        return self.db_manager.original_pack is None
+
+
+    def process(self, row: Row) -> BackfillResult | None:
+        if not self.db_manager.pack_original(row.filename):
+            return None
+
+        return BackfillResult(bytes_read=row.file_size or 0)
+
+
+    def finish(self) -> None:
+        pack = self.db_manager.original_pack
+        if pack is not None and pack.should_compact():
+            pack.compact()
+
+
+class MipmapBackfill(BackfillJob):
+    """Create the overview tiles of images from their thumbnails."""
+    name = "mipmaps"
+    invalidates_reads = False
+
+    def process(self, row: Row) -> BackfillResult | None:
+        if self.db_manager.mipmap_store.has(row.id):
+            return None
+
+        if not self.db_manager.generate_mipmap(row.id, row.filename):
+            return None
+
+        return BackfillResult(bytes_read=os.path.getsize(self.db_manager.get_thumbnail_path(row.filename)))
+
+
+    def finish(self) -> None:
+        self.db_manager.mipmap_store.flush()
+
+
+class StoryboardBackfill(BackfillJob):
+    """Create the hover storyboards of videos."""
+    name = "storyboards"
+    invalidates_reads = False
+
+    def pending_filter(self) -> Any:
+        return Image.is_video.is_(True)
+
+
+    def process(self, row: Row) -> BackfillResult | None:
+        sprite_path, index_path = self.db_manager.get_storyboard_paths(row.filename)
+        if os.path.exists(sprite_path) and os.path.exists(index_path):
+            return None
+
+        video_path = self.db_manager.get_image_path(row.filename)
+        if not os.path.exists(video_path):
+            logger.warning(f"Missing file for image id <{row.id}>.")
+            return None
+
+        try:
+            self.db_manager.generate_storyboard(row.filename)
+        except ThumbnailCreationException:
+            return None
+
+        # Seeking through the whole video reads most of it
+        return BackfillResult(bytes_read=row.file_size or os.path.getsize(video_path))
+
+
+class ProxyBackfill(BackfillJob):
+    """
+    Create low resolution copies of large videos for preview playback,
+    until the next one would not fit in the proxy budget. Proxies are
+    never evicted to make room here; that is left to playback.
+    """
+    name = "proxies"
+    invalidates_reads = False
+
+    def __init__(self, db_manager: DatabaseManager) -> None:
+        super().__init__(db_manager)
+        # The size of the next proxy is guessed from the largest so far
+        self._largest = 0
+        # Bytes guessed for proxies being created by the workers
+        self._reserved = 0
+        self._full = False
+        self._lock = threading.Lock()
+
+    def pending_filter(self) -> Any:
+        return Image.is_video.is_(True) & or_(
+            Image.width.is_(None),
+            Image.height.is_(None),
+            Image.width > PROXY_MAX_SIZE,
+            Image.height > PROXY_MAX_SIZE
+        )
+
+
+    def should_stop(self) -> bool:
+        store = self.db_manager.proxy_store
+        return not store.enabled or self._full or not store.has_room(self._largest)
+
+
+    def process(self, row: Row) -> BackfillResult | None:
+        if os.path.exists(self.db_manager.proxy_store.get_path(row.filename)):
+            return None
+
+        video_path = self.db_manager.get_image_path(row.filename)
+        if not os.path.exists(video_path):
+            logger.warning(f"Missing file for image id <{row.id}>.")
+            return None
+
+        store = self.db_manager.proxy_store
+        with self._lock:
+            reserved = self._largest
+            if self._full or not store.has_room(self._reserved + reserved):
+                self._full = True
+                return None
+            self._reserved += reserved
+
+        try:
+            if not self.db_manager.generate_proxy(row.filename, evict=False):
+                return None
+        except ProxyCreationException:
+            return None
+        finally:
+            with self._lock:
+                self._reserved -= reserved
+
+        proxy_size = os.path.getsize(store.get_path(row.filename))
+        with self._lock:
+            self._largest = max(self._largest, proxy_size)
+            if not store.has_room(0):
+                # Larger than guessed, so it would cost another proxy
+                self._full = True
+                store.remove(row.filename)
+                return None
+
+        # The whole video is decoded
+        return BackfillResult(bytes_read=row.file_size or os.path.getsize(video_path))
+
+
+class BackfillRunner(threading.Thread):
+    """
+    Runs backfill jobs over the image table in the background.
+
+    Each job walks the images by id in batches. A batch is processed by
+    a small worker pool and its results are committed together with the
+    job's checkpoint, so a stopped job resumes after the last batch it
+    finished.
+
+    The runner throttles itself to stay out of the way of the GUI:
+    - cpu_budget is the share of one core the workers may use on average.
+    - io_budget is the number of bytes per second they may read.
+    - No batch starts until idle_delay seconds after notify_activity()
+      was last called.
+    """
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            jobs: Sequence[BackfillJob],
+            batch_size: int = 64,
+            max_workers: int = 2,
+            cpu_budget: float = 0.5,
+            io_budget: int = 16 * 1024 * 1024,
+            idle_delay: float = 1.0
+    ) -> None:
+        super().__init__(name="boardy3-backfill", daemon=True)
+        self.db_manager = db_manager
+        self.jobs = list(jobs)
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.cpu_budget = cpu_budget
+        self.io_budget = io_budget
+        self.idle_delay = idle_delay
+
+        self._stop_event = threading.Event()
+        self._last_activity = 0.0
+        self._progress: BackfillProgress | None = None
+
+
+    def run(self) -> None:
+        for job in self.jobs:
+            if self._stop_event.is_set():
+                break
+
+            try:
+                self._run_job(job)
+            except Exception:
+                logger.exception(f"Backfill <{job.name}> failed.")
+
+        self._progress = None
+
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop after the current batch."""
+        self._stop_event.set()
+        if wait and self.is_alive():
+            self.join()
+
+
+    def notify_activity(self) -> None:
+        """Hold off the next batch while the user is interacting."""
+        self._last_activity = time.monotonic()
+
+
+    def progress(self) -> BackfillProgress | None:
+        """Return the progress of the running job, if any."""
+        return self._progress
+
+
+    def reset(self) -> None:
+        """Forget the checkpoints of the runner's jobs."""
+        job_names = [job.checkpoint_name for job in self.jobs]
+        self.db_manager.submit_write(
+            lambda session: session.query(BackfillCheckpoint)
+                .filter(BackfillCheckpoint.job_name.in_(job_names))
+                .delete(),
+            invalidates_reads=False
+        ).result()
+
+
+    def _run_job(self, job: BackfillJob) -> None:
+        last_id = self._load_checkpoint(job)
+        processed, total = self._count_scanned(last_id)
+        start_processed = processed
+        start_time = time.perf_counter()
+        logger.info(f"Backfill <{job.name}> starting at image id <{last_id}>.")
+
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix=f"backfill-{job.name}") as executor:
+            while not self._wait_for_idle() and not job.should_stop():
+                rows = self._fetch_batch(job, last_id)
+                if not rows:
+                    job.finish()
+                    break
+
+                batch_start = time.perf_counter()
+                results = list(executor.map(
+                    lambda row: self._process_row(job, row), rows
+                ))
+                batch_time = time.perf_counter() - batch_start
+
+                updates = [
+                    (row.id, result.values)
+                    for row, (result, _) in zip(rows, results)
+                    if result is not None and result.values
+                ]
+                # A job that stopped partway through the batch, e.g. for
+                # lack of room, goes over it again when it resumes
+                if not job.should_stop():
+                    last_id = rows[-1].id
+                self.db_manager.submit_write(
+                    lambda session: self._save_batch(session, job, updates, last_id),
+                    invalidates_reads=job.invalidates_reads and bool(updates)
+                ).result()
+
+                processed, total = self._count_scanned(last_id)
+                elapsed = time.perf_counter() - start_time
+                rate = (processed - start_processed) / elapsed if elapsed > 0 else 0.0
+                eta = (total - processed) / rate if rate > 0 else None
+                self._progress = BackfillProgress(job.name, processed, total, rate, eta)
+
+                self._throttle(
+                    batch_time,
+                    cpu_time=sum(cpu_time for _, cpu_time in results),
+                    bytes_read=sum(result.bytes_read for result, _ in results if result)
+                )
+
+        self._progress = BackfillProgress(job.name, processed, total, 0.0, None)
+        logger.info(f"Backfill <{job.name}> stopped at image id <{last_id}>.")
+
+
+    def _process_row(self, job: BackfillJob, row: Row) -> tuple[BackfillResult | None, float]:
+        """Process a row on a worker thread and measure its CPU time."""
+        cpu_start = time.thread_time()
+        try:
+            result = job.process(row)
+        except Exception:
+            logger.exception(f"Backfill <{job.name}> failed for image id <{row.id}>.")
+            result = None
+
+        return result, time.thread_time() - cpu_start
+
+
+    def _fetch_batch(self, job: BackfillJob, last_id: int) -> list[Row]:
+        statement = select(Image.id, Image.filename, Image.is_video, Image.file_size)\
+            .where(Image.id > last_id)\
+            .order_by(Image.id)\
+            .limit(self.batch_size)
+
+        pending_filter = job.pending_filter()
+        if pending_filter is not None:
+            statement = statement.where(pending_filter)
+
+        with self.db_manager.read_connection() as connection:
+            return list(connection.execute(statement))
+
+
+    def _count_scanned(self, last_id: int) -> tuple[int, int]:
+        with self.db_manager.read_connection() as connection:
+            return (
+                connection.scalar(select(func.count()).where(Image.id <= last_id)) or 0,
+                connection.scalar(select(func.count(Image.id))) or 0
+            )
+
+
+    def _load_checkpoint(self, job: BackfillJob) -> int:
+        with self.db_manager.read_connection() as connection:
+            last_id = connection.scalar(
+                select(BackfillCheckpoint.last_image_id)
+                .where(BackfillCheckpoint.job_name == job.checkpoint_name)
+            )
+
+        return last_id or 0
+
+
+    @staticmethod
+    def _save_batch(
+            session: Session,
+            job: BackfillJob,
+            updates: list[tuple[int, dict[str, Any]]],
+            last_id: int
+    ) -> None:
+        for image_id, values in updates:
+            job.apply(session, image_id, values)
+
+        checkpoint = session.get(BackfillCheckpoint, job.checkpoint_name)
+        if checkpoint is None:
+            session.add(BackfillCheckpoint(job_name=job.checkpoint_name, last_image_id=last_id))
+        else:
+            checkpoint.last_image_id = last_id
+
+
+    def _wait_for_idle(self) -> bool:
+        """
+        Block until the UI has been idle for idle_delay seconds. Returns
+        True if the runner was stopped meanwhile.
+        """
+        while not self._stop_event.is_set():
+            idle_time = time.monotonic() - self._last_activity
+            if idle_time >= self.idle_delay:
+                return False
+            self._stop_event.wait(self.idle_delay - idle_time)
+
+        return True
+
+
+    def _throttle(self, batch_time: float, cpu_time: float, bytes_read: int) -> None:
+        # Sleep long enough that the batch fits in both budgets
+        delay = max(
+            cpu_time / self.cpu_budget if self.cpu_budget > 0 else 0.0,
+            bytes_read / self.io_budget if self.io_budget > 0 else 0.0
+        ) - batch_time
+
+        if delay > 0:
+            self._stop_event.wait(delay)
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {seconds}s"
+    return f"{seconds}s"
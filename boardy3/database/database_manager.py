@@ -1,24 +1,97 @@
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
 import hashlib
+import io
 import os
-import shutil
-from typing import Optional
-
-import cv2
-from sqlalchemy import create_engine, Column, exc
-from sqlalchemy.orm import Session
-
+import pathlib
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Optional, TypeVar
+
+from sqlalchemy import create_engine, delete, Column, Connection, Engine, func, inspect, select, text
+from sqlalchemy.engine import URL
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm.util import identity_key
+
+from boardy3.database import column_to_int
 from boardy3.database.exceptions import DatabaseInvalidFile, DatabaseItemDoesNotExist, DatabaseItemExists, ThumbnailCreationException
-from boardy3.database.models import Base, Image, image_tag, Tag
+from boardy3.database.local_cache import LocalCache
+from boardy3.database.media_info import MediaInfo, probe_media
+from boardy3.database.mipmaps import MipmapStore, create_mipmap
+from boardy3.database.packstore import PackStore, file_key, pack_key
+from boardy3.database.proxies import ProxyStore
+from boardy3.database.models import Base, Image, ImageRecord, image_tag, ImportJournal, Tag, TagRecord
+from boardy3.database.search import DEFAULT_SORT, SORT_ORDERS, ImageCount, SearchQuery, SearchResultCache
+from boardy3.database.snapshot import GallerySnapshot, read_snapshot, write_snapshot
+from boardy3.database.thumbnails import StoryboardIndex, create_image_thumbnail, create_storyboard, create_thumbnail, create_video_thumbnail
+from boardy3.database.storage import DEFAULT_STORAGE_PROFILE, StorageProfile, configure_engine, get_storage_profile
+from boardy3.database.transfer import DEFAULT_IMPORT_MODE, IMPORT_MODES, LINKED_MODES, transfer_file, undo_transfer
+from boardy3.database.writer import DatabaseWriter
 from boardy3.utils import get_logger
 
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
 
 class DatabaseManager:
     DEFAULT_PAGE_SIZE = 20
-
-    def __init__(self, is_test=False) -> None:
+    # Number of objects the long-lived session may hold before browsing
+    # releases them.
+    SESSION_IDENTITY_LIMIT = 2000
+    # Number of read-only connections kept open for queries
+    READ_POOL_SIZE = 4
+    # Environment variable with the disk budget in MiB for proxy videos
+    PROXY_BUDGET_ENV = "BOARDY3_PROXY_BUDGET_MB"
+    # Environment variables with the local cache directory and its disk
+    # budget in MiB
+    LOCAL_CACHE_DIR_ENV = "BOARDY3_LOCAL_CACHE_DIR"
+    LOCAL_CACHE_BUDGET_ENV = "BOARDY3_LOCAL_CACHE_MB"
+    DEFAULT_LOCAL_CACHE_BUDGET = 4096 * 1024 * 1024
+    # Environment variable with the size in KiB up to which imported
+    # stills are stored in the original pack instead of their own file
+    PACK_MAX_ENV = "BOARDY3_PACK_MAX_KB"
+    # Disk space packed originals may use once unpacked for readers that
+    # need a file, when there is no local cache to unpack them into
+    UNPACKED_BUDGET = 256 * 1024 * 1024
+    # Environment variable with the default import mode, see transfer.py
+    IMPORT_MODE_ENV = "BOARDY3_IMPORT_MODE"
+
+    def __init__(
+            self,
+            is_test=False,
+            storage_profile: str = DEFAULT_STORAGE_PROFILE,
+            proxy_budget: int | None = None,
+            local_cache_dir: str | None = None,
+            local_cache_budget: int | None = None,
+            pack_max_bytes: int | None = None,
+            import_mode: str | None = None
+    ) -> None:
+        """
+        proxy_budget is the disk space in bytes low resolution copies of
+        videos may use. It defaults to the BOARDY3_PROXY_BUDGET_MB
+        environment variable, and proxies are disabled without either.
+
+        local_cache_dir is a directory on a fast local disk where files
+        of a library on slow storage are cached, using up to
+        local_cache_budget bytes. They default to the
+        BOARDY3_LOCAL_CACHE_DIR and BOARDY3_LOCAL_CACHE_MB environment
+        variables, and the cache is disabled without a directory.
+
+        Imported stills of up to pack_max_bytes are appended to the
+        original pack instead of getting a file of their own, which
+        saves inodes and opens for libraries of many small files. It
+        defaults to the BOARDY3_PACK_MAX_KB environment variable, and
+        originals are never packed without either.
+
+        import_mode is how add_image() stores files by default: "copy",
+        "reflink", "hardlink" or "move". It defaults to the
+        BOARDY3_IMPORT_MODE environment variable, then to copying.
+        """
         db_instance_dirpath = "instance"
         os.makedirs(db_instance_dirpath, exist_ok=True)
 
@@ -27,7 +100,6 @@ class DatabaseManager:
 
         if self.is_test:
             self.db_filepath = f"{db_instance_dirpath}/test_image_database.db"
-            self.engine = create_engine(f"sqlite:///{self.db_filepath}", echo=False)
 
             self.image_dir_path = os.path.join(
                 os.getcwd(), "tests", "db", "image_files"
@@ -35,10 +107,27 @@ class DatabaseManager:
             self.thumbnail_dir_path = os.path.join(
                 os.getcwd(), "tests", "db", "thumbnails"
             )
+            self.proxy_dir_path = os.path.join(
+                os.getcwd(), "tests", "db", "proxies"
+            )
+            self.thumbnail_pack_dir_path = os.path.join(
+                os.getcwd(), "tests", "db", "thumbnail_pack"
+            )
+            self.mipmap_dir_path = os.path.join(
+                os.getcwd(), "tests", "db", "mipmaps"
+            )
+            self.snapshot_path = os.path.join(
+                os.getcwd(), "tests", "db", "gallery_snapshot.bin"
+            )
+            self.original_pack_dir_path = os.path.join(
+                os.getcwd(), "tests", "db", "image_pack"
+            )
+            self.unpacked_dir_path = os.path.join(
+                os.getcwd(), "tests", "db", "unpacked"
+            )
             os.makedirs(self.image_dir_path, exist_ok=True)
         else:
             self.db_filepath = f"{db_instance_dirpath}/image_database.db"
-            self.engine = create_engine(f"sqlite:///{self.db_filepath}", echo=False)
 
             self.image_dir_path = os.path.join(
                 os.getcwd(), "db", "image_files"
@@ -46,19 +135,138 @@ class DatabaseManager:
             self.thumbnail_dir_path = os.path.join(
                 os.getcwd(), "db", "thumbnails"
             )
+            self.proxy_dir_path = os.path.join(
+                os.getcwd(), "db", "proxies"
+            )
+            self.thumbnail_pack_dir_path = os.path.join(
+                os.getcwd(), "db", "thumbnail_pack"
+            )
+            self.mipmap_dir_path = os.path.join(
+                os.getcwd(), "db", "mipmaps"
+            )
+            self.snapshot_path = os.path.join(
+                os.getcwd(), "db", "gallery_snapshot.bin"
+            )
+            self.original_pack_dir_path = os.path.join(
+                os.getcwd(), "db", "image_pack"
+            )
+            self.unpacked_dir_path = os.path.join(
+                os.getcwd(), "db", "unpacked"
+            )
             os.makedirs(self.image_dir_path, exist_ok=True)
 
+        # Imported files wait here until their record is committed. It
+        # is inside the image directory so they are renamed into place.
+        self.staging_dir_path = os.path.join(self.image_dir_path, ".staging")
+        # Staged files recovery could not account for are kept here
+        self.quarantine_dir_path = os.path.join(self.image_dir_path, ".quarantine")
+
+        if proxy_budget is None:
+            proxy_budget = int(os.environ.get(self.PROXY_BUDGET_ENV, 0)) * 1024 * 1024
+        self.proxy_store = ProxyStore(self.proxy_dir_path, proxy_budget)
+
+        if local_cache_dir is None:
+            local_cache_dir = os.environ.get(self.LOCAL_CACHE_DIR_ENV) or None
+        if local_cache_budget is None:
+            local_cache_budget = int(os.environ.get(self.LOCAL_CACHE_BUDGET_ENV, 0)) * 1024 * 1024 \
+                or self.DEFAULT_LOCAL_CACHE_BUDGET
+        self.local_cache = LocalCache(local_cache_dir, local_cache_budget)
+
+        if pack_max_bytes is None:
+            pack_max_bytes = int(os.environ.get(self.PACK_MAX_ENV, 0)) * 1024
+        self.pack_max_bytes = pack_max_bytes
+
+        if import_mode is None:
+            import_mode = os.environ.get(self.IMPORT_MODE_ENV) or DEFAULT_IMPORT_MODE
+        if import_mode not in IMPORT_MODES:
+            raise ValueError(f"Unknown import mode <{import_mode}>, expected one of {', '.join(IMPORT_MODES)}.")
+        self.import_mode = import_mode
+        # Small originals appended to large segments. The pack holds the
+        # only copy of its originals, so every write is synced. It is
+        # opened while packing is on, or if originals were packed before.
+        self.original_pack: PackStore | None = None
+        if self.pack_max_bytes > 0 or os.path.isdir(self.original_pack_dir_path):
+            self.original_pack = PackStore(self.original_pack_dir_path, durable=True)
+        # Packed originals are unpacked here for readers that need a file
+        self.unpacked_cache = self.local_cache if self.local_cache.enabled \
+            else LocalCache(self.unpacked_dir_path, self.UNPACKED_BUDGET)
+
+        # Copies of the thumbnail files packed together, so a gallery page
+        # is read from a few mapped segments instead of many small files
+        self.thumbnail_pack = PackStore(self.thumbnail_pack_dir_path)
+
+        # Tiny tiles of every image for the overview
+        self.mipmap_store = MipmapStore(self.mipmap_dir_path)
+
+        # SQLite settings for all connections. See storage.py.
+        self.storage_profile = get_storage_profile(storage_profile)
+
+        self.engine = create_engine(f"sqlite:///{self.db_filepath}", echo=False)
+        configure_engine(self.engine, lambda: self.storage_profile)
+
         Base.metadata.create_all(self.engine)
+        migrate_schema(self.engine)
+
+        # Queries that do not need ORM objects are served by a pool of
+        # read-only connections, which WAL mode lets run alongside the
+        # writer. They may be used from any thread.
+        self.read_engine = create_engine(
+            URL.create(
+                "sqlite",
+                database=pathlib.Path(os.path.abspath(self.db_filepath)).as_uri(),
+                query={"mode": "ro", "uri": "true"}
+            ),
+            pool_size=self.READ_POOL_SIZE,
+            echo=False
+        )
+        configure_engine(self.read_engine, lambda: self.storage_profile, read_only=True)
+
+        self.session_factory = sessionmaker(self.engine)
+        # Long-lived session for ORM reads on the GUI thread. All writes
+        # go through the writer thread instead.
+        self.session = self.session_factory()
+        self._session_generation = 0
+
+        # Incremented by every mutator. Cached search results computed
+        # under an older generation are discarded on lookup.
+        self.write_generation = 0
+        self._generation_lock = threading.Lock()
+        self.result_cache = SearchResultCache()
+        self._tag_counts: tuple[int, dict[str, int]] | None = None
+        # Connection watching for commits of other processes, opened by
+        # the first check_external_writes()
+        self._data_version: tuple[sqlite3.Connection, int] | None = None
+        self._data_version_lock = threading.Lock()
+
+        # Save paths of imports in progress, see add_image()
+        self._pending_imports: set[str] = set()
+        self._import_lock = threading.Lock()
+
+        self.writer = DatabaseWriter(
+            self.session_factory,
+            on_commit=self._bump_write_generation
+        )
 
-        self.session = Session(self.engine)
+        self.recover_imports()
 
     
     def add_image(
             self,
             filepath: str,
             tags: list[str] | None = None,
-            is_video: bool = False
+            is_video: bool = False,
+            mode: str | None = None
     ) -> None:
+        """
+        Store a file in the library and add its record. mode overrides
+        the import mode of the database, see transfer.py. Modes the
+        filesystem cannot do fall back to cheaper ones, and the mode
+        used is recorded for delete_image().
+        """
+        mode = mode or self.import_mode
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Unknown import mode <{mode}>.")
+
         if not os.path.exists(filepath):
             raise DatabaseInvalidFile(f"File <{filepath}> does not exists.")
 
@@ -78,75 +286,338 @@ class DatabaseManager:
         image_dir = self._get_image_dir(image_hash)
         save_path = os.path.join(image_dir, new_filename)
 
-        # Do not process images already saved or duplicates
-        # It should be safe to assume that if the image does not
-        # exist in the file system then it also should not exist
-        # in the database. Therefore, we do not need to worry about
-        # UNIQUE filename constraint errors.
-        if os.path.exists(save_path):
-            raise DatabaseItemExists(f"<{new_filename}>")
-        
-        # Save image to filesystem
-        os.makedirs(image_dir, exist_ok=True)
-        shutil.copy2(filepath, save_path)
+        # Do not process images already saved or duplicates.
+        # The save path is claimed before copying since parallel imports
+        # of the same file would all pass a plain existence check.
+        with self._import_lock:
+            if save_path in self._pending_imports:
+                raise DatabaseItemExists(f"<{new_filename}>")
+            self._pending_imports.add(save_path)
 
-        if is_video:
-            # Genereate thumbnail
-            thumbnail_dir = self.get_thumbnail_dir(new_filename)
-            os.makedirs(thumbnail_dir, exist_ok=True)
-            thumbnail_path = self.get_thumbnail_path(new_filename)
-            create_thumbnail(save_path, thumbnail_path)
+        try:
+            # Files are only put in place once their record is committed,
+            # so a stored file without one was left by an import that
+            # crashed before imports were journaled. It is replaced.
+            if (os.path.exists(save_path) or self.is_packed(new_filename)) \
+                    and self._has_image(new_filename):
+                raise DatabaseItemExists(f"<{new_filename}>")
+
+            image_id = self._store_image(filepath, save_path, new_filename, tags, is_video, mode)
+        finally:
+            with self._import_lock:
+                self._pending_imports.discard(save_path)
 
-        # Create new Image record
-        new_image = Image(filename=new_filename, is_video=is_video)
+        self.generate_mipmap(image_id, new_filename)
+
+
+    def _store_image(
+            self,
+            filepath: str,
+            save_path: str,
+            new_filename: str,
+            tags: list[str] | None,
+            is_video: bool,
+            mode: str
+    ) -> int:
+        """
+        Stage a new file, insert its record, then rename the file into
+        place. Every step before the insert is undone if the import
+        fails, or by recover_imports() if the process dies.
+        """
+        # Linked files share their data with the source, which packing
+        # would copy after all
+        packed = mode not in LINKED_MODES and self._should_pack(os.path.getsize(filepath), is_video)
+        staging_path = os.path.join(self.staging_dir_path, new_filename)
+
+        # Journaled before the source is touched. Synced to disk, since
+        # recovery relies on the entry to return a moved file.
+        self.submit_write(
+            lambda session: session.merge(ImportJournal(
+                filename=new_filename,
+                source_path=os.path.abspath(filepath),
+                storage_mode=mode,
+                packed=packed,
+                pid=os.getpid()
+            )),
+            invalidates_reads=False,
+            durable=True
+        ).result()
+
+        def insert(session: Session) -> int:
+            image_id = self._insert_image(session, new_filename, is_video, tags or list(), media_info, mode)
+            # Committed together, so a crash leaves either the journal
+            # entry or the record
+            session.execute(delete(ImportJournal).where(ImportJournal.filename == new_filename))
+            return image_id
 
         try:
-            if not tags: tags = list()
-            for tag_name in tags:
-                tag = self.session\
-                    .query(Tag)\
-                    .filter_by(name=tag_name)\
-                    .first()
-
-                if not tag:
-                    tag = Tag(name=tag_name)
-                    self.session.add(tag)
-
-                new_image.tags.append(tag)
-
-            self.session.add(new_image)
-            self.session.commit()
-        except exc.IntegrityError as e:
-            # Delete image file since it was not added to the db.
-            if os.path.exists(save_path):
-                os.remove(save_path)
+            if packed:
+                # Probed and thumbnailed from the imported file. The
+                # original is packed once the thumbnail exists.
+                source_path = filepath
+            else:
+                # Save image to filesystem
+                os.makedirs(self.staging_dir_path, exist_ok=True)
+                mode = transfer_file(filepath, staging_path, mode)
+                source_path = staging_path
+
+            media_info = probe_media(source_path, is_video)
+
+            # Genereate thumbnail
+            try:
+                self.generate_thumbnail(new_filename, is_video, source_path=source_path)
+            except ThumbnailCreationException:
+                if is_video:
+                    raise
+                # Galleries show the original when a still has no thumbnail
+                logger.warning(f"No thumbnail created for <{new_filename}>.")
+
+            if packed:
+                assert self.original_pack is not None
+                with open(filepath, "rb") as infile:
+                    self.original_pack.put(file_key(new_filename), infile.read())
+
+            # Create new Image record on the writer thread
+            image_id = self.submit_write(insert).result()
+        except Exception:
+            # Take the file back out since it was not added to the db. A
+            # moved file is returned to where it came from.
+            self._discard_import(new_filename, filepath, mode, packed)
 
             # Re-raise exception
-            raise e
+            raise
+
+        if not packed:
+            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            try:
+                os.replace(staging_path, save_path)
+            except FileNotFoundError:
+                # Already put in place by recover_imports() of another
+                # process, which may run once the record is committed
+                if not os.path.exists(save_path):
+                    raise
+        elif mode == "move":
+            os.remove(filepath)
+
+        return image_id
+
+
+    def _discard_import(self, filename: str, source_path: str, mode: str, packed: bool) -> None:
+        """Undo the steps of an import whose record was not committed."""
+        # Files shared with another import of the same file that got its
+        # record in first are kept
+        stored = self._has_image(filename)
+
+        staging_path = os.path.join(self.staging_dir_path, filename)
+        if packed:
+            if self.original_pack is not None and not stored:
+                self.original_pack.delete(file_key(filename))
+        elif os.path.exists(staging_path):
+            if mode == "move" and os.path.exists(source_path):
+                # Copied across filesystems, but the source is still there
+                os.remove(staging_path)
+            else:
+                undo_transfer(source_path, staging_path, mode)
+        elif mode == "move" and not stored and not os.path.exists(source_path) \
+                and os.path.exists(self.get_image_path(filename)):
+            # Renamed into place, then a power loss rolled back the record
+            undo_transfer(source_path, self.get_image_path(filename), mode)
+
+        if not stored:
+            thumbnail_path = self.get_thumbnail_path(filename)
+            if os.path.exists(thumbnail_path):
+                os.remove(thumbnail_path)
+            self.thumbnail_pack.delete(pack_key(filename))
+
+        self.submit_write(
+            lambda session: session.execute(delete(ImportJournal).where(ImportJournal.filename == filename)),
+            invalidates_reads=False
+        ).result()
+
+
+    def recover_imports(self) -> int:
+        """
+        Roll back the imports a crash interrupted before their record was
+        committed, and rename the files of those committed since into
+        place. Run on startup.
+
+        Only the journal and the staging directory are read, which hold
+        no more than the imports that were in progress, so recovery takes
+        the same time however large the library is. Imports still running
+        in another process are left alone. Returns the number of imports
+        recovered.
+        """
+        started = time.perf_counter()
+        recovered = 0
+
+        with self.read_connection() as connection:
+            entries = connection.execute(select(ImportJournal)).all()
+        for entry in entries:
+            if self._import_running(entry.filename) \
+                    or (entry.pid != os.getpid() and _process_exists(entry.pid)):
+                continue
+            try:
+                self._discard_import(entry.filename, entry.source_path, entry.storage_mode, entry.packed)
+            except OSError as e:
+                logger.error(f"Could not roll back the import of <{entry.source_path}>: {e}")
+                continue
+            recovered += 1
+            logger.info(f"Rolled back the interrupted import of <{entry.source_path}>.")
+
+        staged_filenames = os.listdir(self.staging_dir_path) if os.path.isdir(self.staging_dir_path) else []
+        for filename in staged_filenames:
+            staging_path = os.path.join(self.staging_dir_path, filename)
+            with self.read_connection() as connection:
+                journaled = connection.execute(
+                    select(ImportJournal.filename).where(ImportJournal.filename == filename)
+                ).first() is not None
+            if journaled or self._import_running(filename):
+                # Still being imported
+                continue
+
+            save_path = self.get_image_path(filename)
+            if self._has_image(filename):
+                if os.path.exists(save_path):
+                    os.remove(staging_path)
+                else:
+                    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                    os.replace(staging_path, save_path)
+                    logger.info(f"Finished the interrupted import of <{filename}>.")
+            else:
+                # Neither journaled nor recorded, e.g. after a power loss
+                # rolled back the journal entry. It may be the only copy
+                # of a moved file, so it is set aside rather than deleted.
+                os.makedirs(self.quarantine_dir_path, exist_ok=True)
+                os.replace(staging_path, os.path.join(self.quarantine_dir_path, filename))
+                logger.warning(
+                    f"Moved <{filename}>, left over from an interrupted import, "
+                    f"to <{self.quarantine_dir_path}>."
+                )
+            recovered += 1
+
+        if recovered:
+            logger.info(f"Recovered {recovered} interrupted imports in {time.perf_counter() - started:.2f}s.")
+        return recovered
+
+
+    def _import_running(self, filename: str) -> bool:
+        """Return whether this process is importing a file right now."""
+        with self._import_lock:
+            return os.path.join(self._get_image_dir(filename), filename) in self._pending_imports
+
+
+    def _has_image(self, filename: str) -> bool:
+        with self.read_connection() as connection:
+            return connection.execute(
+                select(Image.id).where(Image.filename == filename)
+            ).first() is not None
+    
+
+    def _insert_image(
+            self,
+            session: Session,
+            filename: str,
+            is_video: bool,
+            tags: list[str],
+            media_info: MediaInfo | None = None,
+            storage_mode: str = DEFAULT_IMPORT_MODE
+    ) -> int:
+        # Tags are looked up first, so the queries do not autoflush the
+        # image before it is complete
+        image_tags = []
+        for tag_name in tags:
+            tag = session\
+                .query(Tag)\
+                .filter_by(name=tag_name)\
+                .first()
+
+            if not tag:
+                tag = Tag(name=tag_name)
+                session.add(tag)
+
+            image_tags.append(tag)
+
+        # MediaInfo fields are named after the Image columns
+        new_image = Image(
+            filename=filename,
+            is_video=is_video,
+            storage_mode=storage_mode,
+            tags=image_tags,
+            **(media_info._asdict() if media_info else {})
+        )
+
+        session.add(new_image)
+        session.flush()
+
+        return column_to_int(new_image.id)
     
 
     def delete_image(self, id: int | Column[int]) -> None:
-        image_ = self.get_image(id)
-        if image_ is None:
-            raise DatabaseItemDoesNotExist(f"Image id: {id} does not exist.")
-        
         # Delete image from database
-        self.session.delete(image_)
-        if not self.is_test: self.save()
+        filename, is_video, storage_mode = self.submit_write(
+            lambda session: self._delete_image_row(session, id)
+        ).result()
+        self._forget(Image, id)
 
-        image_path = self.get_image_path(image_.filename)
+        image_path = self.get_image_path(filename)
+        packed = self.original_pack is not None and self.original_pack.delete(file_key(filename))
         # By design, the image file should exist if it had existed in the
         # database unless the image location was tampered with.
-        assert os.path.exists(image_path) == True
-        # Delete physical file
-        os.remove(image_path)
-        logger.info(f"Image id deleted from database: {image_.id}")
+        assert packed or os.path.exists(image_path)
+        # Delete physical file. A packed original may still have its file
+        # if it was packed by a repack that did not finish.
+        if os.path.exists(image_path):
+            self._remove_original(image_path, storage_mode)
+        self.unpacked_cache.remove(image_path)
+        logger.info(f"Image id deleted from database: {id}")
+
+        thumbnail_path = self.get_thumbnail_path(filename)
+        if os.path.exists(thumbnail_path):
+            os.remove(thumbnail_path)
+            logger.info(f"Thumbnail for image id <{id}> deleted from database")
+        self.thumbnail_pack.delete(pack_key(filename))
+        self.mipmap_store.remove(column_to_int(id))
+
+        for storyboard_path in self.get_storyboard_paths(filename):
+            if os.path.exists(storyboard_path):
+                os.remove(storyboard_path)
+            self.local_cache.remove(storyboard_path)
+        self.local_cache.remove(image_path)
+        self.local_cache.remove(thumbnail_path)
 
-        if image_.is_video is True:
-            thumbnail_path = self.get_thumbnail_path(str(image_.filename))
-            if os.path.exists(thumbnail_path):
-                os.remove(thumbnail_path)
-                logger.info(f"Thumbnail for image id <{image_.id}> deleted from database")
+        if is_video:
+            self.proxy_store.remove(filename)
+
+
+    def _delete_image_row(
+            self,
+            session: Session,
+            id: int | Column[int]
+    ) -> tuple[str, bool, str]:
+        image_ = session.get(Image, id)
+        if image_ is None:
+            raise DatabaseItemDoesNotExist(f"Image id: {id} does not exist.")
+
+        filename, is_video = str(image_.filename), bool(image_.is_video)
+        storage_mode = str(image_.storage_mode or DEFAULT_IMPORT_MODE)
+        session.delete(image_)
+
+        return filename, is_video, storage_mode
+
+
+    @staticmethod
+    def _remove_original(image_path: str, storage_mode: str) -> None:
+        if storage_mode == "hardlink":
+            # Only the library's name is removed. The data stays with the
+            # imported file, so never truncate or overwrite it in place.
+            links = os.stat(image_path).st_nlink
+            os.remove(image_path)
+            if links > 1:
+                logger.debug(f"Unlinked <{image_path}>, the imported file is kept.")
+        else:
+            # Copies, clones and moved files belong to the library. A
+            # reflinked clone frees only the blocks it did not share.
+            os.remove(image_path)
 
 
     def delete_all_images(self) -> None:
@@ -156,10 +627,12 @@ class DatabaseManager:
 
 
     def get_image(self, id: int | Column[int]) -> Optional[Image]:
+        self._sync_session()
         return self.session.query(Image).filter_by(id=id).first()
 
 
     def get_all_images(self, newest_first: bool = False) -> list[Image]:
+        self._sync_session()
         query = self.session.query(Image)
         if newest_first:
             query = query.order_by(Image.id.desc())
@@ -171,56 +644,280 @@ class DatabaseManager:
 
     def get_images_count(self) -> int:
         """Return the number of image records in the database."""
-        return self.session.query(Image).count()
+        return self.count_images(SearchQuery()).count
+
+
+    def count_images(
+            self,
+            query: SearchQuery | list[str],
+            at_least: int | None = None
+    ) -> ImageCount:
+        """
+        Return the number of images matching a search.
+
+        Single tag searches are answered from the tag counts and other
+        searches are counted once per write generation. If at_least is
+        given, counting stops after that many matches and an inexact
+        ImageCount is returned for larger results.
+        """
+        if not isinstance(query, SearchQuery):
+            query = SearchQuery.from_tags(query)
+
+        count = self.result_cache.get_count(query, self.write_generation)
+        if count is not None and (count.exact or at_least is not None):
+            return count
+
+        if query.tags and not query.has_filters:
+            tag_counts = self.get_tag_counts()
+            valid_tags = [t for t in query.tags if t in tag_counts]
+
+            if len(valid_tags) == 0:
+                # Unknown tags match nothing
+                return ImageCount(0)
+            if len(valid_tags) == 1:
+                return ImageCount(tag_counts[valid_tags[0]])
+
+        with self.read_connection() as connection:
+            statement = self._build_search_statement(query, connection).order_by(None)
+            if at_least is not None:
+                statement = statement.limit(at_least + 1)
+
+            total = connection.scalar(
+                select(func.count()).select_from(statement.subquery())
+            ) or 0
+
+        if at_least is not None and total > at_least:
+            count = ImageCount(at_least, exact=False)
+        else:
+            count = ImageCount(total)
+
+        self.result_cache.put_count(query, self.write_generation, count)
+        return count
+
+
+    def get_tag_counts(self) -> dict[str, int]:
+        """
+        Return the number of images carrying each tag, keyed by tag name.
+
+        The counts are computed with one grouped query and kept until
+        the next write.
+        """
+        if self._tag_counts is not None:
+            generation, tag_counts = self._tag_counts
+            if generation == self.write_generation:
+                return tag_counts
+
+        generation = self.write_generation
+        with self.read_connection() as connection:
+            rows = connection.execute(
+                select(Tag.name, func.count(image_tag.c.image_id))
+                .outerjoin(image_tag, image_tag.c.tag_id == Tag.id)
+                .group_by(Tag.id)
+            )
+            tag_counts = {str(name): count for name, count in rows}
+
+        self._tag_counts = (generation, tag_counts)
+        return tag_counts
 
 
     def search_images(
             self,
-            tags_list: list[str],
+            query: SearchQuery | list[str],
             page: int,
-            page_size: int = DEFAULT_PAGE_SIZE
+            page_size: int = DEFAULT_PAGE_SIZE,
+            sort: str = DEFAULT_SORT
     ) -> list[Image]:
-        # Filter out invalid tags
-        tags = self.session\
-            .query(Tag)\
-            .filter(Tag.name.in_(tags_list))\
-            .all()
-        
+        """
+        Return a page of images matching the query. A list of tags may
+        be given instead of a SearchQuery, in which case sort applies.
+        """
+        # Release images from previous pages before loading a new one
+        self._sync_session()
+        self.trim_session()
+
+        page_ids = self.search_image_ids(query, page, page_size, sort)
+        return self._get_images_by_ids(page_ids)
+
+
+    def search_image_records(
+            self,
+            query: SearchQuery | list[str],
+            page: int,
+            page_size: int = DEFAULT_PAGE_SIZE,
+            sort: str = DEFAULT_SORT
+    ) -> list[ImageRecord]:
+        """
+        Same as search_images() but return lightweight records instead of
+        Image objects. A page costs at most one query and nothing is
+        added to the session.
+        """
+        page_ids = self.search_image_ids(query, page, page_size, sort)
+        return self.get_image_records(page_ids)
+
+
+    def get_image_record(self, id: int | Column[int]) -> Optional[ImageRecord]:
+        records = self.get_image_records([column_to_int(id)])
+        return records[0] if records else None
+
+
+    def get_image_records(self, ids: Sequence[int]) -> list[ImageRecord]:
+        """Return records for the given image ids, in the same order."""
+        if not ids:
+            return list()
+
+        with self.read_connection() as connection:
+            rows = connection.execute(
+                select(Image.id, Image.filename, Image.is_video, Image.width, Image.height)
+                .where(Image.id.in_(ids))
+            )
+            records = {row.id: self._create_image_record(row) for row in rows}
+
+        return [records[id] for id in ids if id in records]
+
+
+    def _create_image_record(self, row) -> ImageRecord:
+        # Images are shown in galleries by their thumbnail. Images
+        # imported before still thumbnails existed fall back to the
+        # original until the thumbnail backfill reaches them.
+        thumbnail_path = self.get_thumbnail_path(row.filename)
+        if not row.is_video and not os.path.exists(thumbnail_path):
+            thumbnail_path = self.get_cached_image_path(row.filename) if self.is_packed(row.filename) \
+                else self.get_image_path(row.filename)
+
+        return ImageRecord(
+            id=row.id,
+            filename=row.filename,
+            is_video=bool(row.is_video),
+            thumbnail_path=thumbnail_path,
+            width=row.width,
+            height=row.height
+        )
+
+
+    def search_image_ids(
+            self,
+            query: SearchQuery | list[str],
+            page: int,
+            page_size: int = DEFAULT_PAGE_SIZE,
+            sort: str = DEFAULT_SORT
+    ) -> list[int]:
+        """
+        Return the ids of the images on the given page of a search.
+
+        Pages are sliced out of the cached result ids, so moving between
+        pages of the same search does not query the database until
+        something is written.
+        """
         # Set page size to default size if page size is not
         # a positive non-zero int.
         if page_size <= 0:
             page_size = self.DEFAULT_PAGE_SIZE
 
-        if (len(tags_list) != 0) and (len(tags) == 0):
-            # Non-empty tags list and no valid tags where found
-            query = self.session.query(Image).filter_by(id=None)
-        else:
-            # Create the start of the search query string
-            query = self.session.query(Image)
+        if not isinstance(query, SearchQuery):
+            query = SearchQuery.from_tags(query, sort)
 
-            # I had to separate this from the initial query because SQLAlchemy
-            # apparently doesn't like it when there are joins without a WITH
-            # clause.
-            if len(tags) != 0:
-                query = query\
-                    .join(image_tag, image_tag.c.image_id == Image.id)\
-                    .join(Tag, Tag.id == image_tag.c.tag_id)
+        result_ids = self.get_result_ids(query)
 
-            # Add an AND = clause for each tag
-            for tag in tags:
-                query = query.filter(Tag.name == tag.name)
+        # Calculate offset based on page number
+        offset = max(page - 1, 0) * page_size
 
+        return result_ids[offset:offset + page_size].tolist()
 
-        # Calculate offset based on page number
-        offset = (page - 1) * page_size
 
-        return query\
-            .order_by(Image.id.desc())\
-            .offset(offset).limit(page_size)\
-            .all()
+    def get_result_ids(self, query: SearchQuery) -> Sequence[int]:
+        """Return the ordered ids of every image matching the query."""
+        generation = self.write_generation
+        result_ids = self.result_cache.get(query, generation)
+        if result_ids is None:
+            with self.read_connection() as connection:
+                result_ids = self.result_cache.put(
+                    query,
+                    generation,
+                    connection.scalars(self._build_search_statement(query, connection))
+                )
+
+        return result_ids
+
+
+    def get_result_cache_info(self) -> dict[str, float]:
+        """Return hit rate and memory usage of the search result cache."""
+        info = self.result_cache.info()
+        info["write_generation"] = self.write_generation
+        return info
+
+
+    def _build_search_statement(self, query: SearchQuery, connection: Connection):
+        statement = select(Image.id).order_by(*SORT_ORDERS[query.sort])
+
+        if query.tags:
+            # Filter out invalid tags
+            tag_ids = connection.scalars(
+                select(Tag.id).where(Tag.name.in_(query.tags))
+            ).all()
+
+            if len(tag_ids) == 0:
+                # Non-empty tags list and no valid tags where found
+                return statement.where(Image.id.is_(None))
+
+            # Images must carry every one of the valid tags
+            tagged_ids = select(image_tag.c.image_id)\
+                .where(image_tag.c.tag_id.in_(tag_ids))\
+                .group_by(image_tag.c.image_id)\
+                .having(func.count() == len(tag_ids))
+
+            statement = statement.where(Image.id.in_(tagged_ids))
+
+        return statement.where(*self._build_filters(query))
+
+
+    def _build_filters(self, query: SearchQuery) -> list:
+        """Return the conditions for the media filters of a query."""
+        filters = []
+        if query.is_video is not None:
+            filters.append(Image.is_video == query.is_video)
+        if query.mime_type is not None:
+            filters.append(Image.mime_type.startswith(query.mime_type, autoescape=True))
+        if query.min_width is not None:
+            filters.append(Image.width >= query.min_width)
+        if query.min_height is not None:
+            filters.append(Image.height >= query.min_height)
+        if query.min_file_size is not None:
+            filters.append(Image.file_size >= query.min_file_size)
+        if query.max_file_size is not None:
+            filters.append(Image.file_size <= query.max_file_size)
+        if query.min_duration is not None:
+            filters.append(Image.duration >= query.min_duration)
+        if query.max_duration is not None:
+            filters.append(Image.duration <= query.max_duration)
+
+        return filters
+
+
+    def _get_images_by_ids(self, ids: Sequence[int]) -> list[Image]:
+        """
+        Return images in the order of the given ids. Images still loaded
+        in the session are reused; the rest are fetched in one query.
+        """
+        images: dict[int, Image] = {}
+        missing_ids = []
+        for id in ids:
+            image_ = self.session.identity_map.get(identity_key(Image, id))
+            if image_ is not None and not inspect(image_).expired_attributes:
+                images[id] = image_
+            else:
+                missing_ids.append(id)
+
+        if missing_ids:
+            for image_ in self.session.scalars(
+                select(Image).where(Image.id.in_(missing_ids))
+            ):
+                images[column_to_int(image_.id)] = image_
+
+        return [images[id] for id in ids if id in images]
     
 
     def get_tags_by_image_id(self, id: int | Column[int]) -> list[Tag]:
+        self._sync_session()
         return self.session.query(Tag)\
             .join(image_tag, image_tag.c.tag_id == Tag.id)\
             .join(Image, Image.id == image_tag.c.image_id)\
@@ -228,7 +925,23 @@ class DatabaseManager:
             .all()
     
 
+    def get_tag_records(self, image_id: int | Column[int]) -> list[TagRecord]:
+        """
+        Return records for the tags of an image, sorted by name. Unlike
+        get_tags_by_image_id() this is safe to call from any thread.
+        """
+        with self.read_connection() as connection:
+            rows = connection.execute(
+                select(Tag.id, Tag.name)
+                .join(image_tag, image_tag.c.tag_id == Tag.id)
+                .where(image_tag.c.image_id == column_to_int(image_id))
+                .order_by(Tag.name)
+            )
+            return [TagRecord(id=row.id, name=row.name) for row in rows]
+
+
     def get_tag_by_name(self, name: str | Column[str]) -> Tag | None:
+        self._sync_session()
         return self.session.query(Tag)\
             .filter_by(name=name)\
             .first()
@@ -269,38 +982,54 @@ class DatabaseManager:
         Raises DatabaseItemExists if a tag with the same
         name exists
         """
-        tag = self.get_tag_by_name(name)
-        if tag is not None:
-            raise DatabaseItemExists(f"Tag <{tag.name}> already exists in database.")
-        
-        tag = Tag(name=name)
-
-        self.session.add(tag)
-        if not self.is_test: self.save()
+        self.submit_write(lambda session: self._insert_tag(session, name)).result()
 
         # Attempt to grab newly created tag
-        new_tag = self.get_tag_by_name(tag.name)
+        new_tag = self.get_tag_by_name(name)
         if new_tag is None:
-            raise DatabaseItemDoesNotExist(f"Tag <{tag.name}> does not exist.")
+            raise DatabaseItemDoesNotExist(f"Tag <{name}> does not exist.")
 
         logger.info(f"New tag created: <{new_tag.id}> | <{new_tag.name}>.")
     
         return self.get_tag_by_name(name)
     
 
+    def _insert_tag(self, session: Session, name: str) -> int:
+        tag = session.query(Tag).filter_by(name=name).first()
+        if tag is not None:
+            raise DatabaseItemExists(f"Tag <{tag.name}> already exists in database.")
+
+        tag = Tag(name=name)
+        session.add(tag)
+        session.flush()
+
+        return column_to_int(tag.id)
+    
+
     def add_tag_to_image(self, tag: Tag, image_id: int | Column[int]) -> bool:
+        tag_name = str(tag.name)
+        return self.submit_write(
+            lambda session: self._insert_image_tag(session, tag_name, image_id)
+        ).result()
+
+
+    def _insert_image_tag(
+            self,
+            session: Session,
+            tag_name: str,
+            image_id: int | Column[int]
+    ) -> bool:
         # Verify image id
-        if image:= self.get_image(image_id):
+        if image:= session.get(Image, image_id):
             # Verify the tag exists
-            if self.get_tag_by_name(tag.name) is None:
-                raise DatabaseItemDoesNotExist(f"Tag <{tag.name}> does not exist.")
+            tag = session.query(Tag).filter_by(name=tag_name).first()
+            if tag is None:
+                raise DatabaseItemDoesNotExist(f"Tag <{tag_name}> does not exist.")
 
             # Add tag to image if not on image already.
             if tag not in image.tags:
                 image.tags.append(tag)
                 logger.info(f"Added tag <{tag.name}> to image <{image.id}>.")
-
-                if not self.is_test: self.save()
                 return True
             else:
                 logger.info(f"Tag <{tag.name}> already exists for image <{image_id}>.")
@@ -322,11 +1051,22 @@ class DatabaseManager:
             tag_ids: list[int | Column[int]],
             image_id: int | Column[int]
     ):
-        tags = self.session.query(Tag)\
+        self.submit_write(
+            lambda session: self._delete_image_tags(session, tag_ids, image_id)
+        ).result()
+
+
+    def _delete_image_tags(
+            self,
+            session: Session,
+            tag_ids: list[int | Column[int]],
+            image_id: int | Column[int]
+    ) -> None:
+        tags = session.query(Tag)\
             .filter(Tag.id.in_(tag_ids))\
             .all()
         
-        image = self.get_image(image_id)
+        image = session.get(Image, image_id)
 
         if image and len(tags) > 0:
             image.remove_tags(tags)
@@ -338,29 +1078,38 @@ class DatabaseManager:
                 )
             )
 
-            if not self.is_test: self.save()
-
 
     def delete_tag(self, tag_id: int | Column[int]):
         self.delete_tags([tag_id])
     
 
     def delete_tags(self, tag_ids: list[int | Column[int]]):
+        # Tags are deleted in a single transaction
+        self.submit_write(
+            lambda session: self._delete_tag_rows(session, tag_ids)
+        ).result()
+
+        for tag_id in tag_ids:
+            self._forget(Tag, tag_id)
+
+
+    def _delete_tag_rows(
+            self,
+            session: Session,
+            tag_ids: list[int | Column[int]]
+    ) -> None:
         deleted_tags = []
         for tag_id in tag_ids:
-            tag_ = self.session.query(Tag)\
+            tag_ = session.query(Tag)\
                 .filter(Tag.id == tag_id)\
                 .first()
             
             if tag_ is None:
                 raise DatabaseItemDoesNotExist(f"Tag id <{tag_id}> does not exist.")
             
-            self.session.delete(tag_)
+            session.delete(tag_)
             deleted_tags.append(tag_)
 
-        # Call save after processing all tag ids.
-        if not self.is_test: self.save()
-
         logger.info(
             "Tags deleted from database: {}"\
             .format(" ".join([str(t.name) for t in deleted_tags]))
@@ -377,7 +1126,200 @@ class DatabaseManager:
         self.session.commit()
 
 
+    @contextmanager
+    def session_scope(self) -> Iterator[Session]:
+        """
+        Provide a short-lived session for a single unit of work. The
+        session is committed on success, rolled back on error and
+        closed either way, releasing every object it loaded.
+        """
+        session = self.session_factory()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+    def trim_session(self, max_identities: int | None = None) -> int:
+        """
+        Release the objects held by the long-lived session once it holds
+        more than max_identities of them.
+
+        Nothing is released while the session has unsaved changes.
+        Released objects stay usable for their loaded attributes but are
+        no longer refreshed from the database.
+
+        Returns the number of objects released.
+        """
+        if max_identities is None:
+            max_identities = self.SESSION_IDENTITY_LIMIT
+
+        identity_count = len(self.session.identity_map)
+        if identity_count <= max_identities:
+            return 0
+
+        if self.session.new or self.session.dirty or self.session.deleted:
+            return 0
+
+        self.session.expunge_all()
+        logger.debug(f"Released {identity_count} objects from the session.")
+
+        return identity_count
+
+
+    def submit_write(
+            self,
+            job: Callable[[Session], T],
+            invalidates_reads: bool = True,
+            durable: bool = False
+    ) -> "Future[T]":
+        """
+        Queue a write for the writer thread. The job is called with its
+        own session and committed once it returns.
+
+        Jobs that only touch tables no search reads, such as bookkeeping,
+        may pass invalidates_reads=False to keep cached results. Jobs
+        passing durable=True are synced to disk under every storage
+        profile, including bulk-import.
+        """
+        return self.writer.submit(job, notify=invalidates_reads, durable=durable)
+
+
+    @contextmanager
+    def read_connection(self) -> Iterator[Connection]:
+        """Borrow a read-only connection from the pool."""
+        with self.read_engine.connect() as connection:
+            yield connection
+
+
+    def set_storage_profile(self, name: str) -> StorageProfile:
+        """
+        Switch the SQLite settings of all connections. Returns the
+        previous profile.
+
+        Connections pick up the new profile the next time they are
+        used, so a write already in progress finishes under the old one.
+        """
+        previous_profile = self.storage_profile
+        self.storage_profile = get_storage_profile(name)
+
+        if previous_profile != self.storage_profile:
+            logger.info(f"Storage profile set to <{name}>.")
+
+        return previous_profile
+
+
+    @contextmanager
+    def storage_profile_scope(self, name: str) -> Iterator[StorageProfile]:
+        """
+        Use a storage profile for the duration of a job, such as the
+        bulk-import profile during an import, and restore the previous
+        profile afterwards.
+        """
+        previous_profile = self.set_storage_profile(name)
+        try:
+            yield self.storage_profile
+        finally:
+            # Let queued writes finish under the job's profile
+            self.writer.drain()
+            self.set_storage_profile(previous_profile.name)
+
+
+    def close(self) -> None:
+        """Finish queued writes and release all connections."""
+        self.writer.close()
+        self.session.close()
+        self.engine.dispose()
+        self.read_engine.dispose()
+        self.thumbnail_pack.close()
+        if self.original_pack is not None:
+            self.original_pack.close()
+        self.mipmap_store.close()
+        self.local_cache.close()
+        if self.local_cache.enabled:
+            info = self.local_cache.info()
+            logger.info(
+                f"Local cache: {info['hit_rate']:.0%} of {info['hits'] + info['misses']} reads hit, "
+                f"{info['bytes_saved'] / 1024 / 1024:.1f} MiB not read from the library."
+            )
+        with self._data_version_lock:
+            if self._data_version is not None:
+                self._data_version[0].close()
+                self._data_version = None
+
+
+    def _sync_session(self) -> None:
+        """
+        Expire objects in the long-lived session after the writer thread
+        has changed the database so they are reloaded on next access.
+        """
+        generation = self.write_generation
+        if self._session_generation != generation:
+            self.session.expire_all()
+            self._session_generation = generation
+
+
+    def _forget(self, model: type[Image] | type[Tag], id: int | Column[int]) -> None:
+        """
+        Detach a deleted object from the long-lived session. It keeps
+        its loaded attributes instead of failing to refresh them.
+        """
+        instance = self.session.identity_map.get(identity_key(model, id))
+        if instance is not None:
+            self.session.expunge(instance)
+
+
+    def _bump_write_generation(self) -> None:
+        with self._generation_lock:
+            self.write_generation += 1
+
+
+    def check_external_writes(self) -> bool:
+        """
+        Discard cached reads if the database was committed to since the
+        last call by anything but this manager's writer, such as the GUI
+        while a server reads the same library. Returns whether it was.
+
+        Only needed by long-running readers; writes of this manager
+        invalidate its caches as they commit. May be called from any
+        thread.
+        """
+        with self._data_version_lock:
+            if self._data_version is None:
+                connection = sqlite3.connect(
+                    f"{pathlib.Path(os.path.abspath(self.db_filepath)).as_uri()}?mode=ro",
+                    uri=True,
+                    check_same_thread=False
+                )
+                version = connection.execute("PRAGMA data_version").fetchone()[0]
+                self._data_version = (connection, version)
+                return False
+
+            connection, last_version = self._data_version
+            # Changes whenever another connection commits, which includes
+            # this manager's own writer
+            version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if version == last_version:
+                return False
+            self._data_version = (connection, version)
+
+        # Imports elsewhere also add to the packs
+        self.thumbnail_pack.refresh()
+        if self.original_pack is not None:
+            self.original_pack.refresh()
+        elif os.path.isdir(self.original_pack_dir_path):
+            self.original_pack = PackStore(self.original_pack_dir_path, durable=True)
+
+        self._bump_write_generation()
+        return True
+
+
     def search_tags(self, keyword: str | None = None) -> list[Tag]:
+        self._sync_session()
         q =  self.session.query(Tag)
         if isinstance(keyword, str):
             q = q.filter(Tag.name.ilike(f"{keyword}%"))\
@@ -405,6 +1347,130 @@ class DatabaseManager:
             return hashlib.sha256(infile.read()).hexdigest()
 
     
+    def get_cached_path(self, path: str) -> str:
+        """
+        Return where to read a library file, such as the result of
+        get_image_path(), from. This is its copy in the local cache when
+        there is one, and otherwise the file itself, which is then
+        cached in the background. Only use the result for reading.
+        """
+        return self.local_cache.read_path(path)
+
+
+    def get_cached_image_path(self, filename: str | Column[str]) -> str:
+        """
+        Return where to read a stored original from, see
+        get_cached_path(). Packed originals are unpacked to a file.
+        """
+        filename = str(filename)
+        if not self.is_packed(filename):
+            return self.get_cached_path(self.get_image_path(filename))
+
+        image_path = self.get_image_path(filename)
+        unpacked_path = self.unpacked_cache.lookup(image_path) \
+            or self.unpacked_cache.put(image_path, self.read_image_data(filename))
+        # Readers fail on the missing file as they would for a lost one
+        return unpacked_path or image_path
+
+
+    def is_packed(self, filename: str | Column[str]) -> bool:
+        """Return whether a stored original lives in the original pack."""
+        return self.original_pack is not None and file_key(str(filename)) in self.original_pack
+
+
+    def read_image_data(self, filename: str | Column[str]) -> bytes | memoryview:
+        """
+        Return the content of a stored original. Packed originals are a
+        view of the pack's mapped segment, so nothing is copied.
+        """
+        filename = str(filename)
+        if self.original_pack is not None:
+            data = self.original_pack.get(file_key(filename))
+            if data is not None:
+                return data
+
+        with open(self.get_image_path(filename), "rb") as infile:
+            return infile.read()
+
+
+    def open_image(self, filename: str | Column[str]) -> BinaryIO:
+        """Open a stored original for reading, wherever it is stored."""
+        filename = str(filename)
+        if self.original_pack is not None:
+            data = self.original_pack.get(file_key(filename))
+            if data is not None:
+                return io.BytesIO(data)
+
+        return open(self.get_image_path(filename), "rb")
+
+
+    @contextmanager
+    def image_file(self, filename: str | Column[str]) -> Iterator[str]:
+        """
+        Provide the path of a stored original for code that can only
+        read files, such as OpenCV. Packed originals are written to a
+        temporary file for the duration.
+        """
+        filename = str(filename)
+        if not self.is_packed(filename):
+            yield self.get_image_path(filename)
+            return
+
+        # Keep the extension, which decoders may go by
+        handle, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+        try:
+            with os.fdopen(handle, "wb") as outfile:
+                outfile.write(self.read_image_data(filename))
+            yield tmp_path
+        finally:
+            os.remove(tmp_path)
+
+
+    def pack_original(self, filename: str | Column[str]) -> bool:
+        """
+        Move the file of a stored still into the original pack. Returns
+        False if packing is off, or the file is too large, already
+        packed or does not match its hash.
+        """
+        filename = str(filename)
+        image_path = self.get_image_path(filename)
+        if self.original_pack is None or self.pack_max_bytes <= 0:
+            return False
+
+        if self.is_packed(filename):
+            # Left behind by a repack that did not finish
+            if os.path.exists(image_path):
+                os.remove(image_path)
+            return False
+
+        try:
+            if os.path.getsize(image_path) > self.pack_max_bytes:
+                return False
+            with open(image_path, "rb") as infile:
+                data = infile.read()
+        except OSError:
+            return False
+
+        # The file is removed once packed, so make sure it is intact
+        if hashlib.sha256(data).hexdigest() != filename[:64]:
+            logger.warning(f"Not packing <{filename}>, its content does not match its name.")
+            return False
+
+        self.original_pack.put(file_key(filename), data)
+        os.remove(image_path)
+        return True
+
+
+    def _should_pack(self, size: int, is_video: bool) -> bool:
+        # Videos are played from their file
+        return self.original_pack is not None and not is_video and 0 < size <= self.pack_max_bytes
+
+
+    def get_local_cache_info(self) -> dict[str, float]:
+        """Return hit rate, bytes saved and disk usage of the local cache."""
+        return self.local_cache.info()
+
+
     def get_thumbnail_path(self, filename: str | Column[str]) -> str:
         filename = str(filename)
         # Extract hash from filename and use it with jpg
@@ -422,27 +1488,194 @@ class DatabaseManager:
         ))
 
 
-def create_thumbnail(video_path, thumbnail_path):
-    cap = cv2.VideoCapture(video_path)
+    def get_storyboard_paths(self, filename: str | Column[str]) -> tuple[str, str]:
+        """Return the sprite sheet and index paths of a video's storyboard."""
+        filename = str(filename)
+        stem = os.path.splitext(filename)[0]
+        thumbnail_dir = self.get_thumbnail_dir(filename)
+        return (
+            os.path.join(thumbnail_dir, f"storyboard_{stem}.jpg"),
+            os.path.join(thumbnail_dir, f"storyboard_{stem}.json")
+        )
 
-    # Get the video duration in ms
-    total_duration = cap.get(cv2.CAP_PROP_FRAME_COUNT) / cap.get(cv2.CAP_PROP_FPS) * 1000
-    
-    # Pick a time to extract a frame from the video
-    time = total_duration / 4   # 1/4 into the video
 
-    # Set the position of the frame to capture (in ms)
-    cap.set(cv2.CAP_PROP_POS_MSEC, time)
+    def generate_storyboard(self, filename: str | Column[str]) -> StoryboardIndex:
+        """Create the hover storyboard of a stored video."""
+        filename = str(filename)
+        os.makedirs(self.get_thumbnail_dir(filename), exist_ok=True)
+
+        sprite_path, index_path = self.get_storyboard_paths(filename)
+        index = create_storyboard(self.get_image_path(filename), sprite_path, index_path)
+        self.local_cache.remove(sprite_path)
+        self.local_cache.remove(index_path)
+        return index
+
 
-    success, frame = cap.read()
+    def get_proxy_path(self, filename: str | Column[str]) -> str | None:
+        """
+        Return the low resolution copy of a video to play in its place,
+        if there is one.
+        """
+        if not self.proxy_store.enabled:
+            return None
+        return self.proxy_store.open(str(filename))
+
+
+    def generate_proxy(self, filename: str | Column[str], evict: bool = True) -> bool:
+        """
+        Create the low resolution copy of a stored video. Returns False if
+        the video is small enough to be played as is. With evict=False,
+        no other proxy is removed to make room for it.
+        """
+        filename = str(filename)
+        return self.proxy_store.create(self.get_image_path(filename), filename, evict=evict)
+
+
+    def generate_thumbnail(
+            self,
+            filename: str | Column[str],
+            is_video: bool,
+            source_path: str | None = None
+    ) -> str:
+        """
+        Create the gallery thumbnail of a stored image or video and
+        return its path. source_path is a file with the same content to
+        read instead of the stored original, such as the imported file.
+        """
+        filename = str(filename)
+        os.makedirs(self.get_thumbnail_dir(filename), exist_ok=True)
+
+        thumbnail_path = self.get_thumbnail_path(filename)
+        with nullcontext(source_path) if source_path else self.image_file(filename) as image_path:
+            if is_video:
+                create_video_thumbnail(image_path, thumbnail_path)
+            else:
+                create_image_thumbnail(image_path, thumbnail_path)
+        self.pack_thumbnail(filename)
+        # A regenerated thumbnail keeps its name
+        self.local_cache.remove(thumbnail_path)
 
-    if success:
-        cv2.imwrite(thumbnail_path, frame)
-    else:
-        raise ThumbnailCreationException()
+        return thumbnail_path
 
-    # Release the video capture
-    cap.release()
+
+    def pack_thumbnail(self, filename: str | Column[str]) -> bool:
+        """
+        Copy the thumbnail file of an image into the thumbnail pack.
+        Returns False if there is no thumbnail file.
+        """
+        filename = str(filename)
+        try:
+            with open(self.get_thumbnail_path(filename), "rb") as infile:
+                data = infile.read()
+        except FileNotFoundError:
+            return False
+
+        self.thumbnail_pack.put(pack_key(filename), data)
+        return True
+
+
+    def generate_mipmap(self, image_id: int, filename: str | Column[str]) -> bool:
+        """
+        Create the overview tile of an image from its thumbnail. Returns
+        False if the image has no readable thumbnail.
+        """
+        tile = create_mipmap(self.get_thumbnail_path(filename), self.mipmap_store.size)
+        if tile is None:
+            return False
+
+        self.mipmap_store.put(image_id, tile)
+        return True
+
+
+    def get_packed_thumbnails(self, filenames: Sequence[str]) -> dict[str, memoryview]:
+        """
+        Return the packed thumbnails of the given images, keyed by
+        filename. The data is a view of the pack's mapped segments.
+        Images missing from the pack are left out.
+        """
+        keys = {pack_key(filename): filename for filename in filenames}
+        return {
+            keys[key]: data
+            for key, data in self.thumbnail_pack.get_many(keys).items()
+        }
+
+
+    def save_gallery_snapshot(self, page_size: int) -> GallerySnapshot:
+        """
+        Save the first page of the unfiltered gallery with its
+        thumbnails, so the next start can show it before querying.
+        """
+        records = self.search_image_records(SearchQuery(), 1, page_size)
+        packed_thumbnails = self.get_packed_thumbnails([record.filename for record in records])
+
+        thumbnails: list[bytes | None] = []
+        for record in records:
+            data = packed_thumbnails.get(record.filename)
+            if data is not None:
+                thumbnails.append(bytes(data))
+            elif os.path.exists(self.get_thumbnail_path(record.filename)):
+                with open(self.get_thumbnail_path(record.filename), "rb") as infile:
+                    thumbnails.append(infile.read())
+            else:
+                # Thumbnail-less stills are shown from the original
+                thumbnails.append(None)
+
+        snapshot = GallerySnapshot(page_size, records, thumbnails)
+        write_snapshot(self.snapshot_path, snapshot)
+        return snapshot
+
+
+    def load_gallery_snapshot(self) -> GallerySnapshot | None:
+        return read_snapshot(self.snapshot_path)
+
+
+def _process_exists(pid: int) -> bool:
+    """Return whether a process is running, such as another importer."""
+    if os.name == "nt":
+        # os.kill() would stop the process on Windows
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+    return True
+
+
+def migrate_schema(engine: Engine) -> None:
+    """
+    Add columns and indexes missing from databases created by older
+    versions. New columns are added empty, so they must be nullable.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                # Missing tables are created by create_all()
+                continue
+
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                ))
+                logger.info(f"Added column <{table.name}.{column.name}> to database.")
+
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
 
 
 if __name__ == "__main__":
@@ -48,4 +48,10 @@ class ThumbnailCreationException(DatabaseException):
 
     This is an exception meant to be raised when a thumbnail
     fails to be generated for a video.
-    """
\ No newline at end of file
+    """
+
+
+class ProxyCreationException(DatabaseException):
+    """
+    Exception class for failure to create a proxy video.
+    """
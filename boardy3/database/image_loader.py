@@ -1,20 +1,9 @@
-from collections.abc import Iterator
-import os
-import tempfile
-from urllib.parse import urlparse
-
-import magic
 from PyQt6.QtCore import pyqtSignal, QThread
-import requests
-from requests_ratelimiter import LimiterSession
-
-from boardy3.database.database_manager import DatabaseManager, DatabaseItemExists
-from boardy3.utils import get_logger
-
 
-requests.packages.urllib3.disable_warnings()  # type: ignore
-
-logger = get_logger(__name__)
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.importer import create_session, find_files, import_file, import_url
+# Kept importable from here for existing callers
+from boardy3.database.media_info import is_image, is_video
 
 
 class ImageLoader(QThread):
@@ -34,17 +23,10 @@ class ImageLoader(QThread):
     def run(self) -> None:
         total_files = len(self.file_paths)
         for i, file_path in enumerate(self.file_paths):
-            try:
-                if is_image(file_path):
-                    self.db_manager.add_image(file_path)
-                    logger.info(f"New image added {file_path}.")
-                elif is_video(file_path):
-                    self.db_manager.add_image(file_path, is_video=True)
-                    logger.info(f"New video added {file_path}.")
-            except DatabaseItemExists:
-                # Skip items that already exist in the database
-                logger.debug(f"Image <{file_path}> already exists.")
-                pass
+            # Cancelled between files, so no import is cut short
+            if self.isInterruptionRequested():
+                break
+            import_file(self.db_manager, file_path)
 
             # Update progress
             self.progress_updated.emit(int((i + 1) / total_files * 100))
@@ -74,34 +56,19 @@ class DirImageLoader(QThread):
 
     
     def run(self) -> None:
-        self.total_files = len(list(self._find_images()))
+        self.total_files = len(list(find_files(self.dirpath)))
         self.scan_completed.emit(self.total_files)
 
-        for i, file_path in enumerate(self._find_images()):
-            try:
-                if is_image(file_path):
-                    self.db_manager.add_image(file_path, tags=["general"])
-                    logger.info(f"New image added {file_path}.")
-            except DatabaseItemExists:
-                # Skip items that already exist in the database
-                logger.debug(f"Image <{file_path}> already exists.")
-                pass
+        for i, file_path in enumerate(find_files(self.dirpath)):
+            if self.isInterruptionRequested():
+                break
+            import_file(self.db_manager, file_path, tags=["general"], videos=False)
 
             # Update progress
             self.progress_updated.emit(int((i + 1) / self.total_files * 100))
 
         self.finished.emit()
 
-    
-    def _find_images(self) -> Iterator[str]:
-        """
-        Iterate through all files and subdirectories of
-        dirpath and return a generator of all image files.
-        """
-        for (dirpath, _, filenames) in os.walk(self.dirpath):
-            for filename in filenames:
-                yield os.path.join(dirpath, filename)
-
 
 class NetworkImageLoader(QThread):
     """
@@ -119,77 +86,15 @@ class NetworkImageLoader(QThread):
         super().__init__()
         self.db_manager = db_manager
         self.image_urls = image_urls
-        self.session = self._create_session()
+        self.session = create_session()
 
     
     def run(self) -> None:
         for i, image_url in enumerate(self.image_urls):
+            if self.isInterruptionRequested():
+                break
+            import_url(self.db_manager, self.session, image_url, tags=["general"])
 
-            # Create a tmp file to temporarily store images
-            with open(tempfile.NamedTemporaryFile(dir=self.db_manager.image_dir_path).name, "wb+") as tmp_file:
-
-                try:
-                    if not self._validate_url(image_url):
-                        logger.debug(f"Invalid url skipped: <{image_url}>")
-                        continue
-
-                    with self.session.get(image_url) as response:
-                        if not response.ok: continue
-
-                        # Write content to tmp file
-                        tmp_file.write(response.content)
-
-                        if is_image(tmp_file.name):
-                            self.db_manager.add_image(tmp_file.name, tags=["general"])
-                            logger.info(f"New image added {image_url}.")
-
-                except DatabaseItemExists:
-                    # Skip items that already exist in the database
-                    logger.debug(f"Image <{image_url}> already exists.")
-                    pass
-                finally:
-                    if not tmp_file.closed:
-                        tmp_file.close()
-                        os.remove(tmp_file.name)
-            
             self.progress_updated.emit(int((i + 1) / len(self.image_urls) * 100))
 
         self.finished.emit()
-
-        
-    @staticmethod
-    def _create_session() -> requests.Session:
-        session = LimiterSession(per_minute=50)
-        session.verify = False
-        return session
-    
-
-    def _validate_url(self, url: str) -> bool:
-        parsed = urlparse(url)
-
-        if parsed.scheme not in ["http", "https"]:
-            return False
-        
-        if parsed.netloc.strip() == "":
-            return False
-        
-        return True
-        
-
-
-def is_image(file_path: str) -> bool:
-    try:
-        mtype = magic.from_file(file_path, mime=True)
-        return mtype.startswith("image/")
-    except UnicodeDecodeError:
-        # This should come from the python magic lib
-        return False
-
-
-def is_video(file_path: str) -> bool:
-    try:
-        mtype = magic.from_file(file_path, mime=True)
-        return mtype.startswith("video/")
-    except UnicodeDecodeError:
-        # This should come from the python magic lib
-        return False
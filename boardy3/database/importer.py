@@ -0,0 +1,138 @@
+from collections.abc import Iterator
+import os
+import tempfile
+from typing import TYPE_CHECKING, NamedTuple
+from urllib.parse import urlparse
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.exceptions import DatabaseItemExists
+from boardy3.database.media_info import is_image, is_video
+from boardy3.utils import get_logger
+
+if TYPE_CHECKING:
+    import requests
+
+
+logger = get_logger(__name__)
+
+# Downloads allowed per minute and per session
+DOWNLOADS_PER_MINUTE = 50
+
+
+class ImportResult(NamedTuple):
+    """
+    Outcome of importing one file or url. status is one of "added",
+    "exists", "skipped" (not a supported media file) or "failed".
+    """
+    source: str
+    status: str
+    error: str | None = None
+
+
+def import_file(
+        db_manager: DatabaseManager,
+        file_path: str,
+        tags: list[str] | None = None,
+        videos: bool = True,
+        mode: str | None = None
+) -> ImportResult:
+    """
+    Add a local image, or video if videos is True, to the database.
+    mode overrides the import mode of the database.
+
+    Expected failures are reported in the result instead of raised, so
+    one bad file does not stop a bulk import.
+    """
+    try:
+        if is_image(file_path):
+            db_manager.add_image(file_path, tags=tags, mode=mode)
+            logger.info(f"New image added {file_path}.")
+        elif videos and is_video(file_path):
+            db_manager.add_image(file_path, tags=tags, is_video=True, mode=mode)
+            logger.info(f"New video added {file_path}.")
+        else:
+            return ImportResult(file_path, "skipped")
+    except DatabaseItemExists:
+        # Skip items that already exist in the database
+        logger.debug(f"Image <{file_path}> already exists.")
+        return ImportResult(file_path, "exists")
+    except Exception as e:
+        logger.error(f"Could not import <{file_path}>: {e}")
+        return ImportResult(file_path, "failed", str(e))
+
+    return ImportResult(file_path, "added")
+
+
+def import_url(
+        db_manager: DatabaseManager,
+        session: "requests.Session",
+        image_url: str,
+        tags: list[str] | None = None
+) -> ImportResult:
+    """Download an image and add it to the database."""
+    if not is_valid_url(image_url):
+        logger.debug(f"Invalid url skipped: <{image_url}>")
+        return ImportResult(image_url, "skipped", "Invalid url.")
+
+    # Keep the extension of the url, add_image names files after it
+    suffix = os.path.splitext(urlparse(image_url).path)[1]
+    # Downloaded to the system's temporary directory, so a crash
+    # mid-download leaves nothing behind in the library
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            with session.get(image_url) as response:
+                if not response.ok:
+                    return ImportResult(image_url, "failed", f"HTTP {response.status_code}.")
+                tmp_file.write(response.content)
+
+        if not is_image(tmp_path):
+            return ImportResult(image_url, "skipped")
+
+        # Renamed into place where the temporary directory is on the
+        # library's filesystem, copied otherwise
+        db_manager.add_image(tmp_path, tags=tags, mode="move")
+        logger.info(f"New image added {image_url}.")
+    except DatabaseItemExists:
+        # Skip items that already exist in the database
+        logger.debug(f"Image <{image_url}> already exists.")
+        return ImportResult(image_url, "exists")
+    except Exception as e:
+        logger.error(f"Could not import <{image_url}>: {e}")
+        return ImportResult(image_url, "failed", str(e))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return ImportResult(image_url, "added")
+
+
+def find_files(dirpath: str) -> Iterator[str]:
+    """Recursively iterate through the files of a directory."""
+    for (parent, _, filenames) in os.walk(dirpath):
+        for filename in filenames:
+            yield os.path.join(parent, filename)
+
+
+def create_session() -> "requests.Session":
+    # Only url imports need requests, which is slow to import
+    import requests
+    from requests_ratelimiter import LimiterSession
+
+    requests.packages.urllib3.disable_warnings()  # type: ignore
+
+    session = LimiterSession(per_minute=DOWNLOADS_PER_MINUTE)
+    session.verify = False
+    return session
+
+
+def is_valid_url(url: str) -> bool:
+    parsed = urlparse(url)
+
+    if parsed.scheme not in ["http", "https"]:
+        return False
+
+    if parsed.netloc.strip() == "":
+        return False
+
+    return True
@@ -0,0 +1,310 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import shutil
+import threading
+
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+# Threads copying missed files into the cache
+POPULATE_THREADS = 2
+
+# Library files are named after the sha256 of the original's content,
+# with a prefix for derived files such as "sample_" for thumbnails
+_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class LocalCache:
+    """
+    Read-through copy of library files on a fast local disk, for
+    libraries kept on slow storage such as a network share.
+
+    Files are cached under their name, which holds the content hash of
+    the original, so a cached copy never goes stale as long as derived
+    files are invalidated when they are regenerated. A missed file is
+    read from its source while a copy is made in the background. Once
+    the cache grows past max_bytes, the least recently read files are
+    removed. Reads touch the cached file, so the order survives
+    restarts.
+
+    A cache without a directory or budget is disabled and every path is
+    returned as is. The cache may be used from several threads.
+    """
+
+    def __init__(self, directory: str | None, max_bytes: int = 0) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        # Bytes read from the cache instead of their source
+        self.bytes_saved = 0
+        self.bytes_copied = 0
+        self.evictions = 0
+
+        # Cached file name -> size, least recently used first. Read from
+        # the directory on first use.
+        self._entries: OrderedDict[str, int] | None = None
+        self._usage = 0
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) and self.max_bytes > 0
+
+
+    def get_path(self, source_path: str) -> str:
+        """Return where the copy of a library file is kept."""
+        assert self.directory is not None
+        name = os.path.basename(source_path)
+        match = _HASH_PATTERN.search(name)
+        digest = match.group() if match is not None else name
+        return os.path.join(self.directory, digest[:2], digest[2:4], name)
+
+
+    def read_path(self, source_path: str) -> str:
+        """
+        Return the path to read a library file from: its cached copy if
+        there is one, else the source, which is then copied in the
+        background.
+        """
+        if not self.enabled:
+            return source_path
+
+        cache_path = self.lookup(source_path)
+        if cache_path is not None:
+            return cache_path
+
+        name = os.path.basename(source_path)
+        with self._lock:
+            if name in self._pending:
+                return source_path
+            self._pending.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=POPULATE_THREADS, thread_name_prefix="boardy3-local-cache"
+                )
+            self._executor.submit(self._populate, source_path)
+
+        return source_path
+
+
+    def lookup(self, source_path: str) -> str | None:
+        """Return the cached copy of a library file, if there is one."""
+        if not self.enabled:
+            return None
+
+        name = os.path.basename(source_path)
+        with self._lock:
+            entries = self._load()
+            size = entries.get(name)
+            if size is not None:
+                entries.move_to_end(name)
+
+        if size is not None:
+            cache_path = self.get_path(source_path)
+            try:
+                # Mark as recently used
+                os.utime(cache_path)
+            except OSError:
+                # Removed behind the cache's back
+                self._forget(name)
+            else:
+                with self._lock:
+                    self.hits += 1
+                    self.bytes_saved += size
+                return cache_path
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+
+    def put(self, source_path: str, data: bytes | memoryview) -> str | None:
+        """
+        Cache data as the copy of a library file that has no file of its
+        own, such as a packed original. Returns the cached path, or None
+        if it could not be written.
+        """
+        if not self.enabled or len(data) > self.max_bytes:
+            return None
+
+        cache_path = self.get_path(source_path)
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, "wb") as outfile:
+                outfile.write(data)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.debug(f"Could not cache <{source_path}>: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        self._add(os.path.basename(source_path), len(data))
+        return cache_path
+
+
+    def populate(self, source_path: str) -> bool:
+        """
+        Copy a library file into the cache and make room for it. Returns
+        False if the file could not be copied or does not fit at all.
+        """
+        if not self.enabled:
+            return False
+
+        name = os.path.basename(source_path)
+        cache_path = self.get_path(source_path)
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            size = os.path.getsize(source_path)
+            if size > self.max_bytes:
+                return False
+
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Copied under a temporary name so readers never see a
+            # partial file
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.debug(f"Could not cache <{source_path}>: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        self._add(name, size)
+        return True
+
+
+    def remove(self, source_path: str) -> None:
+        """Drop the copy of a library file, if it was cached."""
+        if not self.enabled:
+            return
+
+        try:
+            os.remove(self.get_path(source_path))
+        except OSError:
+            pass
+        self._forget(os.path.basename(source_path))
+
+
+    def evict(self) -> int:
+        """
+        Remove the least recently read files until the cache fits its
+        budget. Returns the number of bytes freed.
+        """
+        freed = 0
+        with self._lock:
+            entries = self._load()
+            while self._usage > self.max_bytes and entries:
+                name, size = entries.popitem(last=False)
+                self._usage -= size
+                self.evictions += 1
+                freed += size
+                try:
+                    os.remove(self.get_path(name))
+                except OSError:
+                    pass
+                logger.debug(f"Evicted <{name}> from the local cache.")
+
+        return freed
+
+
+    def usage(self) -> int:
+        """Return the bytes used by all cached files."""
+        with self._lock:
+            self._load()
+            return self._usage
+
+
+    def info(self) -> dict[str, float]:
+        """Return hit/miss counters, the bytes saved and the disk used."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "bytes_copied": self.bytes_copied,
+                "evictions": self.evictions,
+                "entries": len(self._entries) if self._entries is not None else 0,
+                "bytes": self._usage,
+            }
+
+
+    def wait(self) -> None:
+        """Wait for the copies in progress. Mostly useful for tests."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+    def close(self) -> None:
+        """Stop copying; copies not yet started are dropped."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+    def _populate(self, source_path: str) -> None:
+        try:
+            self.populate(source_path)
+        finally:
+            with self._lock:
+                self._pending.discard(os.path.basename(source_path))
+
+
+    def _add(self, name: str, size: int) -> None:
+        with self._lock:
+            entries = self._load()
+            self._usage += size - entries.pop(name, 0)
+            entries[name] = size
+            self.bytes_copied += size
+        self.evict()
+
+
+    def _forget(self, name: str) -> None:
+        with self._lock:
+            entries = self._load()
+            size = entries.pop(name, None)
+            if size is not None:
+                self._usage -= size
+
+
+    def _load(self) -> OrderedDict[str, int]:
+        """Return the entries, scanning the directory on first use."""
+        if self._entries is not None:
+            return self._entries
+
+        assert self.directory is not None
+        files = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(".tmp"):
+                    # Left over from an interrupted copy
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, filename, stat.st_size))
+
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self._usage = sum(self._entries.values())
+        return self._entries
@@ -0,0 +1,166 @@
+import math
+import os
+import struct
+from typing import BinaryIO, NamedTuple
+
+from boardy3.utils import LazyModule
+
+
+cv2 = LazyModule("cv2")
+magic = LazyModule("magic")
+
+
+class MediaInfo(NamedTuple):
+    """Properties of a media file captured when it is imported."""
+    width: int | None
+    height: int | None
+    file_size: int
+    mime_type: str | None
+    frame_count: int | None = None
+    duration: float | None = None   # Seconds
+
+
+def probe_media(filepath: str, is_video: bool = False) -> MediaInfo:
+    file_size = os.path.getsize(filepath)
+    mime_type = get_mime_type(filepath)
+
+    if is_video:
+        width, height, frame_count, duration = probe_video(filepath)
+        return MediaInfo(width, height, file_size, mime_type, frame_count, duration)
+
+    size = read_image_size(filepath)
+    width, height = size if size else (None, None)
+    return MediaInfo(width, height, file_size, mime_type)
+
+
+def get_mime_type(filepath: str) -> str | None:
+    try:
+        return magic.from_file(filepath, mime=True)
+    except UnicodeDecodeError:
+        # This should come from the python magic lib
+        return None
+
+
+def is_image(file_path: str) -> bool:
+    mime_type = get_mime_type(file_path)
+    return mime_type is not None and mime_type.startswith("image/")
+
+
+def is_video(file_path: str) -> bool:
+    mime_type = get_mime_type(file_path)
+    return mime_type is not None and mime_type.startswith("video/")
+
+
+def probe_video(filepath: str) -> tuple[int | None, int | None, int | None, float | None]:
+    """Return the width, height, frame count and duration of a video."""
+    cap = cv2.VideoCapture(filepath)
+    try:
+        if not cap.isOpened():
+            return None, None, None, None
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or None
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or None
+
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        frame_count = int(frame_count) if is_positive(frame_count) else None
+
+        # Some containers report a missing or absurd frame rate
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if frame_count is not None and is_positive(fps):
+            duration = frame_count / fps
+        else:
+            duration = None
+
+        return width, height, frame_count, duration
+    finally:
+        cap.release()
+
+
+def read_image_size(filepath: str) -> tuple[int, int] | None:
+    """
+    Return the width and height of an image. Common formats are read
+    from their headers without decoding the image.
+    """
+    try:
+        with open(filepath, "rb") as infile:
+            size = _read_header_size(infile)
+    except (OSError, struct.error, IndexError, ValueError):
+        # Truncated or malformed headers are left to the decoder
+        size = None
+
+    if size is not None:
+        return size
+
+    # Fall back to decoding the image for other formats
+    image = cv2.imread(filepath, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return None
+
+    return image.shape[1], image.shape[0]
+
+
+def _read_header_size(infile: BinaryIO) -> tuple[int, int] | None:
+    head = infile.read(32)
+
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return struct.unpack(">II", head[16:24])
+
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", head[6:10])
+
+    if head.startswith(b"BM"):
+        width, height = struct.unpack("<ii", head[18:26])
+        return width, abs(height)
+
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return _read_webp_size(head)
+
+    if head.startswith(b"\xff\xd8"):
+        infile.seek(2)
+        return _read_jpeg_size(infile)
+
+    return None
+
+
+def _read_webp_size(head: bytes) -> tuple[int, int] | None:
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3fff, height & 0x3fff
+    if chunk == b"VP8L":
+        bits = struct.unpack("<I", head[21:25])[0]
+        return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _read_jpeg_size(infile: BinaryIO) -> tuple[int, int] | None:
+    # Walk the segment markers until a start of frame marker
+    while True:
+        marker = infile.read(2)
+        if len(marker) < 2 or marker[0] != 0xff:
+            return None
+
+        # Skip fill bytes
+        while marker[1] == 0xff:
+            marker = marker[1:] + infile.read(1)
+            if len(marker) < 2:
+                return None
+
+        if marker[1] in (0xd8, 0x01) or 0xd0 <= marker[1] <= 0xd7:
+            # Markers without a payload
+            continue
+
+        length = struct.unpack(">H", infile.read(2))[0]
+        if 0xc0 <= marker[1] <= 0xcf and marker[1] not in (0xc4, 0xc8, 0xcc):
+            height, width = struct.unpack(">xHH", infile.read(5))
+            return width, height
+
+        infile.seek(length - 2, os.SEEK_CUR)
+
+
+def is_positive(value: float) -> bool:
+    return math.isfinite(value) and value > 0
@@ -0,0 +1,188 @@
+from collections.abc import Sequence
+import os
+import threading
+
+from boardy3.utils import LazyModule
+
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+
+# Side in pixels of the square tiles shown in the overview
+MIPMAP_SIZE = 32
+# The tile file grows by this many slots at a time
+MIPMAP_GROWTH = 4096
+# Drawn where an image has no tile yet
+MISSING_TILE_COLOR = (48, 48, 48)
+
+
+def create_mipmap(thumbnail_path: str, size: int = MIPMAP_SIZE) -> "np.ndarray | None":
+    """
+    Return an RGB tile of size x size pixels cut from the middle of a
+    thumbnail, or None if the thumbnail cannot be read.
+    """
+    thumbnail = cv2.imread(thumbnail_path, cv2.IMREAD_COLOR)
+    if thumbnail is None:
+        return None
+
+    height, width = thumbnail.shape[:2]
+    side = min(height, width)
+    top, left = (height - side) // 2, (width - side) // 2
+    square = thumbnail[top:top + side, left:left + side]
+
+    tile = cv2.resize(square, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(tile, cv2.COLOR_BGR2RGB)
+
+
+def compose_tiles(tiles: "np.ndarray", columns: int) -> "np.ndarray":
+    """
+    Lay out (n, size, size, 3) tiles row by row in one RGB image. The
+    last row is padded with the missing tile color.
+    """
+    count, size = tiles.shape[0], tiles.shape[1]
+    rows = max(-(-count // columns), 1)
+
+    grid = np.empty((rows * columns, size, size, 3), dtype=np.uint8)
+    grid[:count] = tiles
+    grid[count:] = MISSING_TILE_COLOR
+
+    return np.ascontiguousarray(
+        grid.reshape(rows, columns, size, size, 3)
+            .transpose(0, 2, 1, 3, 4)
+            .reshape(rows * size, columns * size, 3)
+    )
+
+
+class MipmapStore:
+    """
+    Tiny square tiles of every image in one memory-mapped file.
+
+    Tiles are uint8 RGB arrays stored in the slot of their image id,
+    next to a presence flag per slot, so any set of tiles is read with a
+    single fancy index and no per-image file access. The files grow as
+    higher image ids are added, and are mapped on first use.
+    """
+
+    def __init__(self, directory: str, size: int = MIPMAP_SIZE) -> None:
+        self.directory = directory
+        self.size = size
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.tiles_path = os.path.join(self.directory, f"mipmaps_{size}.bin")
+        self.present_path = os.path.join(self.directory, f"mipmaps_{size}_present.bin")
+
+        self._lock = threading.Lock()
+        # Tiles and presence flags, swapped together when the files grow
+        self._arrays: tuple[np.memmap, np.memmap] | None = None
+
+        self._capacity = 0
+        if os.path.exists(self.present_path):
+            self._capacity = os.path.getsize(self.present_path)
+
+
+    @property
+    def tile_bytes(self) -> int:
+        return self.size * self.size * 3
+
+
+    def has(self, image_id: int) -> bool:
+        arrays = self._mapped()
+        return arrays is not None and image_id < len(arrays[1]) and bool(arrays[1][image_id])
+
+
+    def get(self, image_id: int) -> "np.ndarray | None":
+        arrays = self._mapped()
+        if arrays is None or image_id >= len(arrays[1]) or not arrays[1][image_id]:
+            return None
+        return np.array(arrays[0][image_id])
+
+
+    def get_many(self, image_ids: Sequence[int]) -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Return the tiles of the given images, in order, and whether each
+        one exists. Missing tiles are filled with the missing tile color.
+        """
+        ids = np.asarray(image_ids, dtype=np.int64)
+        tiles = np.empty((len(ids), self.size, self.size, 3), dtype=np.uint8)
+        tiles[:] = MISSING_TILE_COLOR
+
+        arrays = self._mapped()
+        if arrays is None or len(ids) == 0:
+            return tiles, np.zeros(len(ids), dtype=bool)
+        stored_tiles, present = arrays
+
+        in_range = ids < len(present)
+        found = np.zeros(len(ids), dtype=bool)
+        found[in_range] = present[ids[in_range]].astype(bool)
+        tiles[found] = stored_tiles[ids[found]]
+
+        return tiles, found
+
+
+    def put(self, image_id: int, tile: "np.ndarray") -> None:
+        if tile.shape != (self.size, self.size, 3):
+            raise ValueError(f"Mipmaps must be {self.size}x{self.size} RGB tiles.")
+
+        with self._lock:
+            if image_id >= self._capacity:
+                self._open((image_id // MIPMAP_GROWTH + 1) * MIPMAP_GROWTH)
+            elif self._arrays is None:
+                self._open(self._capacity)
+
+            stored_tiles, present = self._arrays
+            stored_tiles[image_id] = tile
+            present[image_id] = 1
+
+
+    def remove(self, image_id: int) -> None:
+        with self._lock:
+            if image_id < self._capacity:
+                if self._arrays is None:
+                    self._open(self._capacity)
+                self._arrays[1][image_id] = 0
+
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._arrays is not None:
+                for array in self._arrays:
+                    array.flush()
+
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._arrays = None
+            self._capacity = 0
+
+
+    def _mapped(self) -> "tuple[np.memmap, np.memmap] | None":
+        """Return the mapped arrays, if there are any tiles."""
+        arrays = self._arrays
+        if arrays is None and self._capacity > 0:
+            with self._lock:
+                if self._arrays is None and self._capacity > 0:
+                    self._open(self._capacity)
+                arrays = self._arrays
+        return arrays
+
+
+    def _open(self, capacity: int) -> None:
+        # Extending the files leaves the new slots zeroed, i.e. absent
+        for path, slot_bytes in ((self.tiles_path, self.tile_bytes), (self.present_path, 1)):
+            with open(path, "ab") as outfile:
+                if outfile.tell() < capacity * slot_bytes:
+                    outfile.truncate(capacity * slot_bytes)
+
+        if self._arrays is not None:
+            for array in self._arrays:
+                array.flush()
+
+        self._arrays = (
+            np.memmap(
+                self.tiles_path, dtype=np.uint8, mode="r+",
+                shape=(capacity, self.size, self.size, 3)
+            ),
+            np.memmap(self.present_path, dtype=np.uint8, mode="r+", shape=(capacity,))
+        )
+        self._capacity = capacity
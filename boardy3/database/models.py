@@ -1,5 +1,6 @@
-from typing import TypeAlias
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, Table
+from datetime import datetime
+from typing import NamedTuple, TypeAlias
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, ForeignKey, Table
 from sqlalchemy.orm import declarative_base, relationship
 
 
@@ -20,6 +21,19 @@ class Image(Base):
     filename = Column(String(255), unique=True, nullable=False)
     is_video = Column(Boolean, nullable=False, default=False)
 
+    # Media properties captured on import. These are empty for images
+    # imported before they existed until they are filled in.
+    width = Column(Integer, index=True)
+    height = Column(Integer, index=True)
+    file_size = Column(Integer, index=True)     # Bytes
+    mime_type = Column(String(100))
+    frame_count = Column(Integer)
+    duration = Column(Float, index=True)        # Seconds
+    imported_at = Column(DateTime, default=datetime.now)
+    # Import mode the file was stored with, see transfer.py. Empty for
+    # images imported before modes existed, which were all copied.
+    storage_mode = Column(String(20))
+
     # Define the many-to-many relationship with Tag
     tags = relationship("Tag", secondary=image_tag, backref="images")
 
@@ -44,4 +58,52 @@ class Tag(Base):
         return f"Tag <{self.name}>"
 
 
-DatabaseItem: TypeAlias = Image | Tag
\ No newline at end of file
+class ImageRecord(NamedTuple):
+    """
+    Read-only view of an image row for displaying galleries.
+
+    Records are built from plain column selects, so they are never
+    tracked by a session and cost no queries once created.
+    """
+    id: int
+    filename: str
+    is_video: bool
+    thumbnail_path: str     # File to show for the image in a gallery
+    width: int | None = None
+    height: int | None = None
+
+
+class BackfillCheckpoint(Base):
+    """Position of a background backfill job in the image table."""
+    __tablename__ = "backfill_checkpoint"
+    job_name = Column(String(100), primary_key=True)
+    last_image_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+    def __repr__(self) -> str:
+        return f"BackfillCheckpoint <{self.job_name}: {self.last_image_id}>"
+
+
+DatabaseItem: TypeAlias = Image | Tag
+
+
+class TagRecord(NamedTuple):
+    """Read-only view of a tag row, see ImageRecord."""
+    id: int
+    name: str
+
+
+class ImportJournal(Base):
+    """
+    Import in progress. The entry is written before the file is staged
+    and removed in the transaction inserting the image, so entries left
+    behind by a crash name imports to roll back.
+    """
+    __tablename__ = "import_journal"
+    filename = Column(String(255), primary_key=True)
+    source_path = Column(String, nullable=False)
+    storage_mode = Column(String(20), nullable=False)
+    packed = Column(Boolean, nullable=False, default=False)
+    pid = Column(Integer, nullable=False)   # Process running the import
+    started_at = Column(DateTime, default=datetime.now)
@@ -0,0 +1,457 @@
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+from typing import NamedTuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+KEY_SIZE = 32
+# Segments are closed once they grow past this size
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+# Compact once this share of the segment bytes belongs to deleted or
+# replaced entries
+COMPACT_DEAD_RATIO = 0.5
+# Readahead is only requested for the entries of a page that lie this
+# close together
+READAHEAD_MAX_SPAN = 8 * 1024 * 1024
+
+# Key, segment, offset, length. A length of 0 marks a deletion.
+_INDEX_ENTRY = struct.Struct(f"<{KEY_SIZE}sIQI")
+_SEGMENT_PATTERN = re.compile(r"segment_(\d+)\.pack")
+
+
+class PackEntry(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+
+
+def pack_key(filename: str) -> bytes:
+    """
+    Return the key of a stored file. Stored files are named by the hex
+    sha256 of their content, which is used as is.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        key = bytes.fromhex(stem)
+    except ValueError:
+        key = b""
+    if len(key) != KEY_SIZE:
+        key = hashlib.sha256(stem.encode()).digest()
+    return key
+
+
+def file_key(filename: str) -> bytes:
+    """
+    Return the key of a stored file by its whole name. Unlike pack_key(),
+    files with the same content but different extensions get their own
+    key, as they have their own image row.
+    """
+    return hashlib.sha256(os.path.basename(filename).encode()).digest()
+
+
+class PackStore:
+    """
+    Append-only store of small blobs in a few large segment files.
+
+    Blobs are appended to the newest segment and located through an
+    index of key -> (segment, offset, length) entries, itself an
+    append-only file where later entries win. Reads go through mmap and
+    return memoryview slices of the mapping, so nothing is copied until
+    the caller decodes the data. Deleted and replaced blobs stay in their
+    segment until compact() rewrites the live ones.
+
+    A crash can at worst leave bytes in a segment that no index entry
+    points to; index entries are only trusted if their data is complete.
+    A durable store also syncs every write to disk before returning, for
+    data that is not kept anywhere else.
+
+    Several processes may use the same store, such as the GUI and a
+    command line import. Writes hold a lock file and first read what
+    the others appended, and reads pick up a compaction done elsewhere.
+    """
+    INDEX_FILENAME = "index.bin"
+    LOCK_FILENAME = "pack.lock"
+
+    def __init__(
+            self,
+            directory: str,
+            segment_max_bytes: int = SEGMENT_MAX_BYTES,
+            durable: bool = False
+    ) -> None:
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.durable = durable
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._index: dict[bytes, PackEntry] = {}
+        self._maps: dict[int, mmap.mmap] = {}
+        self._segment_sizes: dict[int, int] = {}
+        self._live_bytes = 0
+        # Inode and length of the index file as last read, see refresh()
+        self._index_inode = 0
+        self._index_read = 0
+
+        self._load()
+
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._index
+
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+    def get(self, key: bytes) -> memoryview | None:
+        """Return the data of a key without copying it, if it is stored."""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            try:
+                return self._view(entry)
+            except FileNotFoundError:
+                # Compacted by another process
+                self._refresh()
+                entry = self._index.get(key)
+                return self._view(entry) if entry is not None else None
+
+
+    def get_many(self, keys: Iterable[bytes]) -> dict[bytes, memoryview]:
+        """
+        Return the data of every stored key. Entries are read in segment
+        order, and neighboring entries are paged in with one readahead
+        request per segment.
+        """
+        keys = list(keys)
+        with self._lock:
+            try:
+                return self._get_many(keys)
+            except FileNotFoundError:
+                # Compacted by another process
+                self._refresh()
+                return self._get_many(keys)
+
+
+    def _get_many(self, keys: list[bytes]) -> dict[bytes, memoryview]:
+        entries = sorted(
+            (entry, key) for key in keys
+            if (entry := self._index.get(key)) is not None
+        )
+
+        by_segment: dict[int, list[PackEntry]] = {}
+        for entry, _ in entries:
+            by_segment.setdefault(entry.segment, []).append(entry)
+        for segment, segment_entries in by_segment.items():
+            start = segment_entries[0].offset
+            end = max(entry.offset + entry.length for entry in segment_entries)
+            if end - start <= READAHEAD_MAX_SPAN:
+                self._readahead(segment, start, end)
+
+        return {key: self._view(entry) for entry, key in entries}
+
+
+    def put(self, key: bytes, data: bytes | memoryview) -> None:
+        """Store data under key, replacing what it held before."""
+        if len(key) != KEY_SIZE:
+            raise ValueError(f"Pack keys must be {KEY_SIZE} bytes.")
+        if len(data) == 0:
+            raise ValueError("Empty data cannot be packed.")
+
+        with self._exclusive():
+            segment = self._active_segment()
+            outfile = open(self._segment_path(segment), "ab")
+            try:
+                # The real end of the segment, whoever wrote it
+                offset = outfile.tell()
+                if offset > 0 and offset + len(data) > self.segment_max_bytes:
+                    outfile.close()
+                    segment += 1
+                    outfile = open(self._segment_path(segment), "ab")
+                    offset = outfile.tell()
+
+                outfile.write(data)
+                if self.durable:
+                    outfile.flush()
+                    os.fsync(outfile.fileno())
+            finally:
+                outfile.close()
+            self._segment_sizes[segment] = offset + len(data)
+
+            # Written after the data, so an entry never points past the
+            # end of its segment
+            entry = PackEntry(segment, offset, len(data))
+            self._append_index(key, entry)
+            self._set_entry(key, entry)
+
+
+    def delete(self, key: bytes) -> bool:
+        with self._exclusive():
+            if key not in self._index:
+                return False
+
+            self._append_index(key, PackEntry(0, 0, 0))
+            self._set_entry(key, None)
+            return True
+
+
+    def dead_bytes(self) -> int:
+        """Return the segment bytes not used by any stored key."""
+        with self._lock:
+            return sum(self._segment_sizes.values()) - self._live_bytes
+
+
+    def should_compact(self, dead_ratio: float = COMPACT_DEAD_RATIO) -> bool:
+        with self._lock:
+            total = sum(self._segment_sizes.values())
+            return total > 0 and self.dead_bytes() / total >= dead_ratio
+
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "segments": len(self._segment_sizes),
+                "live_bytes": self._live_bytes,
+                "dead_bytes": self.dead_bytes()
+            }
+
+
+    def compact(self) -> int:
+        """
+        Rewrite the stored data into new segments, leaving out deleted
+        and replaced entries, and remove the old segments. Entries keep
+        their relative order. Returns the number of bytes reclaimed.
+        """
+        with self._exclusive():
+            old_segments = sorted(self._segment_sizes)
+            old_size = sum(self._segment_sizes.values())
+            if not old_segments:
+                return 0
+
+            # New segments start after the old ones so the old data stays
+            # readable until the new index replaces the old one
+            segment, offset = old_segments[-1], 0
+            new_index: dict[bytes, PackEntry] = {}
+            new_sizes: dict[int, int] = {}
+            outfile = None
+            try:
+                for entry, key in sorted((entry, key) for key, entry in self._index.items()):
+                    if outfile is None or (offset > 0 and offset + entry.length > self.segment_max_bytes):
+                        if outfile is not None:
+                            outfile.close()
+                        segment, offset = segment + 1, 0
+                        outfile = open(self._segment_path(segment), "wb")
+
+                    outfile.write(self._view(entry))
+                    new_index[key] = PackEntry(segment, offset, entry.length)
+                    offset += entry.length
+                    new_sizes[segment] = offset
+            finally:
+                if outfile is not None:
+                    outfile.close()
+
+            if self.durable:
+                # The new segments must be on disk before the index that
+                # points into them replaces the old one
+                for new_segment in new_sizes:
+                    with open(self._segment_path(new_segment), "rb") as infile:
+                        os.fsync(infile.fileno())
+
+            tmp_path = self._index_path() + ".tmp"
+            with open(tmp_path, "wb") as index_file:
+                for key, entry in new_index.items():
+                    index_file.write(_INDEX_ENTRY.pack(key, *entry))
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            os.replace(tmp_path, self._index_path())
+            stat = os.stat(self._index_path())
+            self._index_inode, self._index_read = stat.st_ino, stat.st_size
+
+            # Views already handed out keep their mapping alive
+            for old_segment in old_segments:
+                self._maps.pop(old_segment, None)
+                try:
+                    os.remove(self._segment_path(old_segment))
+                except OSError:
+                    logger.warning(f"Could not remove pack segment <{old_segment}>.")
+
+            self._index = new_index
+            self._segment_sizes = new_sizes
+            reclaimed = old_size - sum(self._segment_sizes.values())
+            logger.info(f"Compacted pack <{self.directory}>, reclaimed {reclaimed} bytes.")
+            return reclaimed
+
+
+    def refresh(self) -> None:
+        """
+        Pick up what another process wrote to the store since it was
+        opened here, such as a GUI importing while a server reads.
+        """
+        with self._lock:
+            self._refresh()
+
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self._index_path())
+        except FileNotFoundError:
+            return
+
+        if stat.st_ino != self._index_inode:
+            # Compacted elsewhere, start over. Views already handed out
+            # keep their mapping alive.
+            self._index.clear()
+            self._maps.clear()
+            self._segment_sizes.clear()
+            self._live_bytes = 0
+            self._index_inode = self._index_read = 0
+        elif stat.st_size <= self._index_read:
+            return
+        self._load()
+
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """
+        Hold the store against other threads and processes, with what
+        they wrote so far loaded.
+        """
+        with self._lock, open(os.path.join(self.directory, self.LOCK_FILENAME), "a+b") as lock_file:
+            _lock_file(lock_file.fileno())
+            try:
+                self._refresh()
+                yield
+            finally:
+                _unlock_file(lock_file.fileno())
+
+
+    def close(self) -> None:
+        with self._lock:
+            for mapping in self._maps.values():
+                try:
+                    mapping.close()
+                except BufferError:
+                    # Still referenced by a view, closed once it is freed
+                    pass
+            self._maps.clear()
+
+
+    def _load(self) -> None:
+        """Read the index from where the last load stopped."""
+        for filename in os.listdir(self.directory):
+            match = _SEGMENT_PATTERN.fullmatch(filename)
+            if match is not None:
+                self._segment_sizes[int(match.group(1))] = \
+                    os.path.getsize(os.path.join(self.directory, filename))
+
+        if not os.path.exists(self._index_path()):
+            return
+
+        with open(self._index_path(), "rb") as index_file:
+            self._index_inode = os.fstat(index_file.fileno()).st_ino
+            index_file.seek(self._index_read)
+            data = index_file.read()
+
+        # A torn last entry is dropped
+        usable = len(data) - len(data) % _INDEX_ENTRY.size
+        self._index_read += usable
+        for key, segment, offset, length in _INDEX_ENTRY.iter_unpack(data[:usable]):
+            if length == 0:
+                self._set_entry(key, None)
+            elif offset + length <= self._segment_sizes.get(segment, 0):
+                self._set_entry(key, PackEntry(segment, offset, length))
+
+
+    def _set_entry(self, key: bytes, entry: PackEntry | None) -> None:
+        previous = self._index.pop(key, None)
+        if previous is not None:
+            self._live_bytes -= previous.length
+        if entry is not None:
+            self._index[key] = entry
+            self._live_bytes += entry.length
+
+
+    def _append_index(self, key: bytes, entry: PackEntry) -> None:
+        # Only called under _exclusive(), so everything before this entry
+        # has been loaded
+        with open(self._index_path(), "ab") as index_file:
+            index_file.write(_INDEX_ENTRY.pack(key, *entry))
+            if self.durable:
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            self._index_read = index_file.tell()
+            self._index_inode = os.fstat(index_file.fileno()).st_ino
+
+
+    def _active_segment(self) -> int:
+        return max(self._segment_sizes, default=0)
+
+
+    def _view(self, entry: PackEntry) -> memoryview:
+        mapping = self._map(entry.segment, entry.offset + entry.length)
+        return memoryview(mapping)[entry.offset:entry.offset + entry.length]
+
+
+    def _map(self, segment: int, min_size: int) -> mmap.mmap:
+        mapping = self._maps.get(segment)
+        if mapping is None or len(mapping) < min_size:
+            # The active segment grew since it was mapped. The old
+            # mapping stays valid for the views made from it.
+            with open(self._segment_path(segment), "rb") as infile:
+                mapping = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapping
+        return mapping
+
+
+    def _readahead(self, segment: int, start: int, end: int) -> None:
+        if not hasattr(mmap, "MADV_WILLNEED"):
+            return
+
+        mapping = self._map(segment, end)
+        start -= start % mmap.PAGESIZE
+        try:
+            mapping.madvise(mmap.MADV_WILLNEED, start, end - start)
+        except OSError:
+            pass
+
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment_{segment:05d}.pack")
+
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, self.INDEX_FILENAME)
+
+
+def _lock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
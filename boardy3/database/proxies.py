@@ -0,0 +1,248 @@
+import os
+import threading
+
+from boardy3.database.exceptions import ProxyCreationException
+from boardy3.database.media_info import is_positive
+from boardy3.utils import LazyModule, get_logger
+
+
+cv2 = LazyModule("cv2")
+
+logger = get_logger(__name__)
+
+# Longest side in pixels of proxy videos. Videos already this small do
+# not get a proxy.
+PROXY_MAX_SIZE = 640
+PROXY_FOURCC = "mp4v"
+PROXY_EXTENSION = ".mp4"
+# Frame rate used when a video does not report a usable one
+PROXY_DEFAULT_FPS = 30.0
+
+
+def needs_proxy(width: int | None, height: int | None, max_size: int = PROXY_MAX_SIZE) -> bool:
+    # Unknown dimensions are checked when the proxy is created
+    if not width or not height:
+        return True
+    return max(width, height) > max_size
+
+
+def create_proxy(video_path: str, proxy_path: str, max_size: int = PROXY_MAX_SIZE) -> bool:
+    """
+    Write a copy of a video scaled down to fit in max_size x max_size.
+
+    Proxies are encoded with OpenCV and carry no audio. Returns False
+    without writing anything if the video is small enough already.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ProxyCreationException(f"Could not open video <{video_path}>.")
+
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if not needs_proxy(width, height, max_size):
+            return False
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if not is_positive(fps):
+            fps = PROXY_DEFAULT_FPS
+
+        # Encoders want even dimensions
+        scale = max_size / max(width, height)
+        size = (max(int(width * scale) // 2 * 2, 2), max(int(height * scale) // 2 * 2, 2))
+
+        # Write to a temporary file so a stopped job never leaves a
+        # truncated proxy behind
+        tmp_path = _tmp_path(proxy_path)
+        writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*PROXY_FOURCC), fps, size)
+        if not writer.isOpened():
+            raise ProxyCreationException(f"No <{PROXY_FOURCC}> encoder available.")
+
+        frames_written = 0
+        try:
+            while True:
+                success, frame = cap.read()
+                if not success:
+                    break
+                writer.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+                frames_written += 1
+        finally:
+            writer.release()
+    finally:
+        cap.release()
+
+    if frames_written == 0:
+        os.remove(tmp_path)
+        raise ProxyCreationException(f"No frame could be read from <{video_path}>.")
+
+    os.replace(tmp_path, proxy_path)
+    return True
+
+
+class ProxyStore:
+    """
+    Directory of proxy videos limited to max_bytes.
+
+    Proxies are touched whenever they are opened, and the least recently
+    used ones are removed once the directory grows past its budget. A
+    budget of 0 disables proxies.
+
+    Temporary files of proxies that were not finished, e.g. by a killed
+    process, are removed when the directory is scanned.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 0) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self._usage: int | None = None
+        # Proxies being written by this process
+        self._creating: set[str] = set()
+        self._lock = threading.Lock()
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+
+    def get_path(self, filename: str) -> str:
+        stem = os.path.splitext(filename)[0]
+        return os.path.normpath(os.path.join(
+            self.directory,
+            f"{filename[:2]}/{filename[2:4]}",
+            f"proxy_{stem}{PROXY_EXTENSION}"
+        ))
+
+
+    def open(self, filename: str) -> str | None:
+        """Return the path of a video's proxy, if it has one."""
+        proxy_path = self.get_path(filename)
+        try:
+            # Mark as recently used
+            os.utime(proxy_path)
+        except OSError:
+            return None
+
+        return proxy_path
+
+
+    def create(self, video_path: str, filename: str, evict: bool = True) -> bool:
+        """
+        Create the proxy of a video and make room for it, unless evict is
+        False and the store may grow past its budget.
+        """
+        proxy_path = self.get_path(filename)
+        os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+
+        with self._lock:
+            self._creating.add(proxy_path)
+        try:
+            if not create_proxy(video_path, proxy_path):
+                return False
+        except BaseException:
+            if os.path.exists(_tmp_path(proxy_path)):
+                os.remove(_tmp_path(proxy_path))
+            raise
+        finally:
+            with self._lock:
+                self._creating.discard(proxy_path)
+
+        with self._lock:
+            if self._usage is not None:
+                self._usage += os.path.getsize(proxy_path)
+        if evict:
+            self.evict(keep=proxy_path)
+
+        return True
+
+
+    def remove(self, filename: str) -> None:
+        proxy_path = self.get_path(filename)
+        if not os.path.exists(proxy_path):
+            return
+
+        size = os.path.getsize(proxy_path)
+        os.remove(proxy_path)
+        with self._lock:
+            if self._usage is not None:
+                self._usage -= size
+
+
+    def is_full(self) -> bool:
+        return self.usage() >= self.max_bytes
+
+
+    def has_room(self, size: int) -> bool:
+        """Return whether size more bytes fit without evicting proxies."""
+        return self.usage() + size <= self.max_bytes
+
+
+    def usage(self) -> int:
+        """Return the bytes used by all proxies."""
+        with self._lock:
+            if self._usage is None:
+                self._usage = sum(size for _, _, size in self._scan())
+            return self._usage
+
+
+    def evict(self, keep: str | None = None) -> int:
+        """
+        Remove the least recently used proxies until the store fits its
+        budget. Returns the number of bytes freed.
+        """
+        with self._lock:
+            proxies = sorted(self._scan())
+            usage = sum(size for _, _, size in proxies)
+
+            freed = 0
+            for _, proxy_path, size in proxies:
+                if usage - freed <= self.max_bytes:
+                    break
+                if proxy_path == keep:
+                    continue
+
+                try:
+                    os.remove(proxy_path)
+                except OSError:
+                    continue
+                freed += size
+                logger.debug(f"Evicted proxy <{proxy_path}>.")
+
+            self._usage = usage - freed
+            return freed
+
+
+    def _scan(self) -> list[tuple[float, str, int]]:
+        """
+        Return the last use, path and size of every proxy. Called with
+        the lock held.
+        """
+        in_progress = {_tmp_path(proxy_path) for proxy_path in self._creating}
+        proxies = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.startswith("proxy_"):
+                    continue
+
+                proxy_path = os.path.normpath(os.path.join(dirpath, filename))
+                if ".tmp" in filename:
+                    if proxy_path not in in_progress:
+                        # Left over from an interrupted proxy
+                        try:
+                            os.remove(proxy_path)
+                        except OSError:
+                            pass
+                    continue
+
+                try:
+                    stat = os.stat(proxy_path)
+                except OSError:
+                    continue
+                proxies.append((stat.st_mtime, proxy_path, stat.st_size))
+
+        return proxies
+
+
+def _tmp_path(proxy_path: str) -> str:
+    return f"{proxy_path}.tmp{PROXY_EXTENSION}"
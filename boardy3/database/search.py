@@ -0,0 +1,239 @@
+from array import array
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass, replace
+import sys
+import threading
+from typing import NamedTuple
+
+from boardy3.database.models import Image
+
+
+# Supported result orderings. Every ordering ends with the image id so
+# that pagination is stable between queries. Images missing the sorted
+# property are listed last.
+SORT_ORDERS = {
+    "newest": (Image.id.desc(),),
+    "oldest": (Image.id.asc(),),
+    "largest": (Image.file_size.desc().nulls_last(), Image.id.desc()),
+    "smallest": (Image.file_size.asc().nulls_last(), Image.id.desc()),
+    "longest": (Image.duration.desc().nulls_last(), Image.id.desc()),
+    "shortest": (Image.duration.asc().nulls_last(), Image.id.desc()),
+    "highest_resolution": ((Image.width * Image.height).desc().nulls_last(), Image.id.desc()),
+    "lowest_resolution": ((Image.width * Image.height).asc().nulls_last(), Image.id.desc()),
+}
+
+DEFAULT_SORT = "newest"
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """
+    Normalized, hashable description of an image search.
+
+    Tag order and duplicate tags do not change the result of a search,
+    so they are removed here to make equivalent searches share a cache
+    entry.
+    """
+    tags: tuple[str, ...] = ()
+    sort: str = DEFAULT_SORT
+
+    # Optional filters on the media properties. None means unfiltered.
+    is_video: bool | None = None
+    mime_type: str | None = None    # Prefix such as "image/" or "image/png"
+    min_width: int | None = None
+    min_height: int | None = None
+    min_file_size: int | None = None
+    max_file_size: int | None = None
+    min_duration: float | None = None
+    max_duration: float | None = None
+
+    def __post_init__(self) -> None:
+        if self.sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order: <{self.sort}>.")
+
+        normalized = tuple(sorted({t.strip() for t in self.tags if t.strip()}))
+        object.__setattr__(self, "tags", normalized)
+
+
+    @classmethod
+    def from_tags(
+            cls,
+            tags_list: Iterable[str] | None = None,
+            sort: str = DEFAULT_SORT
+    ) -> "SearchQuery":
+        return cls(tags=tuple(tags_list or ()), sort=sort)
+
+
+    @property
+    def has_filters(self) -> bool:
+        return any(
+            value is not None for value in (
+                self.is_video, self.mime_type,
+                self.min_width, self.min_height,
+                self.min_file_size, self.max_file_size,
+                self.min_duration, self.max_duration
+            )
+        )
+
+
+    def unsorted(self) -> "SearchQuery":
+        """Return the query without its ordering, for counting."""
+        return replace(self, sort=DEFAULT_SORT)
+
+
+class ImageCount(NamedTuple):
+    """
+    Number of images matching a search. When exact is False the search
+    matched at least count images.
+    """
+    count: int
+    exact: bool = True
+
+
+class SearchResultCache:
+    """
+    LRU cache of ordered image ids for search queries.
+
+    Each entry remembers the write generation of the database it was
+    computed from. An entry from an older generation is treated as a
+    miss and dropped, so mutators only need to bump the generation
+    instead of knowing which queries they affect.
+
+    Result counts are kept apart from the ids, keyed by the query
+    without its sort, and so are their hit and miss counters.
+
+    The cache may be used from several threads.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 64,
+            max_bytes: int = 64 * 1024 * 1024
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[SearchQuery, tuple[int, array]] = OrderedDict()
+        self._bytes = 0
+        self._counts: OrderedDict[SearchQuery, tuple[int, ImageCount]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.count_hits = 0
+        self.count_misses = 0
+
+        self._lock = threading.Lock()
+
+
+    def get(self, query: SearchQuery, generation: int) -> array | None:
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None or entry[0] != generation:
+                if entry is not None:
+                    self._drop(query)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return entry[1]
+
+
+    def put(self, query: SearchQuery, generation: int, ids: Iterable[int]) -> array:
+        id_array = array("q", ids)
+
+        with self._lock:
+            if query in self._entries:
+                self._drop(query)
+
+            # Any ordering of the results gives their count
+            self._put_count(query, generation, ImageCount(len(id_array)))
+
+            # Results too large to be worth caching are returned as is.
+            if self._sizeof(id_array) > self.max_bytes:
+                return id_array
+
+            self._entries[query] = (generation, id_array)
+            self._bytes += self._sizeof(id_array)
+
+            while (
+                len(self._entries) > self.max_entries
+                or self._bytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._entries)))
+
+            return id_array
+
+
+    def get_count(self, query: SearchQuery, generation: int) -> ImageCount | None:
+        """
+        Return the cached number of results for the query, in any
+        ordering. Results stored with put() are counted as well.
+        """
+        key = query.unsorted()
+        with self._lock:
+            count_entry = self._counts.get(key)
+            if count_entry is None or count_entry[0] != generation:
+                if count_entry is not None:
+                    del self._counts[key]
+                self.count_misses += 1
+                return None
+
+            self._counts.move_to_end(key)
+            self.count_hits += 1
+            return count_entry[1]
+
+
+    def put_count(self, query: SearchQuery, generation: int, count: ImageCount) -> None:
+        with self._lock:
+            self._put_count(query, generation, count)
+
+
+    def _put_count(self, query: SearchQuery, generation: int, count: ImageCount) -> None:
+        # Called with the lock held
+        self._counts[query.unsorted()] = (generation, count)
+        self._counts.move_to_end(query.unsorted())
+
+        # Counts are tiny, so they share the entry limit with a
+        # generous multiplier instead of being measured.
+        while len(self._counts) > self.max_entries * 16:
+            self._counts.popitem(last=False)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._counts.clear()
+            self._bytes = 0
+
+
+    def info(self) -> dict[str, float]:
+        """
+        Return hit/miss counters of id and count lookups and the memory
+        held by the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            count_lookups = self.count_hits + self.count_misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "count_hits": self.count_hits,
+                "count_misses": self.count_misses,
+                "count_hit_rate": (self.count_hits / count_lookups) if count_lookups else 0.0,
+                "entries": len(self._entries),
+                "count_entries": len(self._counts),
+                "bytes": self._bytes,
+            }
+
+
+    def _drop(self, query: SearchQuery) -> None:
+        _, id_array = self._entries.pop(query)
+        self._bytes -= self._sizeof(id_array)
+
+
+    @staticmethod
+    def _sizeof(id_array: array) -> int:
+        return sys.getsizeof(id_array)
@@ -0,0 +1,84 @@
+import json
+import os
+import struct
+from typing import NamedTuple
+
+from boardy3.database.models import ImageRecord
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+SNAPSHOT_MAGIC = b"B3SNAP1\n"
+# Length of the JSON header that follows the magic
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+class GallerySnapshot(NamedTuple):
+    """
+    First gallery page of the last session: the records shown and their
+    encoded thumbnails, or None where a record had none.
+    """
+    page_size: int
+    records: list[ImageRecord]
+    thumbnails: list[bytes | None]
+
+
+def write_snapshot(path: str, snapshot: GallerySnapshot) -> None:
+    """
+    Write a snapshot as a JSON header followed by the thumbnails. The
+    file is replaced atomically, so a crash leaves the old one.
+    """
+    header = json.dumps({
+        "page_size": snapshot.page_size,
+        "records": [record._asdict() for record in snapshot.records],
+        "sizes": [len(data) if data is not None else None for data in snapshot.thumbnails]
+    }).encode()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as outfile:
+        outfile.write(SNAPSHOT_MAGIC)
+        outfile.write(_HEADER_LENGTH.pack(len(header)))
+        outfile.write(header)
+        for data in snapshot.thumbnails:
+            if data is not None:
+                outfile.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> GallerySnapshot | None:
+    """Return the snapshot saved at path, or None if there is no usable one."""
+    try:
+        with open(path, "rb") as infile:
+            data = infile.read()
+    except OSError:
+        return None
+
+    try:
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise ValueError("Unknown snapshot format.")
+        offset = len(SNAPSHOT_MAGIC)
+        (header_length,) = _HEADER_LENGTH.unpack_from(data, offset)
+        offset += _HEADER_LENGTH.size
+        header = json.loads(data[offset:offset + header_length])
+        offset += header_length
+
+        thumbnails: list[bytes | None] = []
+        for size in header["sizes"]:
+            if size is None:
+                thumbnails.append(None)
+                continue
+            if offset + size > len(data):
+                raise ValueError("Snapshot is truncated.")
+            thumbnails.append(data[offset:offset + size])
+            offset += size
+
+        records = [ImageRecord(**record) for record in header["records"]]
+        if len(records) != len(thumbnails):
+            raise ValueError("Snapshot records and thumbnails do not match.")
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        logger.warning(f"Ignoring gallery snapshot <{path}>: {e}")
+        return None
+
+    return GallerySnapshot(header["page_size"], records, thumbnails)
@@ -0,0 +1,120 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import Engine, event
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """
+    SQLite settings applied to every connection of an engine.
+
+    cache_size follows SQLite's convention: negative values are in KiB,
+    positive values in pages. mmap_size is in bytes.
+    """
+    name: str
+    journal_mode: str
+    synchronous: str
+    cache_size: int
+    mmap_size: int
+    temp_store: str
+    busy_timeout: int   # Milliseconds
+
+
+    def pragmas(self, read_only: bool = False) -> list[str]:
+        pragmas = [
+            f"PRAGMA busy_timeout = {self.busy_timeout}",
+            f"PRAGMA cache_size = {self.cache_size}",
+            f"PRAGMA mmap_size = {self.mmap_size}",
+            f"PRAGMA temp_store = {self.temp_store}",
+        ]
+
+        # Read-only connections cannot change the journal and never
+        # write, so durability settings do not apply to them.
+        if not read_only:
+            pragmas += [
+                f"PRAGMA journal_mode = {self.journal_mode}",
+                f"PRAGMA synchronous = {self.synchronous}",
+            ]
+
+        return pragmas
+
+
+# Every profile keeps WAL journaling since the read pool relies on it.
+STORAGE_PROFILES = {
+    # Every commit is synced to disk before returning.
+    "durable": StorageProfile(
+        name="durable",
+        journal_mode="WAL",
+        synchronous="FULL",
+        cache_size=-8_000,
+        mmap_size=0,
+        temp_store="DEFAULT",
+        busy_timeout=5_000
+    ),
+    # Commits survive application crashes. A power loss may roll back
+    # the last few commits but never corrupts the database.
+    "balanced": StorageProfile(
+        name="balanced",
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        cache_size=-64_000,
+        mmap_size=256 * 1024 * 1024,
+        temp_store="MEMORY",
+        busy_timeout=5_000
+    ),
+    # Meant to be switched on for the duration of an import. Commits are
+    # not synced at all, so a power loss during the import may lose or
+    # corrupt recent writes.
+    "bulk-import": StorageProfile(
+        name="bulk-import",
+        journal_mode="WAL",
+        synchronous="OFF",
+        cache_size=-256_000,
+        mmap_size=1024 * 1024 * 1024,
+        temp_store="MEMORY",
+        busy_timeout=30_000
+    ),
+}
+
+DEFAULT_STORAGE_PROFILE = "balanced"
+
+
+def get_storage_profile(name: str) -> StorageProfile:
+    try:
+        return STORAGE_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage profile: <{name}>.") from None
+
+
+def configure_engine(
+        engine: Engine,
+        get_profile: Callable[[], StorageProfile],
+        read_only: bool = False
+) -> None:
+    """
+    Apply the profile returned by get_profile to the engine's
+    connections.
+
+    The profile is checked every time a connection is taken from the
+    pool, so switching profiles takes effect on the next checkout
+    without reconnecting.
+    """
+
+    def apply_profile(dbapi_connection, connection_record) -> None:
+        profile = get_profile()
+        if connection_record.info.get("storage_profile") == profile.name:
+            return
+
+        cursor = dbapi_connection.cursor()
+        for pragma in profile.pragmas(read_only):
+            cursor.execute(pragma)
+        cursor.close()
+
+        connection_record.info["storage_profile"] = profile.name
+
+    event.listen(engine, "connect", apply_profile)
+    event.listen(
+        engine, "checkout",
+        lambda dbapi_connection, connection_record, _: apply_profile(dbapi_connection, connection_record)
+    )
@@ -0,0 +1,414 @@
+from collections.abc import Callable
+import json
+import threading
+import time
+from typing import Any, NamedTuple
+
+from boardy3.database.exceptions import ThumbnailCreationException
+from boardy3.database.media_info import is_positive, read_image_size
+from boardy3.utils import LazyModule, get_logger
+
+
+cv2 = LazyModule("cv2")
+np = LazyModule("numpy")
+
+logger = get_logger(__name__)
+
+
+# Longest side in pixels of the thumbnails shown in the gallery grid
+GRID_THUMBNAIL_SIZE = 250
+GRID_THUMBNAIL_QUALITY = 85
+
+# Positions tried for a video thumbnail, as fractions of its length
+VIDEO_THUMBNAIL_POSITIONS = (0.25, 0.1, 0.5)
+# Seconds after which the best frame found so far is used
+VIDEO_THUMBNAIL_DEADLINE = 3.0
+# Searches seeking through videos that may run at once. A seek cannot be
+# interrupted, so one that outlives its deadline holds its slot until it
+# finishes. Videos are only sampled from their start while none is free.
+VIDEO_SEEK_THREADS = 2
+# Frames sampled from the start of videos that cannot be seeked, and
+# the step between samples
+EARLY_FRAME_COUNT = 300
+EARLY_FRAME_STEP = 10
+
+# Frames darker, brighter or flatter than these are not used
+BLANK_MIN_BRIGHTNESS = 16
+BLANK_MAX_BRIGHTNESS = 240
+BLANK_MIN_CONTRAST = 8
+
+# Frames in a video storyboard, their width and the columns of the
+# sprite sheet they are packed into. Seconds after which no further
+# frames are seeked to.
+STORYBOARD_FRAME_COUNT = 16
+STORYBOARD_DEADLINE = 20.0
+STORYBOARD_TILE_WIDTH = GRID_THUMBNAIL_SIZE
+STORYBOARD_COLUMNS = 4
+STORYBOARD_QUALITY = 75
+
+# Score of frames that are not blank
+_USABLE = float("inf")
+_seek_slots = threading.BoundedSemaphore(VIDEO_SEEK_THREADS)
+
+# JPEG and WebP images can be decoded at a fraction of their size.
+# Named after the cv2.IMREAD_REDUCED_COLOR_* read modes.
+_REDUCED_READ_MODES = (
+    (8, "IMREAD_REDUCED_COLOR_8"),
+    (4, "IMREAD_REDUCED_COLOR_4"),
+    (2, "IMREAD_REDUCED_COLOR_2"),
+)
+
+
+def create_image_thumbnail(
+        image_path: str,
+        thumbnail_path: str,
+        size: int = GRID_THUMBNAIL_SIZE
+) -> None:
+    """Save a JPEG copy of an image scaled down to fit in size x size."""
+    image = _read_reduced(image_path, size)
+    if image is None:
+        raise ThumbnailCreationException(f"Could not read image <{image_path}>.")
+
+    _save_thumbnail(image, thumbnail_path, size)
+
+
+def create_video_thumbnail(
+        video_path: str,
+        thumbnail_path: str,
+        size: int = GRID_THUMBNAIL_SIZE,
+        deadline: float = VIDEO_THUMBNAIL_DEADLINE
+) -> None:
+    """
+    Save a JPEG of a representative frame of a video, scaled down to fit
+    in size x size.
+
+    A few positions across the video are tried, then its first frames.
+    Black and blank frames are skipped. OpenCV has no keyframe seek, so
+    every seek decodes forward to the exact frame, which can take long
+    in videos with few keyframes. Seeking therefore runs on a thread of
+    its own, and once deadline seconds pass without a usable frame the
+    first frames are read from a new capture instead.
+    """
+    deadline_time = time.monotonic() + deadline
+    best_frame, best_score = None, -1.0
+
+    if _seek_slots.acquire(blocking=False):
+        best_frame, best_score = _FrameSearch(video_path, _seek_slots.release).result(deadline)
+
+    if best_score < _USABLE:
+        best_frame = _sample_early_frames(video_path, deadline_time, best_frame, best_score)
+
+    if best_frame is None:
+        raise ThumbnailCreationException(f"No frame could be read from <{video_path}>.")
+
+    _save_thumbnail(best_frame, thumbnail_path, size)
+
+
+# Name used by earlier versions
+create_thumbnail = create_video_thumbnail
+
+
+class StoryboardIndex(NamedTuple):
+    """Layout of the frames packed in a storyboard sprite sheet."""
+    tile_width: int
+    tile_height: int
+    columns: int
+    timestamps: list[float]     # Seconds into the video of each frame
+
+
+    def tile_rect(self, frame: int) -> tuple[int, int, int, int]:
+        """Return x, y, width and height of a frame in the sprite sheet."""
+        row, column = divmod(frame, self.columns)
+        return (
+            column * self.tile_width,
+            row * self.tile_height,
+            self.tile_width,
+            self.tile_height
+        )
+
+
+    def frame_at(self, fraction: float) -> int:
+        """Return the frame shown at a fraction of the video's length."""
+        frame = int(fraction * len(self.timestamps))
+        return min(max(frame, 0), len(self.timestamps) - 1)
+
+
+    def save(self, index_path: str) -> None:
+        with open(index_path, "w") as outfile:
+            json.dump(self._asdict(), outfile)
+
+
+    @classmethod
+    def load(cls, index_path: str) -> "StoryboardIndex":
+        with open(index_path) as infile:
+            return cls(**json.load(infile))
+
+
+def create_storyboard(
+        video_path: str,
+        sprite_path: str,
+        index_path: str,
+        frame_count: int = STORYBOARD_FRAME_COUNT,
+        tile_width: int = STORYBOARD_TILE_WIDTH,
+        columns: int = STORYBOARD_COLUMNS
+) -> StoryboardIndex:
+    """
+    Pack frame_count evenly spaced frames of a video into one JPEG sprite
+    sheet and save its layout next to it.
+
+    The frames are collected in a single forward pass over one capture.
+    Seeks decode forward to the exact frame, so after
+    STORYBOARD_DEADLINE seconds the frames read so far are used.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            raise ThumbnailCreationException(f"Could not open video <{video_path}>.")
+
+        frames, timestamps = _read_storyboard_frames(cap, frame_count, time.monotonic() + STORYBOARD_DEADLINE)
+    finally:
+        cap.release()
+
+    if not frames:
+        raise ThumbnailCreationException(f"No frame could be read from <{video_path}>.")
+
+    height, width = frames[0].shape[:2]
+    tile_height = max(round(height * tile_width / width), 1)
+    columns = min(columns, len(frames))
+    rows = -(-len(frames) // columns)
+
+    sprite = np.zeros((rows * tile_height, columns * tile_width, 3), np.uint8)
+    index = StoryboardIndex(tile_width, tile_height, columns, timestamps)
+    for i, frame in enumerate(frames):
+        x, y, w, h = index.tile_rect(i)
+        sprite[y:y + h, x:x + w] = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+
+    if not cv2.imwrite(sprite_path, sprite, [cv2.IMWRITE_JPEG_QUALITY, STORYBOARD_QUALITY]):
+        raise ThumbnailCreationException(f"Could not write storyboard <{sprite_path}>.")
+    index.save(index_path)
+
+    return index
+
+
+def _read_storyboard_frames(
+        cap: "cv2.VideoCapture",
+        frame_count: int,
+        deadline: float
+) -> tuple[list, list[float]]:
+    total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not is_positive(fps):
+        fps = None
+
+    frames, timestamps = [], []
+    if is_positive(total_frames):
+        # Middle of each of frame_count equal segments
+        positions = [
+            int((i + 0.5) * total_frames / frame_count)
+            for i in range(frame_count)
+        ]
+        for position in positions:
+            if frames and time.monotonic() > deadline:
+                break
+            if not cap.set(cv2.CAP_PROP_POS_FRAMES, position):
+                break
+
+            success, frame = cap.read()
+            if success:
+                frames.append(frame)
+                timestamps.append(position / fps if fps else 0.0)
+
+        if frames:
+            return frames, timestamps
+
+    # The video cannot be seeked, so take frames from its start at the
+    # thumbnail sampling rate
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    position = 0
+    while len(frames) < frame_count and position < EARLY_FRAME_COUNT:
+        if position % EARLY_FRAME_STEP:
+            success = cap.grab()
+        else:
+            success, frame = cap.read()
+            if success:
+                frames.append(frame)
+                timestamps.append(position / fps if fps else 0.0)
+
+        if not success:
+            break
+        position += 1
+
+    return frames, timestamps
+
+
+class _FrameSearch:
+    """
+    Seeks to positions across a video on a daemon thread, which owns the
+    capture. A caller that stops waiting leaves the thread to finish its
+    current seek and exit.
+    """
+
+    def __init__(self, video_path: str, on_exit: Callable[[], None]) -> None:
+        self.video_path = video_path
+        self.done = False
+        self.stopped = False
+        self.best_frame = None
+        self.best_score = -1.0
+
+        self._on_exit = on_exit
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="video-thumbnail", daemon=True)
+        self._thread.start()
+
+
+    def result(self, deadline: float) -> tuple[Any, float]:
+        """
+        Return the best frame and its score once the search ends or
+        deadline seconds pass, and stop the search.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.done, deadline)
+            self.stopped = True
+            return self.best_frame, self.best_score
+
+
+    def offer(self, frame) -> bool:
+        """Keep a frame if it is the best so far. Returns True if usable."""
+        score = _score_or_usable(frame)
+        with self._condition:
+            if score > self.best_score:
+                self.best_frame, self.best_score = frame, score
+        return score == _USABLE
+
+
+    def _run(self) -> None:
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if cap.isOpened():
+                _seek_video_frames(cap, self)
+        except Exception as e:
+            # The first frames are sampled instead
+            logger.debug(f"Could not seek in <{self.video_path}>: {e}")
+        finally:
+            cap.release()
+            self._on_exit()
+            with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+
+def _seek_video_frames(cap: "cv2.VideoCapture", search: _FrameSearch) -> None:
+    """
+    Offer the frames at VIDEO_THUMBNAIL_POSITIONS to the search until one
+    is usable or the search is stopped.
+    """
+    # Some containers report no or nonsensical frame counts
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    if not is_positive(frame_count):
+        return
+
+    for position in VIDEO_THUMBNAIL_POSITIONS:
+        if search.stopped:
+            return
+
+        if not cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_count * position)):
+            return
+
+        success, frame = cap.read()
+        if success and search.offer(frame):
+            return
+
+
+def _sample_early_frames(video_path: str, deadline: float, best_frame, best_score: float):
+    """
+    Return the first usable frame among the first frames of a video, or
+    the best frame read before the deadline, including best_frame. Reads
+    forward from the start without seeking.
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            if best_frame is None:
+                raise ThumbnailCreationException(f"Could not open video <{video_path}>.")
+            return best_frame
+
+        for i in range(EARLY_FRAME_COUNT):
+            if time.monotonic() > deadline and best_frame is not None:
+                break
+
+            if i % EARLY_FRAME_STEP:
+                # Skip without converting the frame
+                if not cap.grab():
+                    break
+                continue
+
+            success, frame = cap.read()
+            if not success:
+                break
+
+            score = _score_or_usable(frame)
+            if score == _USABLE:
+                return frame
+            if score > best_score:
+                best_frame, best_score = frame, score
+    finally:
+        cap.release()
+
+    return best_frame
+
+
+def _score_or_usable(frame) -> float:
+    """Return the score of a frame, or _USABLE if it is not blank."""
+    score = _frame_score(frame)
+    return _USABLE if score is None else score
+
+
+def _frame_score(frame) -> float | None:
+    """
+    Return None if a frame is usable as a thumbnail, otherwise a score
+    ranking how close it came.
+    """
+    # Statistics of a small copy are close enough
+    small = cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    mean, stddev = (float(v[0][0]) for v in cv2.meanStdDev(gray))
+
+    if (
+        BLANK_MIN_BRIGHTNESS <= mean <= BLANK_MAX_BRIGHTNESS
+        and stddev >= BLANK_MIN_CONTRAST
+    ):
+        return None
+
+    return stddev
+
+
+def _save_thumbnail(image, thumbnail_path: str, size: int) -> None:
+    height, width = image.shape[:2]
+    scale = size / max(width, height)
+    if scale < 1:
+        image = cv2.resize(
+            image,
+            (max(round(width * scale), 1), max(round(height * scale), 1)),
+            interpolation=cv2.INTER_AREA
+        )
+
+    if not cv2.imwrite(thumbnail_path, image, [cv2.IMWRITE_JPEG_QUALITY, GRID_THUMBNAIL_QUALITY]):
+        raise ThumbnailCreationException(f"Could not write thumbnail <{thumbnail_path}>.")
+
+
+def _read_reduced(image_path: str, size: int):
+    """
+    Decode an image at the smallest reduction that still covers size.
+    Decoding a large JPEG at 1/8 scale skips most of the work.
+    """
+    dimensions = read_image_size(image_path)
+    if dimensions is not None:
+        shortest_side = min(dimensions)
+        for factor, mode in _REDUCED_READ_MODES:
+            if shortest_side // factor >= size:
+                image = cv2.imread(image_path, getattr(cv2, mode))
+                if image is not None:
+                    return image
+                break
+
+    return cv2.imread(image_path, cv2.IMREAD_COLOR)
@@ -0,0 +1,139 @@
+import errno
+import os
+import shutil
+
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+# How an imported file gets into the library:
+#   copy      a copy of its own, made in the kernel where possible
+#   reflink   a copy-on-write clone sharing the data of the source,
+#             on Linux filesystems such as Btrfs and XFS
+#   hardlink  a second name for the source file. Edits to the source
+#             show up in the library.
+#   move      the source itself, which is removed from where it was
+IMPORT_MODES = ("copy", "reflink", "hardlink", "move")
+DEFAULT_IMPORT_MODE = "copy"
+
+# Files imported by a link share their data with a file outside the
+# library, which copying them again would duplicate
+LINKED_MODES = ("reflink", "hardlink")
+
+# linux/fs.h _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# Bytes copied per copy_file_range() call
+_COPY_CHUNK = 1 << 30
+
+
+def transfer_file(source: str, destination: str, mode: str) -> str:
+    """
+    Put a file into the library at destination, which must not exist.
+
+    Modes the source's filesystem cannot do fall back to the next
+    cheapest: hardlink to reflink, reflink to copy and a move across
+    filesystems to a copy and delete. Returns the mode that was used.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode <{mode}>.")
+
+    if mode == "move":
+        try:
+            os.rename(source, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            copy_file(source, destination)
+            os.remove(source)
+        return "move"
+
+    if mode == "hardlink":
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError as e:
+            logger.debug(f"Could not hardlink <{source}>: {e}")
+
+    if mode in ("hardlink", "reflink") and reflink_file(source, destination):
+        return "reflink"
+
+    copy_file(source, destination)
+    return "copy"
+
+
+def undo_transfer(source: str, destination: str, mode: str) -> None:
+    """Take a file transferred into the library back out of it."""
+    if mode == "move":
+        # The library holds the only copy
+        shutil.move(destination, source)
+    elif os.path.exists(destination):
+        os.remove(destination)
+
+
+def reflink_file(source: str, destination: str) -> bool:
+    """
+    Clone source into destination without copying its data. Returns
+    False, leaving no destination behind, where cloning is unsupported.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # Not available on Windows
+        return False
+
+    with open(source, "rb") as infile, open(destination, "xb") as outfile:
+        try:
+            fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+            cloned = True
+        except OSError as e:
+            logger.debug(f"Could not reflink <{source}>: {e}")
+            cloned = False
+
+    if not cloned:
+        os.remove(destination)
+        return False
+
+    shutil.copystat(source, destination)
+    return True
+
+
+def copy_file(source: str, destination: str) -> None:
+    """
+    Copy a file with its timestamps, like shutil.copy2(). Uses
+    copy_file_range() where available, which stays in the kernel and
+    lets filesystems and network shares that support it copy on the
+    server or share the data.
+    """
+    with open(source, "rb") as infile:
+        outfile = open(destination, "xb")
+        try:
+            with outfile:
+                if not _copy_file_range(infile.fileno(), outfile.fileno()):
+                    outfile.seek(0)
+                    outfile.truncate()
+                    infile.seek(0)
+                    shutil.copyfileobj(infile, outfile)
+            shutil.copystat(source, destination)
+        except BaseException:
+            # No partial copy is left behind
+            os.remove(destination)
+            raise
+
+
+def _copy_file_range(infd: int, outfd: int) -> bool:
+    """Copy a whole file in the kernel. Returns False if unsupported."""
+    if not hasattr(os, "copy_file_range"):
+        return False
+
+    try:
+        while os.copy_file_range(infd, outfd, _COPY_CHUNK) > 0:
+            pass
+    except OSError as e:
+        # Unsupported here, or between these filesystems on older kernels
+        if e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.EPERM):
+            return False
+        raise
+
+    return True
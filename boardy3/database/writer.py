@@ -0,0 +1,209 @@
+from collections.abc import Callable
+from concurrent.futures import Future
+import queue
+import threading
+from typing import Any, TypeVar
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Most jobs committed together when several are waiting
+GROUP_COMMIT_SIZE = 64
+
+# Returned by _collect() when the batch ends without a marker
+_NO_MARKER = object()
+
+
+class DatabaseWriter:
+    """
+    Runs every database write on one dedicated thread.
+
+    Jobs are callables taking a Session. A job's writes are committed
+    if it returns and rolled back if it raises. The job's return value
+    or exception is delivered through the Future returned by submit(),
+    and never before its writes are committed.
+
+    Jobs queued while the thread is busy are group committed: up to
+    max_batch of them run in one transaction, each in a savepoint of
+    its own, so one commit (and one sync to disk) covers them all. A
+    job that raises only rolls back to its savepoint.
+
+    on_commit is called on the writer thread after every commit and
+    before the jobs' Futures are resolved, unless every job was
+    submitted with notify=False.
+
+    Jobs submitted with durable=True are committed with
+    synchronous=FULL whatever the storage profile, so they survive a
+    power loss once their Future resolves.
+    """
+
+    def __init__(
+            self,
+            session_factory: sessionmaker[Session],
+            on_commit: Callable[[], None] | None = None,
+            name: str = "boardy3-db-writer",
+            max_batch: int = GROUP_COMMIT_SIZE
+    ) -> None:
+        self.session_factory = session_factory
+        self.on_commit = on_commit
+        self.max_batch = max_batch
+
+        self._queue: queue.Queue[tuple[Callable[[Session], Any] | None, Future, bool, bool] | None] = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._closed = False
+        self._thread.start()
+
+
+    def submit(self, job: Callable[[Session], T], notify: bool = True, durable: bool = False) -> "Future[T]":
+        if self._closed:
+            raise RuntimeError("Database writer has been closed.")
+
+        if threading.current_thread() is self._thread:
+            # The job would wait on the thread that is running it
+            raise RuntimeError("Jobs cannot submit other jobs.")
+
+        future: Future[T] = Future()
+        self._queue.put((job, future, notify, durable))
+
+        return future
+
+
+    def drain(self) -> None:
+        """Wait until every job queued so far has finished."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Jobs cannot wait for other jobs.")
+
+        future: Future[None] = Future()
+        self._queue.put((None, future, False, False))
+        future.result()
+
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting jobs and finish the ones already queued."""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._queue.put(None)
+
+        if wait:
+            self._thread.join()
+
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            job, future, *_ = item
+            if job is None:
+                # Marker queued by drain()
+                future.set_result(None)
+                continue
+
+            batch, marker = self._collect(item)
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if len(batch) == 1:
+                self._execute(*batch[0])
+            elif batch:
+                self._execute_batch(batch)
+
+            # Markers queued behind the batch are handled once it is done
+            if marker is None:
+                break
+            if marker is not _NO_MARKER:
+                marker[1].set_result(None)
+
+
+    def _collect(self, first: tuple) -> tuple[list[tuple], Any]:
+        """
+        Take the jobs already waiting behind first, up to max_batch, and
+        the close or drain marker that ended the batch, if any.
+        """
+        batch = [first]
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None or item[0] is None:
+                return batch, item
+            batch.append(item)
+
+        return batch, _NO_MARKER
+
+
+    def _execute(self, job: Callable[[Session], Any], future: Future, notify: bool, durable: bool) -> None:
+        session = self.session_factory()
+        try:
+            if durable:
+                self._sync_fully(session)
+            result = job(session)
+            session.commit()
+
+            if notify and self.on_commit is not None:
+                self.on_commit()
+        except BaseException as e:
+            session.rollback()
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            session.close()
+
+
+    def _execute_batch(self, batch: list[tuple[Callable[[Session], Any], Future, bool, bool]]) -> None:
+        session = self.session_factory()
+        outcomes: list[tuple[Future, Any, BaseException | None]] = []
+        try:
+            if any(durable for *_, durable in batch):
+                self._sync_fully(session)
+            # pysqlite only begins a transaction before the first write,
+            # and a savepoint outside of one commits when released
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+            for job, future, *_ in batch:
+                try:
+                    with session.begin_nested():
+                        outcomes.append((future, job(session), None))
+                except Exception as e:
+                    outcomes.append((future, None, e))
+
+            session.commit()
+
+            if self.on_commit is not None and any(notify for _, _, notify, _ in batch):
+                self.on_commit()
+        except BaseException as e:
+            session.rollback()
+            for _, future, *_ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            session.close()
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+    @staticmethod
+    def _sync_fully(session: Session) -> None:
+        """Make the session's next commit sync to disk."""
+        connection = session.connection()
+        connection.exec_driver_sql("PRAGMA synchronous = FULL")
+        # The storage profile is applied again on the next checkout
+        connection.connection.info.pop("storage_profile", None)
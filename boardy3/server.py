@@ -0,0 +1,565 @@
+"""
+Read-only HTTP server for browsing a library from other machines.
+
+Run with `python -m boardy3 serve`. Requests never change the library:
+they only read the database and the stored files. Opening the library
+still runs DatabaseManager's startup recovery of interrupted imports,
+and packed originals are unpacked into the local cache to be served.
+Endpoints:
+
+    GET /api/search?tag=cat&tag=pet&sort=newest&type=images&page=1&page_size=50
+    GET /api/images/<id>            record and tags of one image
+    GET /api/tags?prefix=ca         tag names with their image counts
+    GET /images/<filename>          the original file
+    GET /thumbnails/<filename>      the gallery thumbnail
+
+Stored files are named by the sha256 of their content, so the name is
+used as a strong ETag and files are served as immutable. They are sent
+with sendfile where the platform has it, and single byte ranges are
+supported for seeking in videos. API responses are revalidated with
+a weak ETag of their body instead.
+
+Database reads run on a thread pool sized to the manager's read
+connection pool, so the event loop only ever waits on sockets.
+"""
+import asyncio
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+import hashlib
+from http import HTTPStatus
+import json
+import mimetypes
+import os
+import re
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple, TypeVar
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from boardy3.database.search import DEFAULT_SORT, SearchQuery
+from boardy3.utils import get_logger
+
+if TYPE_CHECKING:
+    from boardy3.database.database_manager import DatabaseManager
+    from boardy3.database.models import ImageRecord
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_PAGE_SIZE = 200
+# Requests with a longer head are refused
+MAX_HEAD_BYTES = 16 * 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 15
+
+# Stored files never change under their name
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+API_CACHE_CONTROL = "no-cache"
+
+# Content hash followed by the original extension
+_FILENAME_PATTERN = re.compile(r"[0-9a-f]{64}[\w.-]*")
+_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class Request(NamedTuple):
+    method: str
+    target: str
+    version: str
+    headers: dict[str, str]     # Names are lowercase
+
+
+class Response(NamedTuple):
+    status: int
+    headers: dict[str, str]
+    body: bytes = b""
+    # Sent with sendfile instead of the body, from offset for length bytes
+    file: BinaryIO | None = None
+    offset: int = 0
+    length: int = 0
+
+
+class BadRequest(Exception):
+    """Raised by handlers for requests with invalid parameters."""
+
+
+def parse_request(head: bytes) -> Request | None:
+    """Parse a request line and headers. Returns None if malformed."""
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        return None
+    if not version.startswith("HTTP/1."):
+        return None
+
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, separator, value = line.partition(":")
+        if not separator:
+            return None
+        headers[name.strip().lower()] = value.strip()
+
+    return Request(method, target, version, headers)
+
+
+def json_response(data: Any) -> Response:
+    body = json.dumps(data).encode()
+    return Response(HTTPStatus.OK, {
+        "Content-Type": "application/json",
+        "Cache-Control": API_CACHE_CONTROL,
+        "ETag": f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+    }, body)
+
+
+def error_response(status: int, message: str | None = None) -> Response:
+    body = json.dumps({"error": message or HTTPStatus(status).phrase}).encode()
+    return Response(status, {"Content-Type": "application/json"}, body)
+
+
+def _single_value(params: dict[str, list[str]], name: str, default: str | None = None) -> str | None:
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def _int_param(
+        params: dict[str, list[str]],
+        name: str,
+        default: int | None = None,
+        minimum: int = 0
+) -> int | None:
+    value = _single_value(params, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer.")
+    if number < minimum:
+        raise BadRequest(f"{name} must be at least {minimum}.")
+    return number
+
+
+def build_search_query(params: dict[str, list[str]]) -> SearchQuery:
+    """Build a search from query parameters, see the module docstring."""
+    # Tags may be repeated, or given comma separated
+    tags = [tag for value in params.get("tag", []) for tag in value.split(",")]
+
+    types = {"all": None, "images": False, "videos": True}
+    search_type = _single_value(params, "type", "all")
+    if search_type not in types:
+        raise BadRequest(f"type must be one of {', '.join(types)}.")
+
+    try:
+        return SearchQuery(
+            tags=tuple(tags),
+            sort=_single_value(params, "sort", DEFAULT_SORT),
+            is_video=types[search_type],
+            mime_type=_single_value(params, "mime_type"),
+            min_width=_int_param(params, "min_width"),
+            min_height=_int_param(params, "min_height")
+        )
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+class GalleryServer:
+    """
+    Asynchronous HTTP/1.1 server over a DatabaseManager.
+
+    Connections are kept alive between requests. Blocking work, which
+    is every database read and file open, runs on a thread pool of
+    workers threads.
+    """
+
+    def __init__(
+            self,
+            db_manager: "DatabaseManager",
+            host: str = DEFAULT_HOST,
+            port: int = DEFAULT_PORT,
+            workers: int | None = None
+    ) -> None:
+        self.db_manager = db_manager
+        self.host = host
+        # Port 0 binds a free port, which start() stores here
+        self.port = port
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers or db_manager.READ_POOL_SIZE,
+            thread_name_prefix="boardy3-server"
+        )
+        self._server: asyncio.Server | None = None
+        # Tasks of open connections, cancelled by close()
+        self._connections: set[asyncio.Task] = set()
+
+        self._routes: list[tuple[re.Pattern, Callable[..., Awaitable[Response]]]] = [
+            (re.compile(r"/api/search"), self._search),
+            (re.compile(r"/api/images/(\d+)"), self._image_info),
+            (re.compile(r"/api/tags"), self._tags),
+            (re.compile(r"/images/([^/]+)"), self._image_file),
+            (re.compile(r"/thumbnails/([^/]+)"), self._thumbnail),
+        ]
+
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_HEAD_BYTES
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Serving the library at <{self.url}>.")
+
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for task in self._connections:
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+    async def _handle_connection(
+            self,
+            reader: asyncio.StreamReader,
+            writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT
+                    )
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, None, error_response(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE), False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    break
+
+                request = parse_request(head)
+                if request is None:
+                    await self._send(writer, None, error_response(HTTPStatus.BAD_REQUEST), False)
+                    break
+
+                keep_alive = request.headers.get("connection", "").lower() != "close" \
+                    and request.version == "HTTP/1.1"
+                if request.method not in ("GET", "HEAD"):
+                    # Request bodies are never read, so the connection
+                    # cannot be reused
+                    response = error_response(HTTPStatus.METHOD_NOT_ALLOWED)
+                    response.headers["Allow"] = "GET, HEAD"
+                    await self._send(writer, request, response, False)
+                    break
+
+                response = await self._respond(request)
+                await self._send(writer, request, response, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+
+    async def _respond(self, request: Request) -> Response:
+        url = urlsplit(request.target)
+        path = unquote(url.path)
+        params = parse_qs(url.query)
+
+        for pattern, handler in self._routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            try:
+                response = await handler(*match.groups(), params)
+            except BadRequest as e:
+                return error_response(HTTPStatus.BAD_REQUEST, str(e))
+            except Exception:
+                logger.exception(f"Failed to answer <{request.target}>.")
+                return error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+            break
+        else:
+            return error_response(HTTPStatus.NOT_FOUND)
+
+        return self._apply_conditions(request, response)
+
+
+    def _apply_conditions(self, request: Request, response: Response) -> Response:
+        """Answer If-None-Match with 304 and Range with 206 or 416."""
+        if response.status != HTTPStatus.OK:
+            return response
+
+        etag = response.headers.get("ETag")
+        if_none_match = request.headers.get("if-none-match")
+        if etag is not None and if_none_match is not None:
+            # Weak comparison, as If-None-Match requires
+            candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in candidates or etag.removeprefix("W/") in candidates:
+                if response.file is not None:
+                    response.file.close()
+                headers = {
+                    name: value for name, value in response.headers.items()
+                    if name in ("ETag", "Cache-Control")
+                }
+                return Response(HTTPStatus.NOT_MODIFIED, headers)
+
+        range_header = request.headers.get("range")
+        if response.file is None or range_header is None:
+            return response
+
+        match = _RANGE_PATTERN.fullmatch(range_header.strip())
+        if match is None:
+            # Multiple ranges are not supported; the whole file is sent
+            return response
+        start, end = match.groups()
+        size = response.length
+        if start:
+            first, last = int(start), min(int(end), size - 1) if end else size - 1
+        elif end:
+            # Suffix range of the last bytes
+            first, last = max(size - int(end), 0), size - 1
+        else:
+            return response
+
+        if first > last or first >= size:
+            response.file.close()
+            unsatisfiable = error_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            unsatisfiable.headers["Content-Range"] = f"bytes */{size}"
+            return unsatisfiable
+
+        headers = dict(response.headers, **{"Content-Range": f"bytes {first}-{last}/{size}"})
+        return response._replace(
+            status=HTTPStatus.PARTIAL_CONTENT, headers=headers,
+            offset=first, length=last - first + 1
+        )
+
+
+    async def _send(
+            self,
+            writer: asyncio.StreamWriter,
+            request: Request | None,
+            response: Response,
+            keep_alive: bool
+    ) -> None:
+        length = response.length if response.file is not None else len(response.body)
+        headers = {
+            "Date": formatdate(usegmt=True),
+            "Server": "boardy3",
+            "Connection": "keep-alive" if keep_alive else "close",
+            **response.headers
+        }
+        if response.status != HTTPStatus.NOT_MODIFIED:
+            headers["Content-Length"] = str(length)
+        if response.file is not None:
+            headers["Accept-Ranges"] = "bytes"
+
+        head = f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n")
+
+        try:
+            if request is not None and request.method == "HEAD":
+                pass
+            elif response.file is not None:
+                # Falls back to reading and writing where sendfile is
+                # not available
+                await asyncio.get_running_loop().sendfile(
+                    writer.transport, response.file, response.offset, response.length
+                )
+            else:
+                writer.write(response.body)
+            await writer.drain()
+        finally:
+            if response.file is not None:
+                response.file.close()
+
+
+    async def _run(self, function: Callable[..., T], *args: Any) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+    def _record_json(self, record: "ImageRecord") -> dict[str, Any]:
+        return {
+            "id": record.id,
+            "filename": record.filename,
+            "is_video": record.is_video,
+            "width": record.width,
+            "height": record.height,
+            "image": f"/images/{record.filename}",
+            "thumbnail": f"/thumbnails/{record.filename}"
+        }
+
+
+    async def _search(self, params: dict[str, list[str]]) -> Response:
+        query = build_search_query(params)
+        page = _int_param(params, "page", 1, minimum=1)
+        page_size = min(
+            _int_param(params, "page_size", self.db_manager.DEFAULT_PAGE_SIZE, minimum=1),
+            MAX_PAGE_SIZE
+        )
+
+        def search() -> tuple[int, list["ImageRecord"]]:
+            self.db_manager.check_external_writes()
+            result_ids = self.db_manager.get_result_ids(query)
+            offset = (page - 1) * page_size
+            page_ids = result_ids[offset:offset + page_size]
+            return len(result_ids), self.db_manager.get_image_records(list(page_ids))
+
+        total, records = await self._run(search)
+        return json_response({
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "results": [self._record_json(record) for record in records]
+        })
+
+
+    async def _image_info(self, image_id: str, params: dict[str, list[str]]) -> Response:
+        def image_info() -> dict[str, Any] | None:
+            self.db_manager.check_external_writes()
+            record = self.db_manager.get_image_record(int(image_id))
+            if record is None:
+                return None
+            return dict(
+                self._record_json(record),
+                tags=[tag.name for tag in self.db_manager.get_tag_records(record.id)]
+            )
+
+        info = await self._run(image_info)
+        if info is None:
+            return error_response(HTTPStatus.NOT_FOUND, f"Image id <{image_id}> does not exist.")
+        return json_response(info)
+
+
+    async def _tags(self, params: dict[str, list[str]]) -> Response:
+        prefix = _single_value(params, "prefix", "")
+
+        def tags() -> list[dict[str, Any]]:
+            self.db_manager.check_external_writes()
+            return [
+                {"name": name, "count": count}
+                for name, count in sorted(self.db_manager.get_tag_counts().items())
+                if name.startswith(prefix)
+            ]
+
+        return json_response({"tags": await self._run(tags)})
+
+
+    async def _image_file(self, filename: str, params: dict[str, list[str]]) -> Response:
+        if _FILENAME_PATTERN.fullmatch(filename) is None:
+            return error_response(HTTPStatus.NOT_FOUND)
+
+        def image_file() -> Response:
+            # Small originals may be packed, and are sent from the pack
+            if self.db_manager.is_packed(filename):
+                content_type, _ = mimetypes.guess_type(filename)
+                return self._data_response(
+                    self.db_manager.read_image_data(filename),
+                    content_type or "application/octet-stream",
+                    filename
+                )
+            return self._file_response(self.db_manager.get_cached_image_path(filename), filename)
+
+        return await self._run(image_file)
+
+
+    async def _thumbnail(self, filename: str, params: dict[str, list[str]]) -> Response:
+        if _FILENAME_PATTERN.fullmatch(filename) is None:
+            return error_response(HTTPStatus.NOT_FOUND)
+
+        def thumbnail() -> Response:
+            try:
+                data = self.db_manager.get_packed_thumbnails([filename]).get(filename)
+            except OSError:
+                # The pack was compacted by another process since it was
+                # opened here
+                data = None
+            if data is not None:
+                return self._data_response(data, "image/jpeg", filename)
+
+            thumbnail_path = self.db_manager.get_thumbnail_path(filename)
+            if os.path.isfile(thumbnail_path):
+                return self._file_response(self.db_manager.get_cached_path(thumbnail_path), filename)
+
+            # Stills without a thumbnail are shown from the original, as
+            # in the gallery
+            content_type, _ = mimetypes.guess_type(filename)
+            if content_type is not None and content_type.startswith("image/"):
+                return self._file_response(self.db_manager.get_cached_image_path(filename), filename)
+            return error_response(HTTPStatus.NOT_FOUND)
+
+        return await self._run(thumbnail)
+
+
+    @staticmethod
+    def _data_response(data: bytes | memoryview, content_type: str, filename: str) -> Response:
+        return Response(HTTPStatus.OK, {
+            "Content-Type": content_type,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            "ETag": f'"{filename[:64]}"'
+        }, bytes(data))
+
+
+    @staticmethod
+    def _file_response(path: str, filename: str) -> Response:
+        """Open a stored file for sending. Runs on the thread pool."""
+        try:
+            infile = open(path, "rb")
+        except OSError:
+            return error_response(HTTPStatus.NOT_FOUND)
+
+        size = os.fstat(infile.fileno()).st_size
+        content_type, _ = mimetypes.guess_type(path)
+        return Response(HTTPStatus.OK, {
+            "Content-Type": content_type or "application/octet-stream",
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            "ETag": f'"{filename[:64]}"'
+        }, file=infile, length=size)
+
+
+def serve(
+        db_manager: "DatabaseManager",
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        workers: int | None = None,
+        on_ready: Callable[[str], None] | None = None
+) -> None:
+    """
+    Serve the library until interrupted. on_ready is called with the
+    server's url once it accepts connections.
+    """
+    async def run() -> None:
+        server = GalleryServer(db_manager, host, port, workers)
+        await server.start()
+        if on_ready is not None:
+            on_ready(server.url)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,208 @@
+from typing import NamedTuple
+
+from PyQt6.QtCore import QObject, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+from PyQt6.QtWidgets import QLabel, QWidget
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.models import ImageRecord
+from boardy3.database.search import SearchQuery
+
+
+# Side of the box gallery thumbnails are scaled into
+GALLERY_CELL_SIZE = 250
+
+
+class GalleryPage(NamedTuple):
+    query: SearchQuery
+    page: int
+    records: list[ImageRecord]
+    # Scaled to the gallery cell. Null where nothing could be read, in
+    # which case the widget falls back to the thumbnail path.
+    thumbnails: list[QImage]
+    # Shown from the last session's snapshot, not yet checked against
+    # the database
+    from_snapshot: bool = False
+
+
+def decode_thumbnail(data: bytes | memoryview | None, path: str, size: int) -> QImage:
+    """Decode a thumbnail from data, or else from path, scaled to fit size."""
+    image = QImage()
+    if data is not None:
+        image.loadFromData(data)
+    if image.isNull():
+        image = QImage(path)
+    if image.isNull():
+        return image
+
+    return image.scaled(
+        size, size,
+        Qt.AspectRatioMode.KeepAspectRatio,
+        Qt.TransformationMode.SmoothTransformation
+    )
+
+
+class PlaceholderWidget(QLabel):
+    """Empty gallery cell shown until the page is loaded."""
+
+    def __init__(self, size: int = GALLERY_CELL_SIZE, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+        self.setFixedSize(size, size)
+        self.setStyleSheet("background-color: #303030;")
+
+
+class _PageSignals(QObject):
+    loaded = pyqtSignal(int, object)
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Newest request, set from the GUI thread. Queued tasks of older
+        # requests skip their work.
+        self.request = 0
+
+
+class _PageTask(QRunnable):
+    """Query a gallery page and decode its thumbnails."""
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            request: int,
+            query: SearchQuery,
+            page: int,
+            page_size: int,
+            signals: _PageSignals
+    ) -> None:
+        super().__init__()
+        self.db_manager = db_manager
+        self.request = request
+        self.query = query
+        self.page = page
+        self.page_size = page_size
+        self.signals = signals
+
+
+    def run(self) -> None:
+        if self.request != self.signals.request:
+            return
+
+        records = self.db_manager.search_image_records(self.query, self.page, self.page_size)
+        # Read the page's thumbnails from the pack in one go
+        packed_thumbnails = self.db_manager.get_packed_thumbnails(
+            [record.filename for record in records]
+        )
+        thumbnails = []
+        for record in records:
+            data = packed_thumbnails.get(record.filename)
+            # Thumbnail files are only read for images missing from the pack
+            path = record.thumbnail_path if data is not None \
+                else self.db_manager.get_cached_path(record.thumbnail_path)
+            thumbnails.append(decode_thumbnail(data, path, GALLERY_CELL_SIZE))
+
+        self.signals.loaded.emit(
+            self.request,
+            GalleryPage(self.query, self.page, records, thumbnails)
+        )
+
+
+class _SnapshotTask(QRunnable):
+    """Decode the first page saved by the last session."""
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            request: int,
+            page_size: int,
+            signals: _PageSignals
+    ) -> None:
+        super().__init__()
+        self.db_manager = db_manager
+        self.request = request
+        self.page_size = page_size
+        self.signals = signals
+
+
+    def run(self) -> None:
+        if self.request != self.signals.request:
+            return
+
+        snapshot = self.db_manager.load_gallery_snapshot()
+        if snapshot is None or snapshot.page_size != self.page_size:
+            return
+
+        thumbnails = [
+            decode_thumbnail(data, record.thumbnail_path, GALLERY_CELL_SIZE)
+            for record, data in zip(snapshot.records, snapshot.thumbnails)
+        ]
+        self.signals.loaded.emit(
+            self.request,
+            GalleryPage(SearchQuery(), 1, snapshot.records, thumbnails, from_snapshot=True)
+        )
+
+
+class GalleryLoader(QObject):
+    """
+    Load gallery pages off the GUI thread.
+
+    load() queries the page and decodes its thumbnails on a thread pool
+    and emits page_loaded when done. Only the newest request is
+    delivered. The first page of the unfiltered gallery may also be
+    delivered early from the snapshot saved by the last session, followed
+    by the queried page unless the query finishes first.
+    """
+    page_loaded = pyqtSignal(object)
+
+    # Threads loading pages for all galleries
+    LOADER_THREADS = 2
+    _loader_pool: QThreadPool | None = None
+
+    def __init__(self, db_manager: DatabaseManager, parent: QObject | None = None) -> None:
+        super().__init__(parent)
+        self.db_manager = db_manager
+
+        # Whether the newest request delivered its queried page
+        self.done = True
+
+        self.signals = _PageSignals()
+        self.signals.loaded.connect(self._on_loaded)
+
+
+    @classmethod
+    def loader_pool(cls) -> QThreadPool:
+        # Shared, so that tasks may outlive the gallery they were started for
+        if cls._loader_pool is None:
+            cls._loader_pool = QThreadPool()
+            cls._loader_pool.setMaxThreadCount(cls.LOADER_THREADS)
+        return cls._loader_pool
+
+
+    def load(
+            self,
+            query: SearchQuery,
+            page: int,
+            page_size: int,
+            use_snapshot: bool = False
+    ) -> None:
+        self.signals.request += 1
+        self.done = False
+        request = self.signals.request
+
+        if use_snapshot and page == 1 and query == SearchQuery():
+            self.loader_pool().start(_SnapshotTask(self.db_manager, request, page_size, self.signals))
+        self.loader_pool().start(
+            _PageTask(self.db_manager, request, query, page, page_size, self.signals)
+        )
+
+
+    def stop(self) -> None:
+        """Drop every request still in progress."""
+        self.signals.request += 1
+        self.done = True
+
+
+    def _on_loaded(self, request: int, page: GalleryPage) -> None:
+        if request != self.signals.request or self.done:
+            return
+        if not page.from_snapshot:
+            self.done = True
+        self.page_loaded.emit(page)
@@ -1,8 +1,10 @@
+from collections.abc import Sequence
 import os
 import re
+from typing import TYPE_CHECKING
 
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QMouseEvent, QPixmap
+from PyQt6.QtCore import QEvent, QRect, QSize, Qt, pyqtSignal
+from PyQt6.QtGui import QCloseEvent, QEnterEvent, QImage, QKeySequence, QMouseEvent, QPixmap, QShortcut
 from PyQt6.QtWidgets import (
     QDialog,
     QLabel,
@@ -16,9 +18,19 @@ from PyQt6.QtWidgets import (
 )
 
 from boardy3.database.database_manager import DatabaseManager
-from boardy3.database.models import Tag
+from boardy3.database.models import ImageRecord, Tag
+from boardy3.database.search import SearchQuery
+from boardy3.database.thumbnails import StoryboardIndex
+from boardy3.ui.preload import NeighborPreloader, PreloadedImage
 from boardy3.ui.tag import TagsWindow
-from boardy3.ui.video_player import VideoPlayerWidget
+from boardy3.ui.tiled_image import TiledImageView
+from boardy3.utils import get_logger
+
+if TYPE_CHECKING:
+    from boardy3.ui.video_player import VideoPlayerWidget
+
+
+logger = get_logger(__name__)
 
 
 class ImageWidget(QLabel):
@@ -26,39 +38,53 @@ class ImageWidget(QLabel):
 
     def __init__(
             self,
-            db_id: int,
+            image: ImageRecord,
             width: int | None = None,
             height: int | None = None,
             db_manager: DatabaseManager | None = None,
-            detached: bool = False
+            detached: bool = False,
+            search_query: SearchQuery | None = None,
+            thumbnail: QImage | None = None
     ):
         super().__init__()
 
-        # Image id from database
-        self.db_id = db_id
+        # Image record from database
+        self.image_ = image
+        self.db_id = image.id
+        # Search the gallery showing the widget ran, if any
+        self.search_query = search_query
 
         self.db_manager = db_manager or DatabaseManager()
         self.detached = detached    # Is the widget separate from the main window?
 
-        # Grab image from database
-        self.image_ = self.db_manager.get_image(self.db_id)
-        if self.image_ is None:
-            raise ValueError(f"Invalid image id: {self.db_id}.")
-        
-        # If the db image is actually a video, use the video thubmnail instead
-        if self.image_.is_video is True:
-            self.image_path = self.db_manager.get_thumbnail_path(self.image_.filename)
+        # If the db image is actually a video, the record already points
+        # to the video thumbnail instead
+        self.image_path = self.db_manager.get_cached_path(self.image_.thumbnail_path)
+        if self.detached and not self.image_.is_video:
+            # Detached windows show the full image
+            self.image_path = self.db_manager.get_cached_image_path(self.image_.filename)
+
+        # Gallery pages pass in the thumbnail already decoded and scaled
+        # by their loader
+        if thumbnail is not None and not thumbnail.isNull() and not self.detached:
+            self.setPixmap(QPixmap.fromImage(thumbnail))
         else:
-            self.image_path = self.db_manager.get_image_path(self.image_.filename)
-
-        _pixmap = QPixmap(self.image_path)
-        _w = width if width else _pixmap.width()
-        _h = height if height else _pixmap.height()
-        self.setPixmap(_pixmap.scaled(
-            _w, _h,
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        ))
+            _pixmap = QPixmap(self.image_path)
+            _w = width if width else _pixmap.width()
+            _h = height if height else _pixmap.height()
+            self.setPixmap(_pixmap.scaled(
+                _w, _h,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            ))
+
+        # Gallery videos scrub through their storyboard on hover. The
+        # sprite sheet is only loaded while the cursor is over the cell.
+        self.static_pixmap = self.pixmap()
+        self.storyboard: tuple[QPixmap, StoryboardIndex] | None = None
+        self.storyboard_frame = -1
+        if self.image_.is_video and not self.detached:
+            self.setMouseTracking(True)
 
 
     def mousePressEvent(self, ev: QMouseEvent) -> None:
@@ -67,7 +93,9 @@ class ImageWidget(QLabel):
             # widget is already detached.
             if ev.button() == Qt.MouseButton.LeftButton:
                 """Creates a detached window containing an image. """
-                self.image_window = ImageWindow(self.db_id, self.image_path)
+                result_ids = self.db_manager.get_result_ids(self.search_query) \
+                    if self.search_query is not None else None
+                self.image_window = ImageWindow(self.image_, self.db_manager, result_ids)
 
                 # This is a little workaround since ImageWidget is used
                 # both for the image gallery and the pop out image windows.
@@ -76,6 +104,52 @@ class ImageWidget(QLabel):
                 self.image_window.show()
 
     
+    def enterEvent(self, event: QEnterEvent) -> None:
+        if self.hasMouseTracking():
+            self.storyboard = self._load_storyboard()
+        super().enterEvent(event)
+
+
+    def mouseMoveEvent(self, ev: QMouseEvent) -> None:
+        if self.storyboard is not None and self.width() > 0:
+            sprite, index = self.storyboard
+            frame = index.frame_at(ev.position().x() / self.width())
+            if frame != self.storyboard_frame:
+                self.storyboard_frame = frame
+                self.setPixmap(sprite.copy(QRect(*index.tile_rect(frame))).scaled(
+                    self.static_pixmap.size(),
+                    Qt.AspectRatioMode.KeepAspectRatio,
+                    Qt.TransformationMode.FastTransformation
+                ))
+        super().mouseMoveEvent(ev)
+
+
+    def leaveEvent(self, event: QEvent) -> None:
+        if self.storyboard is not None:
+            self.storyboard = None
+            self.storyboard_frame = -1
+            self.setPixmap(self.static_pixmap)
+        super().leaveEvent(event)
+
+
+    def _load_storyboard(self) -> tuple[QPixmap, StoryboardIndex] | None:
+        sprite_path, index_path = self.db_manager.get_storyboard_paths(self.image_.filename)
+        if not os.path.exists(index_path):
+            # Not generated yet
+            return None
+
+        try:
+            index = StoryboardIndex.load(index_path)
+        except (OSError, ValueError, TypeError):
+            return None
+
+        sprite = QPixmap(self.db_manager.get_cached_path(sprite_path))
+        if sprite.isNull():
+            return None
+
+        return sprite, index
+
+
     def fetch_tags(self) -> list[Tag]:
         return self.db_manager.get_tags_by_image_id(self.db_id)
     
@@ -99,28 +173,82 @@ class ImageWidget(QLabel):
 class ImageWindow(QMainWindow):
     deleted = pyqtSignal()
 
-    def __init__(self, db_id: int, image_path: str):
+    # Box the image or video is fitted in
+    DETAIL_SIZE = 800
+
+    def __init__(
+            self,
+            image: ImageRecord,
+            db_manager: DatabaseManager | None = None,
+            result_ids: Sequence[int] | None = None
+    ):
         super().__init__()
 
+        # Free the window, and its media player, as soon as it is closed
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+
+        self.db_manager = db_manager or DatabaseManager()
+
+        # Ordered ids of the search the image was opened from. The
+        # window steps through them with the arrow keys.
+        self.result_ids: Sequence[int] = result_ids if result_ids is not None else [image.id]
+        try:
+            self.position = self.result_ids.index(image.id)
+        except ValueError:
+            self.result_ids, self.position = [image.id], 0
+
+        self.preloader = NeighborPreloader(self.db_manager, self.DETAIL_SIZE, self.DETAIL_SIZE, parent=self)
+        self.image_widget: "TiledImageView | VideoPlayerWidget | None" = None
+
         # Shift instantiation position of image window top left
         self.setGeometry(100, 100, self.width(), self.height())
 
+        # Arrow keys still move the cursor while typing a tag
+        self.previous_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Left), self)
+        self.previous_shortcut.activated.connect(self.show_previous)
+        self.next_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Right), self)
+        self.next_shortcut.activated.connect(self.show_next)
+
+        self._show_image(image)
+
+
+    def _show_image(self, image: ImageRecord, preloaded: PreloadedImage | None = None) -> None:
+        """Replace the window contents with another image."""
+        self._release_player()
+        self.image_ = image
+
         # Use the image filename as the window title
-        self.setWindowTitle(os.path.splitext(os.path.basename(image_path))[0])
+        self.setWindowTitle(os.path.splitext(image.filename)[0])
 
+        # The previous central widget and its children are deleted
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
 
-        # Display image/video
-        self.image_widget = ImageWidget(db_id, 800, 800, detached=True)
-        assert(self.image_widget.image_ is not None)
-        # Check if image widget is actually a video
-        if self.image_widget.image_.is_video is True:
-            self.image_widget.deleteLater()
-            self.image_widget = VideoPlayerWidget(db_id, 800, 800)
+        # Display image/video. Videos show their thumbnail until played
+        # and images start from their thumbnail while the full image is
+        # decoded in the background, unless it was preloaded.
+        if image.is_video is True:
+            # QtMultimedia is slow to load and not needed for stills
+            from boardy3.ui.video_player import VideoPlayerWidget
+
+            self.image_widget = VideoPlayerWidget(image, self.DETAIL_SIZE, self.DETAIL_SIZE, self.db_manager)
+        else:
+            self.image_widget = TiledImageView(
+                self.db_manager.get_cached_image_path(image.filename),
+                self.db_manager.get_cached_path(image.thumbnail_path),
+                self.DETAIL_SIZE, self.DETAIL_SIZE,
+                QSize(image.width, image.height) if image.width and image.height else None,
+                base_image=preloaded.image if preloaded is not None else None
+            )
+
+        # Prefer the stored dimensions over the displayed ones
+        if image.width and image.height:
+            width, height = image.width, image.height
+        else:
+            width, height = self.image_widget.get_width(), self.image_widget.get_height()
 
         # if isinstance(self.image_widget, ImageWidget):
-        if self.image_widget.get_width() > self.image_widget.get_height():
+        if width > height:
             portrait = False
             self.layout_ = QVBoxLayout()
         else:
@@ -135,15 +263,30 @@ class ImageWindow(QMainWindow):
         #         self.layout_ = QHBoxLayout()
 
         # Create a panel to contain tags
-        self.tags_panel = TagsWindow(self.image_widget.db_id, portrait=portrait)
+        self.tags_panel = TagsWindow(
+            image.id, self.db_manager, portrait=portrait,
+            tags=preloaded.tags if preloaded is not None else None
+        )
 
         self.delete_button = QPushButton("Delete Image")
         self.delete_button.clicked.connect(self.delete_image)
 
-        # Create a sub layout to contain the delete button and tags panel
+        self.previous_button = QPushButton("Previous")
+        self.previous_button.clicked.connect(self.show_previous)
+        self.previous_button.setEnabled(self.position > 0)
+        self.next_button = QPushButton("Next")
+        self.next_button.clicked.connect(self.show_next)
+        self.next_button.setEnabled(self.position < len(self.result_ids) - 1)
+
+        self.buttons_layout_ = QHBoxLayout()
+        self.buttons_layout_.addWidget(self.previous_button)
+        self.buttons_layout_.addWidget(self.delete_button, stretch=1)
+        self.buttons_layout_.addWidget(self.next_button)
+
+        # Create a sub layout to contain the buttons and tags panel
         self.secondary_layout_ = QVBoxLayout()
         self.secondary_layout_.addWidget(self.tags_panel, stretch=1)
-        self.secondary_layout_.addWidget(self.delete_button, stretch=1)
+        self.secondary_layout_.addLayout(self.buttons_layout_, stretch=1)
         self.secondary_layout_widget = QWidget()
         self.secondary_layout_widget.setLayout(self.secondary_layout_)
 
@@ -166,9 +309,41 @@ class ImageWindow(QMainWindow):
 
         self.central_widget.setLayout(self.layout_)
 
+        # Get the next steps ready while this image is looked at
+        self.preloader.preload(self.result_ids, self.position)
+
+
+    def show_next(self) -> None:
+        self._step(1)
+
+
+    def show_previous(self) -> None:
+        self._step(-1)
+
+
+    def _step(self, step: int) -> None:
+        position = self.position + step
+        while 0 <= position < len(self.result_ids):
+            image_id = self.result_ids[position]
+            preloaded = self.preloader.get(image_id)
+            image = preloaded.record if preloaded is not None \
+                else self.db_manager.get_image_record(image_id)
+
+            # Skip images deleted since the search ran
+            if image is not None:
+                self.position = position
+                self._show_image(image, preloaded)
+                logger.debug(
+                    f"Showing image <{image_id}> ({position + 1}/{len(self.result_ids)}), "
+                    f"preloaded: {preloaded is not None}."
+                )
+                return
+
+            position += step
+
 
     def fetch_tags(self) -> list[Tag]:
-        return self.image_widget.fetch_tags()
+        return self.db_manager.get_tags_by_image_id(self.image_.id)
     
 
     def delete_image(self) -> None:
@@ -182,7 +357,9 @@ class ImageWindow(QMainWindow):
         )
 
         if answer == msg_box.StandardButton.Yes:
-            self.image_widget.delete_image()
+            self.preloader.stop()
+            self._release_player()
+            self.db_manager.delete_image(self.image_.id)
 
             # Delete the image window
             self.deleteLater()
@@ -193,6 +370,19 @@ class ImageWindow(QMainWindow):
         return super().mousePressEvent(ev)
 
 
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.preloader.stop()
+        self._release_player()
+        super().closeEvent(event)
+
+
+    def _release_player(self) -> None:
+        # Only video players hold a media player to release
+        release_player = getattr(self.image_widget, "release_player", None)
+        if release_player is not None:
+            release_player()
+
+
 class ImageUrlInputDialog(QDialog):
     def __init__(self, parent: QWidget | None = None) -> None:
         super().__init__(parent)
@@ -1,8 +1,8 @@
 import os
-from typing import Sequence
+import time
 
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QAction, QAction, QCloseEvent, QKeySequence
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QAction, QAction, QCloseEvent, QImage, QKeySequence, QShowEvent
 from PyQt6.QtWidgets import (
     QApplication,
     QFileDialog,
@@ -15,23 +15,43 @@ from PyQt6.QtWidgets import (
     QWidget
 )
 
-from boardy3.database import column_to_int
+from boardy3.database.backfill import BackfillRunner, MediaMetadataBackfill, MipmapBackfill, OriginalPackBackfill, ProxyBackfill, StoryboardBackfill, ThumbnailBackfill, ThumbnailPackBackfill
 from boardy3.database.database_manager import DatabaseManager
 from boardy3.database.image_loader import ImageLoader, DirImageLoader, NetworkImageLoader
-import boardy3.database.models as db_models
+from boardy3.database.models import ImageRecord
+from boardy3.database.search import SearchQuery
+from boardy3.ui.gallery import GALLERY_CELL_SIZE, GalleryLoader, GalleryPage, PlaceholderWidget
 from boardy3.ui.image import ImageUrlInputDialog, ImageWidget
 from boardy3.ui.layout import FlowLayout, clear_layout
+from boardy3.ui.overview import OverviewWindow
 from boardy3.ui.searchbox import SearchBox
+from boardy3.ui.slideshow import SlideshowDialog, SlideshowWindow
 from boardy3.ui.tag import BatchCreateTagsDialog
 from boardy3.ui.toolbar import ToolBar
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, db_manager: DatabaseManager) -> None:
+    # Milliseconds between backfill progress updates in the status bar
+    BACKFILL_STATUS_INTERVAL = 2000
+
+    def __init__(self, db_manager: DatabaseManager, started: float | None = None) -> None:
+        """
+        started is the time.perf_counter() value the application started
+        at, from which the start up timings are measured.
+        """
         super().__init__()
 
         self.db_manager = db_manager
 
+        # Milliseconds from start until the first paint, the snapshot of
+        # the last session and the queried first page were shown
+        self.started = started if started is not None else time.perf_counter()
+        self.startup_timings: dict[str, float] = {}
+
         self.setWindowTitle("Image Viewer")
         self.setGeometry(100, 100, 800, 600)
 
@@ -69,8 +89,43 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(self.central_widget)
 
-        # Show all images on startup
-        self.refresh_images()
+        # Scrolling through the gallery holds off background work
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self._notify_activity)
+
+        # Fill in data missing from images imported by older versions
+        self.backfill_runner = BackfillRunner(
+            db_manager,
+            [
+                MediaMetadataBackfill(db_manager),
+                ThumbnailBackfill(db_manager),
+                ThumbnailPackBackfill(db_manager),
+                # Only runs when originals are packed
+                OriginalPackBackfill(db_manager),
+                MipmapBackfill(db_manager),
+                StoryboardBackfill(db_manager),
+                # Only runs when a proxy budget is configured
+                ProxyBackfill(db_manager)
+            ]
+        )
+        self.backfill_status_timer = QTimer(self)
+        self.backfill_status_timer.timeout.connect(self._show_backfill_status)
+
+        # Gallery pages are queried and decoded in the background. The
+        # page shown is the one of the latest request.
+        self.gallery_loader = GalleryLoader(db_manager, self)
+        self.gallery_loader.page_loaded.connect(self._show_page)
+        self.shown_page: GalleryPage | None = None
+
+        # Show all images on startup. The window paints with empty cells,
+        # which are filled from the last session's snapshot if it is
+        # still current, and then from the database.
+        page_size = self.toolbar.get_current_page_size()
+        for _ in range(page_size):
+            self.images_layout.addWidget(PlaceholderWidget())
+        self.gallery_loader.load(self.toolbar.search_query, 1, page_size, use_snapshot=True)
+
+        self.backfill_runner.start()
+        self.backfill_status_timer.start(self.BACKFILL_STATUS_INTERVAL)
 
     
     def _create_actions(self) -> None:
@@ -90,6 +145,14 @@ class MainWindow(QMainWindow):
         self.batch_create_tags_action.triggered.connect(self.batch_create_tags)
         self.batch_create_tags_action.setShortcut(QKeySequence("Ctrl+B"))
 
+        self.slideshow_action = QAction("&Slideshow", self)
+        self.slideshow_action.triggered.connect(self.start_slideshow)
+        self.slideshow_action.setShortcut(QKeySequence("F5"))
+
+        self.overview_action = QAction("&Overview", self)
+        self.overview_action.triggered.connect(self.show_overview)
+        self.overview_action.setShortcut(QKeySequence("Ctrl+O"))
+
 
     def _create_menu_bar(self) -> None:
         menu_bar = self.menuBar()
@@ -102,6 +165,11 @@ class MainWindow(QMainWindow):
         import_menu.addAction(self.import_dir_action)
         import_menu.addAction(self.batch_create_tags_action)
 
+        # View Menu
+        view_menu = menu_bar.addMenu("View")
+        view_menu.addAction(self.overview_action)
+        view_menu.addAction(self.slideshow_action)
+
         self.setMenuBar(menu_bar)
 
     
@@ -131,17 +199,17 @@ class MainWindow(QMainWindow):
             image_loader.progress_updated.connect(progress_dialog.setValue)
             image_loader.finished.connect(progress_dialog.accept)
 
-            # Hide the cancel button (until I can find a better way
-            # to handle safely exiting the image loader thread)
-            # (2024-03-27)
-            # progress_dialog.findChildren(QPushButton)[0].hide()
-            progress_dialog.canceled.connect(image_loader.terminate)    # The cancel button doesn't really work
+            # The loader stops after the file it is importing
+            progress_dialog.canceled.connect(image_loader.requestInterruption)
 
-            # Start the ImageLoader thread
-            image_loader.start()
+            # Relax SQLite durability settings while importing
+            with self.db_manager.storage_profile_scope("bulk-import"):
+                # Start the ImageLoader thread
+                image_loader.start()
 
-            # Display the progress dialog
-            progress_dialog.exec()
+                # Display the progress dialog
+                progress_dialog.exec()
+                image_loader.wait()
 
             # Reset page back to 1
             # This should trigger a page refresh
@@ -170,17 +238,17 @@ class MainWindow(QMainWindow):
             net_image_loader.progress_updated.connect(progress_dialog.setValue)
             net_image_loader.finished.connect(progress_dialog.accept)
 
-            # Hide the cancel button (until I can find a better way
-            # to handle safely exiting the image loader thread)
-            # (2024-03-27)
-            # progress_dialog.findChildren(QPushButton)[0].hide()
-            progress_dialog.canceled.connect(net_image_loader.terminate)    # The cancel button doesn't really work
+            # The loader stops after the url it is importing
+            progress_dialog.canceled.connect(net_image_loader.requestInterruption)
 
-            # Start the ImageLoader thread
-            net_image_loader.start()
+            # Relax SQLite durability settings while importing
+            with self.db_manager.storage_profile_scope("bulk-import"):
+                # Start the ImageLoader thread
+                net_image_loader.start()
 
-            # Display the progress dialog
-            progress_dialog.exec()
+                # Display the progress dialog
+                progress_dialog.exec()
+                net_image_loader.wait()
 
             # Reset page back to 1
             # This should trigger a page refresh
@@ -212,15 +280,17 @@ class MainWindow(QMainWindow):
             # Change max value in progress dialog
             dir_image_loader.scan_completed.connect(progress_dialog.setMaximum)
 
-            # I have no idea why this started working properly.
-            # Just gonna assume it barrel magic. (2024-04-25)
-            progress_dialog.canceled.connect(dir_image_loader.terminate)
+            # The loader stops after the file it is importing
+            progress_dialog.canceled.connect(dir_image_loader.requestInterruption)
 
-            # Start the ImageLoader thread
-            dir_image_loader.start()
+            # Relax SQLite durability settings while importing
+            with self.db_manager.storage_profile_scope("bulk-import"):
+                # Start the ImageLoader thread
+                dir_image_loader.start()
 
-            # Display the progress dialog
-            progress_dialog.exec()
+                # Display the progress dialog
+                progress_dialog.exec()
+                dir_image_loader.wait()
 
             # Reset page back to 1
             # This should trigger a page refresh
@@ -229,69 +299,143 @@ class MainWindow(QMainWindow):
 
     def batch_create_tags(self) -> None:
         # Instance BatchCreateTagsDialog
-        batch_create_dialog = BatchCreateTagsDialog()
+        batch_create_dialog = BatchCreateTagsDialog(db_manager=self.db_manager)
         batch_create_dialog.exec()
 
         
-    def search_images(self) -> None:
-        tags_string = self.searchbox.search_line_edit.text().strip()
-        image_results = self.db_manager.search_images(
-            tags_string.split(),
-            page=1,
-            page_size=int(self.toolbar.page_size_combo_box.currentText())
+    def show_overview(self) -> None:
+        # Show the whole current search at once
+        self.overview_window = OverviewWindow(self.db_manager, self.toolbar.search_query)
+        self.overview_window.show()
+
+
+    def start_slideshow(self) -> None:
+        query = self.toolbar.search_query
+        if len(self.db_manager.get_result_ids(query)) == 0:
+            self.statusBar().showMessage("No images to show.")
+            return
+
+        slideshow_dialog = SlideshowDialog(self)
+        if slideshow_dialog.exec() != SlideshowDialog.DialogCode.Accepted:
+            return
+
+        # Cycle through the current search
+        self.slideshow = SlideshowWindow(
+            self.db_manager,
+            query,
+            slideshow_dialog.interval(),
+            slideshow_dialog.shuffle()
         )
+        self.slideshow.showFullScreen()
 
-        # Reset page back to 1
-        self.toolbar.reset_page()
-        # FIXME: This is not optimal since the page gets refreshed before
-        # clearing the layout again.
-        # Clear existing widgets from layout
-        self.clear_images_layout()
 
-        # Re-populate images layout with update list of images
-        self._add_images_to_layout(image_results)
+    def search_images(self) -> None:
+        tags_string = self.searchbox.search_line_edit.text().strip()
+
+        # Page through the new search starting from page 1.
+        # This should trigger a page refresh
+        self.toolbar.set_search_query(SearchQuery.from_tags(tags_string.split()))
 
     
     def refresh_images(self) -> None:
-        # Clear existing widgets from layout
-        self.clear_images_layout()
+        self._notify_activity()
 
-        # Re-populate images layout with update list of images
-        # The empty list is there as a janky fix until I find a
-        # better solution (2024-02-08).
-        images = self.db_manager.search_images(
-            list(),
+        # The current page stays up until the new one is loaded
+        self.gallery_loader.load(
+            self.toolbar.search_query,
             self.toolbar.current_page,
-            int(self.toolbar.page_size_combo_box.currentText())
+            self.toolbar.get_current_page_size()
         )
 
-        self._add_images_to_layout(images)
+
+    def _show_page(self, page: GalleryPage) -> None:
+        shown_page, self.shown_page = self.shown_page, page
+        if page.from_snapshot:
+            self._record_startup("snapshot")
+        elif shown_page is not None and shown_page.from_snapshot:
+            self._record_startup("first_page")
+            if shown_page.records == page.records:
+                # The snapshot was current, keep its widgets
+                return
+        elif "first_page" not in self.startup_timings:
+            self._record_startup("first_page")
+
+        # Clear existing widgets from layout
+        self.clear_images_layout()
+        for image, thumbnail in zip(page.records, page.thumbnails):
+            self._add_image_to_layout(image, thumbnail)
     
 
     def clear_images_layout(self) -> None:
         clear_layout(self.images_layout)
 
     
-    def _add_image_to_layout(self, image: db_models.Image) -> None:
-        image_widget = self._create_image_widget(column_to_int(image.id))
+    def _add_image_to_layout(self, image: ImageRecord, thumbnail: QImage | None = None) -> None:
+        image_widget = self._create_image_widget(image, thumbnail)
         self.images_layout.addWidget(image_widget)
-
-
-    def _add_images_to_layout(self, images: Sequence[db_models.Image]) -> None:
-        for image in images:
-            self._add_image_to_layout(image)
     
 
     def _create_image_widget(
             self,
-            db_id: int
+            image: ImageRecord,
+            thumbnail: QImage | None = None
     ) -> ImageWidget:
-        image_ = ImageWidget(db_id, 250, 250)
+        image_ = ImageWidget(
+            image, GALLERY_CELL_SIZE, GALLERY_CELL_SIZE, self.db_manager,
+            search_query=self.toolbar.search_query,
+            thumbnail=thumbnail
+        )
         # Refresh gallery after deleting widget
         image_.deleted.connect(self.refresh_images)
         return image_
     
 
+    def _notify_activity(self) -> None:
+        self.backfill_runner.notify_activity()
+
+
+    def _record_startup(self, event: str) -> None:
+        if event in self.startup_timings:
+            return
+        self.startup_timings[event] = (time.perf_counter() - self.started) * 1000
+
+        if event == "first_page":
+            logger.info("Start up: " + ", ".join(
+                f"{name.replace('_', ' ')} after {ms:.0f} ms"
+                for name, ms in self.startup_timings.items()
+            ))
+
+
+    def showEvent(self, event: QShowEvent) -> None:
+        super().showEvent(event)
+        # Runs once the events queued by showing, including the first
+        # paint, are processed
+        if "first_paint" not in self.startup_timings:
+            QTimer.singleShot(0, lambda: self._record_startup("first_paint"))
+
+
+    def _show_backfill_status(self) -> None:
+        progress = self.backfill_runner.progress()
+        if progress is None or progress.done:
+            self.statusBar().clearMessage()
+            if not self.backfill_runner.is_alive():
+                self.backfill_status_timer.stop()
+        else:
+            self.statusBar().showMessage(str(progress))
+
+
     # Quit the application when the main window is closed
     def closeEvent(self, event: QCloseEvent) -> None:
+        # Background jobs must finish their batch before the database
+        # is closed
+        self.backfill_status_timer.stop()
+        self.backfill_runner.stop()
+        self.gallery_loader.stop()
+
+        # Lets the next start show the first page before querying it
+        try:
+            self.db_manager.save_gallery_snapshot(self.toolbar.get_current_page_size())
+        except OSError as e:
+            logger.warning(f"Could not save the gallery snapshot: {e}")
+
         QApplication.quit()
@@ -0,0 +1,216 @@
+from collections import OrderedDict
+from collections.abc import Sequence
+import math
+
+from PyQt6.QtCore import QPoint, QRect, Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QImage, QMouseEvent, QPainter, QPaintEvent, QResizeEvent, QWheelEvent
+from PyQt6.QtWidgets import QAbstractScrollArea, QMainWindow, QWidget
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.mipmaps import compose_tiles
+from boardy3.database.search import SearchQuery
+from boardy3.ui.image import ImageWindow
+
+
+class OverviewView(QAbstractScrollArea):
+    """
+    Every result of a search as a grid of tiny tiles on one surface.
+
+    Tiles come from the mipmap store. Rows are composed in blocks with
+    NumPy, converted to one QImage per block at the current cell size and
+    cached, so scrolling only draws a few cached images per frame.
+
+    Scroll to move, Ctrl + scroll to change the cell size and click a
+    tile to open its image.
+    """
+    image_activated = pyqtSignal(int)
+
+    MIN_CELL_SIZE = 8
+    MAX_CELL_SIZE = 64
+    # Rows composed into one cached image
+    BLOCK_ROWS = 16
+    MAX_CACHED_BLOCKS = 48
+    # Milliseconds between redraws of blocks with tiles still missing
+    INCOMPLETE_REFRESH_INTERVAL = 2000
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            result_ids: Sequence[int],
+            parent: QWidget | None = None
+    ) -> None:
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.result_ids = result_ids
+        self.cell_size = db_manager.mipmap_store.size
+
+        # Block index -> (image, whether every tile was present)
+        self.blocks: OrderedDict[int, tuple[QImage, bool]] = OrderedDict()
+
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+
+        # Tiles created by the backfill meanwhile show up without a reload
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self._refresh_incomplete)
+        self.refresh_timer.start(self.INCOMPLETE_REFRESH_INTERVAL)
+
+        self._update_scroll_bar()
+
+
+    def columns(self) -> int:
+        return max(self.viewport().width() // self.cell_size, 1)
+
+
+    def set_cell_size(self, cell_size: int, anchor: QPoint | None = None) -> None:
+        cell_size = min(max(cell_size, self.MIN_CELL_SIZE), self.MAX_CELL_SIZE)
+        if cell_size == self.cell_size:
+            return
+
+        # Keep the tile under the anchor, or the first visible one, in place
+        anchor = anchor or QPoint(0, 0)
+        index = self._index_at(anchor, clamp=True)
+
+        self.cell_size = cell_size
+        self.blocks.clear()
+        self._update_scroll_bar()
+
+        row = index // self.columns()
+        self.verticalScrollBar().setValue(row * self.cell_size - anchor.y())
+        self.viewport().update()
+
+
+    def index_at(self, position: QPoint) -> int | None:
+        """Return the result index of the tile at a viewport position."""
+        index = self._index_at(position)
+        return index if 0 <= index < len(self.result_ids) else None
+
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), Qt.GlobalColor.black)
+
+        columns = self.columns()
+        block_height = self.BLOCK_ROWS * self.cell_size
+        top = self.verticalScrollBar().value()
+        first_block = top // block_height
+        last_block = (top + self.viewport().height()) // block_height
+        block_count = math.ceil(len(self.result_ids) / (self.BLOCK_ROWS * columns))
+
+        for block in range(first_block, min(last_block + 1, block_count)):
+            painter.drawImage(QPoint(0, block * block_height - top), self._block(block, columns))
+
+        painter.end()
+
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        if event.oldSize().width() // self.cell_size != event.size().width() // self.cell_size:
+            self.blocks.clear()
+        self._update_scroll_bar()
+        super().resizeEvent(event)
+
+
+    def wheelEvent(self, event: QWheelEvent) -> None:
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            steps = event.angleDelta().y() / 120
+            self.set_cell_size(round(self.cell_size * 1.25 ** steps), event.position().toPoint())
+        else:
+            super().wheelEvent(event)
+
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MouseButton.LeftButton:
+            index = self.index_at(event.position().toPoint())
+            if index is not None:
+                self.image_activated.emit(self.result_ids[index])
+        super().mousePressEvent(event)
+
+
+    def _index_at(self, position: QPoint, clamp: bool = False) -> int:
+        columns = self.columns()
+        column = position.x() // self.cell_size
+        row = (position.y() + self.verticalScrollBar().value()) // self.cell_size
+        if clamp:
+            column = min(column, columns - 1)
+        elif column >= columns:
+            return -1
+        return row * columns + column
+
+
+    def _block(self, block: int, columns: int) -> QImage:
+        cached = self.blocks.get(block)
+        if cached is not None:
+            self.blocks.move_to_end(block)
+            return cached[0]
+
+        start = block * self.BLOCK_ROWS * columns
+        ids = self.result_ids[start:start + self.BLOCK_ROWS * columns]
+        tiles, present = self.db_manager.mipmap_store.get_many(ids)
+        pixels = compose_tiles(tiles, columns)
+
+        height, width = pixels.shape[:2]
+        image = QImage(pixels.data, width, height, pixels.strides[0], QImage.Format.Format_RGB888)
+        if self.cell_size != tiles.shape[1]:
+            # Also detaches the image from the NumPy buffer
+            image = image.scaled(
+                width * self.cell_size // tiles.shape[1],
+                height * self.cell_size // tiles.shape[1],
+                Qt.AspectRatioMode.IgnoreAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+        else:
+            image = image.copy()
+
+        self.blocks[block] = (image, bool(present.all()))
+        while len(self.blocks) > self.MAX_CACHED_BLOCKS:
+            self.blocks.popitem(last=False)
+
+        return image
+
+
+    def _refresh_incomplete(self) -> None:
+        incomplete = [block for block, (_, complete) in self.blocks.items() if not complete]
+        for block in incomplete:
+            del self.blocks[block]
+        if incomplete:
+            self.viewport().update()
+
+
+    def _update_scroll_bar(self) -> None:
+        rows = math.ceil(len(self.result_ids) / self.columns())
+        scroll_bar = self.verticalScrollBar()
+        scroll_bar.setRange(0, max(rows * self.cell_size - self.viewport().height(), 0))
+        scroll_bar.setPageStep(self.viewport().height())
+        scroll_bar.setSingleStep(self.cell_size)
+
+
+class OverviewWindow(QMainWindow):
+    """Window showing a whole search in an OverviewView."""
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            query: SearchQuery,
+            parent: QWidget | None = None
+    ) -> None:
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+
+        self.db_manager = db_manager
+        self.result_ids = db_manager.get_result_ids(query)
+
+        self.setWindowTitle(f"Overview ({len(self.result_ids)} images)")
+        self.setGeometry(QRect(100, 100, 1200, 800))
+
+        self.view = OverviewView(db_manager, self.result_ids)
+        self.view.image_activated.connect(self.open_image)
+        self.setCentralWidget(self.view)
+
+
+    def open_image(self, image_id: int) -> None:
+        image = self.db_manager.get_image_record(image_id)
+        if image is None:
+            return
+
+        # Stepping through the detail window follows the overview
+        self.image_window = ImageWindow(image, self.db_manager, self.result_ids)
+        self.image_window.show()
@@ -0,0 +1,189 @@
+from collections.abc import Sequence
+from typing import NamedTuple
+
+from PyQt6.QtCore import QObject, QRunnable, QSize, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.models import ImageRecord, TagRecord
+from boardy3.ui.tiled_image import read_fitted
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+# Images preloaded on each side of the one being shown
+DEFAULT_PRELOAD_COUNT = 3
+
+
+class PreloadedImage(NamedTuple):
+    record: ImageRecord
+    # Decoded to fit the detail view. Null for videos, which start from
+    # their thumbnail anyway.
+    image: QImage
+    tags: list[TagRecord]
+    # Write generation the tags were read at
+    generation: int
+
+
+def neighbor_ids(result_ids: Sequence[int], position: int, count: int) -> list[int]:
+    """
+    Return the ids up to count places away from position, nearest
+    first. The next image comes before the previous one at the same
+    distance since results are mostly stepped through forwards.
+    """
+    ids = []
+    for distance in range(1, count + 1):
+        for neighbor in (position + distance, position - distance):
+            if 0 <= neighbor < len(result_ids):
+                ids.append(result_ids[neighbor])
+    return ids
+
+
+class _PreloadSignals(QObject):
+    # Entry is None if the image no longer exists or is no longer wanted
+    loaded = pyqtSignal(int, object)
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Ids still worth loading, replaced from the GUI thread
+        self.wanted: frozenset[int] = frozenset()
+
+
+class _PreloadTask(QRunnable):
+    """Load the record, tags and decoded image of one image."""
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            image_id: int,
+            size: QSize,
+            signals: _PreloadSignals
+    ) -> None:
+        super().__init__()
+        self.db_manager = db_manager
+        self.image_id = image_id
+        self.size = size
+        # Keeps the signals alive if the preloader goes away first
+        self.signals = signals
+
+
+    def run(self) -> None:
+        if self.image_id not in self.signals.wanted:
+            # Moved out of the window while queued
+            self.signals.loaded.emit(self.image_id, None)
+            return
+
+        # Read before querying so a write that lands meanwhile makes the
+        # tags stale rather than being missed
+        generation = self.db_manager.write_generation
+
+        record = self.db_manager.get_image_record(self.image_id)
+        if record is None:
+            self.signals.loaded.emit(self.image_id, None)
+            return
+
+        tags = self.db_manager.get_tag_records(self.image_id)
+
+        image = QImage()
+        if not record.is_video:
+            image = read_fitted(
+                self.db_manager.get_cached_image_path(record.filename),
+                self.size.width(), self.size.height(),
+                QSize(record.width, record.height) if record.width and record.height else None
+            )
+
+        self.signals.loaded.emit(self.image_id, PreloadedImage(record, image, tags, generation))
+
+
+class NeighborPreloader(QObject):
+    """
+    Keep the images around the one shown in a detail window loaded.
+
+    Each call to preload() moves the window of preloaded images. Records,
+    tags and images decoded to fit width x height are loaded on a thread
+    pool, nearest neighbors first. Entries that move out of the window
+    are dropped and their queued loads skipped, so memory stays at about
+    2 * count decoded images.
+    """
+    # Threads preloading for all windows
+    PRELOAD_THREADS = 2
+    _preload_pool: QThreadPool | None = None
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            width: int,
+            height: int,
+            count: int = DEFAULT_PRELOAD_COUNT,
+            parent: QObject | None = None
+    ) -> None:
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.size = QSize(width, height)
+        self.count = count
+
+        self.entries: dict[int, PreloadedImage] = {}
+        self.pending: set[int] = set()
+
+        self.hits = 0
+        self.misses = 0
+
+        self.signals = _PreloadSignals()
+        self.signals.loaded.connect(self._on_loaded)
+
+
+    @classmethod
+    def preload_pool(cls) -> QThreadPool:
+        # Shared, so that loads outlive the windows they were started for
+        if cls._preload_pool is None:
+            cls._preload_pool = QThreadPool()
+            cls._preload_pool.setMaxThreadCount(cls.PRELOAD_THREADS)
+        return cls._preload_pool
+
+
+    def preload(self, result_ids: Sequence[int], position: int) -> None:
+        """Preload the neighbors of the image at position in result_ids."""
+        ids = neighbor_ids(result_ids, position, self.count)
+        # Queued loads of other ids are skipped when their turn comes
+        self.signals.wanted = frozenset(ids)
+
+        self.entries = {id: entry for id, entry in self.entries.items() if id in self.signals.wanted}
+        for id in ids:
+            if id not in self.entries and id not in self.pending:
+                self.pending.add(id)
+                self.preload_pool().start(_PreloadTask(self.db_manager, id, self.size, self.signals))
+
+
+    def get(self, image_id: int) -> PreloadedImage | None:
+        """
+        Return the preloaded entry of an image, if it finished loading.
+        Tags changed since it was loaded are read again.
+        """
+        entry = self.entries.get(image_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        generation = self.db_manager.write_generation
+        if entry.generation != generation:
+            entry = entry._replace(
+                tags=self.db_manager.get_tag_records(image_id),
+                generation=generation
+            )
+            self.entries[image_id] = entry
+
+        return entry
+
+
+    def stop(self) -> None:
+        """Skip every queued load."""
+        self.signals.wanted = frozenset()
+        self.entries.clear()
+
+
+    def _on_loaded(self, image_id: int, entry: PreloadedImage | None) -> None:
+        self.pending.discard(image_id)
+        if entry is not None and image_id in self.signals.wanted:
+            self.entries[image_id] = entry
@@ -0,0 +1,383 @@
+from collections.abc import Sequence
+import random
+import time
+
+from PyQt6.QtCore import QObject, QRect, QRunnable, QSize, Qt, QThreadPool, QTimer, pyqtSignal
+from PyQt6.QtGui import QCloseEvent, QImage, QKeyEvent, QPainter, QPaintEvent
+from PyQt6.QtWidgets import (
+    QCheckBox,
+    QDialog,
+    QDialogButtonBox,
+    QDoubleSpinBox,
+    QFormLayout,
+    QWidget
+)
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.search import SearchQuery
+from boardy3.ui.tiled_image import read_fitted
+from boardy3.utils import get_logger
+
+
+logger = get_logger(__name__)
+
+# Seconds each slide is shown
+DEFAULT_INTERVAL = 5.0
+# Slides decoded ahead of the one shown
+DEFAULT_DECODE_AHEAD = 3
+# A slide shown this many seconds after it was due counts as late
+LATE_TOLERANCE = 0.05
+
+
+class SlideshowStats:
+    def __init__(self) -> None:
+        self.shown = 0
+        # Slides shown late because they were not decoded in time or
+        # the event loop was busy
+        self.late = 0
+        self.worst_lateness = 0.0
+        # Slides skipped because they could not be loaded
+        self.dropped = 0
+
+
+    def add_shown(self, lateness: float) -> None:
+        self.shown += 1
+        if lateness > LATE_TOLERANCE:
+            self.late += 1
+            self.worst_lateness = max(self.worst_lateness, lateness)
+
+
+    def __str__(self) -> str:
+        return f"{self.shown} shown, {self.late} late (worst {self.worst_lateness:.2f}s), {self.dropped} dropped"
+
+
+class _SlideSignals(QObject):
+    # The image is null if the slide could not be loaded
+    loaded = pyqtSignal(int, QImage)
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Set from the GUI thread once the slideshow ends
+        self.stopped = False
+
+
+class _SlideDecode(QRunnable):
+    """Load the record of one slide and decode it to fit the screen."""
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            sequence: int,
+            image_id: int,
+            size: QSize,
+            signals: _SlideSignals
+    ) -> None:
+        super().__init__()
+        self.db_manager = db_manager
+        self.sequence = sequence
+        self.image_id = image_id
+        self.size = size
+        # Keeps the signals alive if the queue goes away first
+        self.signals = signals
+
+
+    def run(self) -> None:
+        if self.signals.stopped:
+            return
+
+        image = QImage()
+        record = self.db_manager.get_image_record(self.image_id)
+        if record is not None:
+            if record.is_video:
+                # Videos are shown by their thumbnail
+                image = read_fitted(
+                    self.db_manager.get_cached_path(record.thumbnail_path),
+                    self.size.width(), self.size.height()
+                )
+            else:
+                image = read_fitted(
+                    self.db_manager.get_cached_image_path(record.filename),
+                    self.size.width(), self.size.height(),
+                    QSize(record.width, record.height) if record.width and record.height else None
+                )
+
+        self.signals.loaded.emit(self.sequence, image)
+
+
+class SlideshowQueue(QObject):
+    """
+    Slides decoded ahead of a slideshow.
+
+    Database reads and decodes run on a thread pool, at most ahead
+    slides in front of the one shown, so showing a slide only costs
+    painting an image that is already in memory. The ids loop forever,
+    shuffled again on each pass if shuffle is set.
+    """
+    # Threads decoding for all slideshows
+    DECODE_THREADS = 2
+    _decode_pool: QThreadPool | None = None
+
+    # Emitted when the next slide finished loading
+    ready = pyqtSignal()
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            result_ids: Sequence[int],
+            size: QSize,
+            ahead: int = DEFAULT_DECODE_AHEAD,
+            shuffle: bool = False,
+            rng: random.Random | None = None,
+            parent: QObject | None = None
+    ) -> None:
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.size = size
+        self.ahead = max(ahead, 1)
+        self.shuffle = shuffle
+        self.rng = rng or random.Random()
+
+        self.order = list(result_ids)
+        if self.shuffle:
+            self.rng.shuffle(self.order)
+
+        # Slides are numbered in the order they are shown
+        self.slides: dict[int, QImage] = {}
+        self.next_sequence = 0      # Next slide to take
+        self.requested = 0          # Next slide to decode
+        self.dropped = 0
+
+        self.signals = _SlideSignals()
+        self.signals.loaded.connect(self._on_loaded)
+
+        self._fill()
+
+
+    @classmethod
+    def decode_pool(cls) -> QThreadPool:
+        # Kept for the life of the app, like the other decode pools
+        if cls._decode_pool is None:
+            cls._decode_pool = QThreadPool()
+            cls._decode_pool.setMaxThreadCount(cls.DECODE_THREADS)
+        return cls._decode_pool
+
+
+    def take(self) -> QImage | None:
+        """Return the next slide, or None if it is not decoded yet."""
+        while self.next_sequence in self.slides:
+            image = self.slides.pop(self.next_sequence)
+            self.next_sequence += 1
+            self._fill()
+
+            if image.isNull():
+                self.dropped += 1
+                continue
+            return image
+
+        return None
+
+
+    def in_flight(self) -> int:
+        """Return the number of slides decoded or decoding ahead."""
+        return self.requested - self.next_sequence
+
+
+    def stop(self) -> None:
+        """Skip every queued decode."""
+        self.order = []
+        self.slides.clear()
+        self.signals.stopped = True
+
+
+    def _fill(self) -> None:
+        while self.order and self.in_flight() < self.ahead:
+            index = self.requested % len(self.order)
+            if index == 0 and self.requested > 0 and self.shuffle:
+                self.rng.shuffle(self.order)
+
+            self.decode_pool().start(_SlideDecode(
+                self.db_manager, self.requested, self.order[index], self.size, self.signals
+            ))
+            self.requested += 1
+
+
+    def _on_loaded(self, sequence: int, image: QImage) -> None:
+        if self.signals.stopped:
+            return
+
+        self.slides[sequence] = image
+        if sequence == self.next_sequence:
+            self.ready.emit()
+
+
+class SlideshowWindow(QWidget):
+    """
+    Show the results of a search one after another, full screen.
+
+    The next slide is decoded in the background while the current one
+    is shown. If it is still not ready when it is due, the current slide
+    stays up and the late slide is shown as soon as it arrives. Late and
+    dropped slides are logged when the slideshow ends.
+
+    Space pauses, the right arrow skips ahead, I shows the statistics
+    and Escape ends the slideshow.
+    """
+
+    def __init__(
+            self,
+            db_manager: DatabaseManager,
+            query: SearchQuery,
+            interval: float = DEFAULT_INTERVAL,
+            shuffle: bool = False,
+            ahead: int = DEFAULT_DECODE_AHEAD,
+            parent: QWidget | None = None
+    ) -> None:
+        super().__init__(parent)
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.setWindowTitle("Slideshow")
+
+        self.interval = interval
+        self.stats = SlideshowStats()
+        self.show_stats = False
+        self.paused = False
+
+        self.current = QImage()
+        # When the next slide is due, by time.monotonic()
+        self.due: float | None = None
+        self.waiting = True
+
+        # Decode at the screen's physical resolution
+        screen = self.screen()
+        size = screen.size() * screen.devicePixelRatio()
+
+        self.queue = SlideshowQueue(
+            db_manager, db_manager.get_result_ids(query), size,
+            ahead=ahead, shuffle=shuffle, parent=self
+        )
+        self.queue.ready.connect(self._on_ready)
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._advance)
+
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.fillRect(self.rect(), Qt.GlobalColor.black)
+
+        if not self.current.isNull():
+            target = QRect()
+            target.setSize(self.current.size().scaled(self.size(), Qt.AspectRatioMode.KeepAspectRatio))
+            target.moveCenter(self.rect().center())
+            painter.drawImage(target, self.current)
+
+        if self.show_stats:
+            painter.setPen(Qt.GlobalColor.white)
+            painter.drawText(self.rect().adjusted(10, 10, -10, -10), Qt.AlignmentFlag.AlignTop, str(self.stats))
+
+        painter.end()
+
+
+    def keyPressEvent(self, event: QKeyEvent) -> None:
+        match event.key():
+            case Qt.Key.Key_Escape:
+                self.close()
+            case Qt.Key.Key_Space:
+                self.set_paused(not self.paused)
+            case Qt.Key.Key_Right:
+                # Skipping is not late
+                self.due = None
+                self._advance()
+            case Qt.Key.Key_I:
+                self.show_stats = not self.show_stats
+                self.update()
+            case _:
+                super().keyPressEvent(event)
+
+
+    def set_paused(self, paused: bool) -> None:
+        self.paused = paused
+        if paused:
+            self.timer.stop()
+            self.due = None
+        elif not self.waiting:
+            self._schedule(time.monotonic())
+
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.timer.stop()
+        self.queue.stop()
+        self.stats.dropped = self.queue.dropped
+        logger.info(f"Slideshow ended: {self.stats}.")
+        super().closeEvent(event)
+
+
+    def _advance(self) -> None:
+        image = self.queue.take()
+        if image is None:
+            # Shown from _on_ready() once decoded
+            self.waiting = True
+            return
+        self._show(image)
+
+
+    def _on_ready(self) -> None:
+        if self.waiting:
+            self._advance()
+
+
+    def _show(self, image: QImage) -> None:
+        now = time.monotonic()
+        self.stats.add_shown(now - self.due if self.due is not None else 0.0)
+        self.stats.dropped = self.queue.dropped
+
+        self.current = image
+        self.waiting = False
+        self.update()
+
+        if not self.paused:
+            self._schedule(now)
+
+
+    def _schedule(self, now: float) -> None:
+        self.due = now + self.interval
+        self.timer.start(int(self.interval * 1000))
+
+
+class SlideshowDialog(QDialog):
+    """Ask for the slideshow settings."""
+
+    def __init__(self, parent: QWidget | None = None) -> None:
+        super().__init__(parent)
+
+        self.setWindowTitle("Slideshow")
+
+        self.interval_spin_box = QDoubleSpinBox()
+        self.interval_spin_box.setRange(0.5, 3600)
+        self.interval_spin_box.setSuffix(" s")
+        self.interval_spin_box.setValue(DEFAULT_INTERVAL)
+
+        self.shuffle_checkbox = QCheckBox()
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        layout = QFormLayout()
+        layout.addRow("Interval", self.interval_spin_box)
+        layout.addRow("Shuffle", self.shuffle_checkbox)
+        layout.addRow(buttons)
+
+        self.setLayout(layout)
+
+
+    def interval(self) -> float:
+        return self.interval_spin_box.value()
+
+
+    def shuffle(self) -> bool:
+        return self.shuffle_checkbox.isChecked()
@@ -1,3 +1,4 @@
+from collections.abc import Sequence
 import re
 from PyQt6.QtCore import pyqtSignal, pyqtSlot, Qt, QStringListModel
 from PyQt6.QtWidgets import (
@@ -17,7 +18,7 @@ from PyQt6.QtWidgets import (
 
 from boardy3.database import column_to_int
 from boardy3.database.database_manager import DatabaseItemDoesNotExist, DatabaseItemExists, DatabaseManager
-from boardy3.database.models import Tag
+from boardy3.database.models import Tag, TagRecord
 from boardy3.ui.layout import FlowLayout, clear_layout, iterate_layout
 from boardy3.utils import get_logger
 
@@ -26,13 +27,13 @@ logger = get_logger(__name__)
 
 
 class TagWidget(QWidget):
-    def __init__(self, tag: Tag):
+    def __init__(self, tag: Tag | TagRecord, image_count: int):
         super().__init__()
 
         self.tag_id = str(tag.id)
         self.tag_name = str(tag.name)
         # The number of images that contain the tag
-        self.image_count = len(tag.images)
+        self.image_count = image_count
 
         self.checkbox = QCheckBox()
         self.tag_description = QLabel(f"{self.tag_name} ({self.image_count})")
@@ -51,7 +52,8 @@ class TagsWindow(QWidget):
             self,
             image_id: int,
             db_manager: DatabaseManager | None = None,
-            portrait: bool = False
+            portrait: bool = False,
+            tags: Sequence[TagRecord] | None = None
     ):
         super().__init__()
 
@@ -70,8 +72,8 @@ class TagsWindow(QWidget):
         # and deleting tags.
         self.delete_tag_checkbox = QCheckBox("Delete")
         
-        # Display image tags
-        self.refresh_tags_list()
+        # Display image tags, skipping the query if they were preloaded
+        self.refresh_tags_list(tags)
 
         # Set scroll area properties
         self.tags_scroll_area.setWidgetResizable(True)
@@ -96,14 +98,19 @@ class TagsWindow(QWidget):
         self.setLayout(layout)
 
 
-    def refresh_tags_list(self):
+    def refresh_tags_list(self, tags: Sequence[TagRecord] | None = None):
         if self.tags_list_layout.count() > 0:
             clear_layout(self.tags_list_layout)
 
-        tags = self.db_manager.get_tags_by_image_id(self.image_id)
-        tags.sort(key=lambda x: str(x.name))    # First sort tags alphabetically
+        if tags is None:
+            # Already sorted alphabetically
+            tags = self.db_manager.get_tag_records(self.image_id)
+        # Use the cached counts instead of loading every image of each tag
+        tag_counts = self.db_manager.get_tag_counts()
         for tag in tags:
-            self.tags_list_layout.addWidget(TagWidget(tag))
+            self.tags_list_layout.addWidget(
+                TagWidget(tag, tag_counts.get(str(tag.name), 0))
+            )
 
         
     @pyqtSlot()
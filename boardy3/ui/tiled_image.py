@@ -0,0 +1,370 @@
+from collections import OrderedDict
+import math
+
+from PyQt6.QtCore import QObject, QPointF, QRect, QRectF, QRunnable, QSize, Qt, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage, QImageReader, QMouseEvent, QPainter, QPaintEvent, QWheelEvent
+from PyQt6.QtWidgets import QWidget
+
+
+# Side in pixels of a decoded tile
+TILE_SIZE = 512
+# Memory kept for decoded tiles
+TILE_CACHE_BYTES = 96 * 1024 * 1024
+# Zoom in steps per wheel notch, up to this many screen pixels per
+# image pixel
+ZOOM_STEP = 1.25
+MAX_ZOOM = 4.0
+
+TileKey = tuple[int, int, int]  # Downscale level, column, row
+
+
+class TileCache:
+    """Least recently used tiles, limited by the memory they take."""
+
+    def __init__(self, max_bytes: int = TILE_CACHE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._tiles: OrderedDict[TileKey, QImage] = OrderedDict()
+        self._bytes = 0
+
+
+    def get(self, key: TileKey) -> QImage | None:
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+        return tile
+
+
+    def put(self, key: TileKey, tile: QImage) -> None:
+        if key in self._tiles:
+            self._bytes -= self._tiles.pop(key).sizeInBytes()
+
+        self._tiles[key] = tile
+        self._bytes += tile.sizeInBytes()
+
+        while self._bytes > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self._bytes -= evicted.sizeInBytes()
+
+
+    def __contains__(self, key: TileKey) -> bool:
+        return key in self._tiles
+
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+
+def tile_level(scale: float) -> int:
+    """
+    Return the downscale factor, a power of two, at which tiles are
+    decoded for a zoom scale. Tiles keep at least screen resolution.
+    """
+    if scale >= 1:
+        return 1
+    return 2 ** int(math.floor(math.log2(1 / scale)))
+
+
+def fit_size(image_size: QSize, width: int, height: int) -> QSize:
+    """Return the size an image is shown at to fit in width x height."""
+    if image_size.isEmpty():
+        return QSize(width, height)
+    return QSize(image_size).scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio)
+
+
+def read_fitted(image_path: str, width: int, height: int, image_size: QSize | None = None) -> QImage:
+    """Decode an image scaled down to fit in width x height."""
+    reader = QImageReader(image_path)
+    if image_size is None or image_size.isEmpty():
+        image_size = reader.size()
+    reader.setScaledSize(fit_size(image_size, width, height))
+    return reader.read()
+
+
+def tiles_for_rect(rect: QRectF, image_size: QSize, level: int) -> list[TileKey]:
+    """Return the tiles covering a rectangle in image coordinates."""
+    span = TILE_SIZE * level
+    columns = math.ceil(image_size.width() / span)
+    rows = math.ceil(image_size.height() / span)
+
+    first_column = max(int(rect.left() // span), 0)
+    last_column = min(int(math.ceil(rect.right() / span)), columns)
+    first_row = max(int(rect.top() // span), 0)
+    last_row = min(int(math.ceil(rect.bottom() / span)), rows)
+
+    return [
+        (level, column, row)
+        for row in range(first_row, last_row)
+        for column in range(first_column, last_column)
+    ]
+
+
+def tile_rect(key: TileKey, image_size: QSize) -> QRect:
+    """Return the area of the image a tile covers."""
+    level, column, row = key
+    span = TILE_SIZE * level
+    return QRect(column * span, row * span, span, span)\
+        .intersected(QRect(0, 0, image_size.width(), image_size.height()))
+
+
+class _DecodeSignals(QObject):
+    # Key is None for the whole image, followed by the generation the
+    # decode was requested in
+    decoded = pyqtSignal(object, int, QImage)
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Raised when a view cancels its pending tiles
+        self.generation = 0
+
+
+class _RegionDecode(QRunnable):
+    """Decode part of an image, scaled down, on a worker thread."""
+
+    def __init__(
+            self,
+            image_path: str,
+            key: TileKey | None,
+            clip_rect: QRect | None,
+            scaled_size: QSize,
+            signals: _DecodeSignals
+    ) -> None:
+        super().__init__()
+        self.image_path = image_path
+        self.key = key
+        self.clip_rect = clip_rect
+        self.scaled_size = scaled_size
+        # Keeps the signals alive if the view goes away first
+        self.signals = signals
+        self.generation = signals.generation
+
+
+    def run(self) -> None:
+        # Tiles cancelled while queued are skipped. The whole image is
+        # always decoded since nothing requests it again.
+        if self.key is not None and self.generation != self.signals.generation:
+            return
+
+        reader = QImageReader(self.image_path)
+        # Tile coordinates are in the stored orientation
+        reader.setAutoTransform(False)
+        if self.clip_rect is not None:
+            reader.setClipRect(self.clip_rect)
+        reader.setScaledSize(self.scaled_size)
+
+        self.signals.decoded.emit(self.key, self.generation, reader.read())
+
+
+class TiledImageView(QWidget):
+    """
+    Zoomable view of an image that never decodes it at full size at once.
+
+    A small preview is shown immediately and replaced by a decode scaled
+    to fit the view once it finishes in the background, unless that
+    decode is passed in as base_image. Zooming in
+    decodes only the visible tiles, at just enough resolution for the
+    zoom level, through QImageReader's clip rect and scaled size. JPEG
+    decodes the requested region directly. Other formats decode the whole
+    image for every tile before cropping it, which is slower and briefly
+    takes the memory of the full image on a decode thread.
+
+    Scroll to zoom, drag to pan and double click to fit the image again.
+    """
+    # Threads decoding for all views
+    DECODE_THREADS = 2
+    _decode_pool: QThreadPool | None = None
+
+    def __init__(
+            self,
+            image_path: str,
+            preview_path: str | None,
+            width: int,
+            height: int,
+            image_size: QSize | None = None,
+            base_image: QImage | None = None,
+            parent: QWidget | None = None
+    ) -> None:
+        super().__init__(parent)
+        self.image_path = image_path
+
+        if image_size is None or image_size.isEmpty():
+            image_size = QImageReader(image_path).size()
+        self.image_size = image_size
+
+        # Fit the image in width x height, like the scaled pixmaps this
+        # view replaces
+        view_size = fit_size(image_size, width, height)
+        self.setFixedSize(view_size)
+
+        self.fit_scale = view_size.width() / image_size.width() if image_size.width() else 1.0
+        self.scale = self.fit_scale
+        self.offset = QPointF(0, 0)     # Image point at the top left corner
+
+        # An image already decoded to fit the view, e.g. by a preloader,
+        # needs no refining
+        refine = base_image is None or base_image.isNull()
+        self.base_image = QImage() if refine else base_image
+        if refine and preview_path and preview_path != image_path:
+            self.base_image = QImage(preview_path)
+
+        self.tiles = TileCache()
+        self.pending: set[TileKey] = set()
+
+        self.signals = _DecodeSignals()
+        self.signals.decoded.connect(self._on_decoded)
+
+        self._drag_start: QPointF | None = None
+
+        # Refine the preview
+        if refine:
+            self.decode_pool().start(_RegionDecode(image_path, None, None, view_size, self.signals))
+
+
+    @classmethod
+    def decode_pool(cls) -> QThreadPool:
+        if cls._decode_pool is None:
+            cls._decode_pool = QThreadPool()
+            cls._decode_pool.setMaxThreadCount(cls.DECODE_THREADS)
+        return cls._decode_pool
+
+
+    def get_width(self) -> int:
+        return self.width()
+
+
+    def get_height(self) -> int:
+        return self.height()
+
+
+    def reset_zoom(self) -> None:
+        self.scale = self.fit_scale
+        self.offset = QPointF(0, 0)
+        self._cancel_pending()
+        self.update()
+
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.fillRect(self.rect(), Qt.GlobalColor.black)
+
+        if not self.base_image.isNull():
+            painter.drawImage(self._to_view(QRectF(0, 0, self.image_size.width(), self.image_size.height())), self.base_image)
+
+        if self.scale > self.fit_scale:
+            level = tile_level(self.scale)
+            for key in tiles_for_rect(self._visible_rect(), self.image_size, level):
+                tile = self.tiles.get(key)
+                if tile is not None:
+                    painter.drawImage(self._to_view(QRectF(tile_rect(key, self.image_size))), tile)
+                elif key not in self.pending:
+                    self._request_tile(key)
+
+        painter.end()
+
+
+    def wheelEvent(self, event: QWheelEvent) -> None:
+        steps = event.angleDelta().y() / 120
+        if steps == 0:
+            return
+
+        new_scale = self.scale * ZOOM_STEP ** steps
+        new_scale = min(max(new_scale, self.fit_scale), MAX_ZOOM)
+
+        # Keep the point under the cursor in place
+        cursor = event.position()
+        anchor = self.offset + cursor / self.scale
+        self.scale = new_scale
+        self._set_offset(anchor - cursor / self.scale)
+
+        # Tiles for the previous zoom level are no longer needed first
+        self._cancel_pending()
+        self.update()
+
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._drag_start = event.position()
+        super().mousePressEvent(event)
+
+
+    def mouseMoveEvent(self, event: QMouseEvent) -> None:
+        if self._drag_start is not None:
+            delta = event.position() - self._drag_start
+            self._drag_start = event.position()
+            self._set_offset(self.offset - delta / self.scale)
+            self.update()
+        super().mouseMoveEvent(event)
+
+
+    def mouseReleaseEvent(self, event: QMouseEvent) -> None:
+        self._drag_start = None
+        super().mouseReleaseEvent(event)
+
+
+    def mouseDoubleClickEvent(self, event: QMouseEvent) -> None:
+        self.reset_zoom()
+
+
+    def _request_tile(self, key: TileKey) -> None:
+        level = key[0]
+        clip_rect = tile_rect(key, self.image_size)
+        scaled_size = QSize(
+            max(math.ceil(clip_rect.width() / level), 1),
+            max(math.ceil(clip_rect.height() / level), 1)
+        )
+
+        self.pending.add(key)
+        self.decode_pool().start(
+            _RegionDecode(self.image_path, key, clip_rect, scaled_size, self.signals)
+        )
+
+
+    def _cancel_pending(self) -> None:
+        # Only this view's tiles are skipped, since the pool is shared.
+        # Decodes already running still finish and are cached.
+        self.signals.generation += 1
+        self.pending.clear()
+
+
+    def _on_decoded(self, key: TileKey | None, generation: int, image: QImage) -> None:
+        if key is None:
+            if not image.isNull():
+                self.base_image = image
+        else:
+            # A cancelled tile may have been requested again since
+            if generation == self.signals.generation:
+                self.pending.discard(key)
+            if not image.isNull():
+                self.tiles.put(key, image)
+        self.update()
+
+
+    def _visible_rect(self) -> QRectF:
+        return QRectF(
+            self.offset.x(), self.offset.y(),
+            self.width() / self.scale, self.height() / self.scale
+        )
+
+
+    def _to_view(self, rect: QRectF) -> QRectF:
+        return QRectF(
+            (rect.x() - self.offset.x()) * self.scale,
+            (rect.y() - self.offset.y()) * self.scale,
+            rect.width() * self.scale,
+            rect.height() * self.scale
+        )
+
+
+    def _set_offset(self, offset: QPointF) -> None:
+        # Keep the image covering the view
+        max_x = max(self.image_size.width() - self.width() / self.scale, 0)
+        max_y = max(self.image_size.height() - self.height() / self.scale, 0)
+        self.offset = QPointF(
+            min(max(offset.x(), 0), max_x),
+            min(max(offset.y(), 0), max_y)
+        )
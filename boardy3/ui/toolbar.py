@@ -1,6 +1,6 @@
 import math
 
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtCore import QTimer, pyqtSignal
 from PyQt6.QtGui import QAction
 from PyQt6.QtWidgets import (
     QComboBox,
@@ -11,11 +11,16 @@ from PyQt6.QtWidgets import (
 )
 
 from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.search import SearchQuery
 
 
 class ToolBar(QWidget):
     page_updated = pyqtSignal()
 
+    # Stop counting search results after this many matches and show
+    # the page count as a lower bound instead.
+    MAX_EXACT_COUNT = 10_000
+
     def __init__(self, db_manager: DatabaseManager) -> None:
         super().__init__()
 
@@ -25,6 +30,9 @@ class ToolBar(QWidget):
 
         self.current_page = 1
 
+        # The search that is currently being paged through
+        self.search_query = SearchQuery()
+
         # Previous Page Action
         prev_page_action = QAction("<", self)
         prev_page_action.triggered.connect(self.load_previous_page)
@@ -47,9 +55,9 @@ class ToolBar(QWidget):
         self.page_size_combo_box.currentTextChanged.connect(self.reset_page)
 
         # Update the page label after all components are created.
-        # Doesn't matter (I think) if placed before or after
-        # adding to layout.
-        self.update_page_label()
+        # Counting waits until the window has painted.
+        self.page_label.setText(f"Page {self.current_page}")
+        QTimer.singleShot(0, self.update_page_label)
 
         layout = QHBoxLayout()
         layout.addWidget(self.toolbar)
@@ -61,6 +69,13 @@ class ToolBar(QWidget):
     def update_page_label(self) -> None:
         self.page_label.setText(f"Page {self.current_page} of {self._get_max_page_count()}")
 
+
+    def set_search_query(self, search_query: SearchQuery) -> None:
+        """Page through a new search, starting from the first page."""
+        self.search_query = search_query
+
+        self.reset_page()
+
     
     def load_previous_page(self) -> None:
         if self.current_page > 1:
@@ -73,8 +88,8 @@ class ToolBar(QWidget):
 
     def load_next_page(self) -> None:
         # Check if there are more pages
-        more_pages = len(self.db_manager.search_images(
-            list(),
+        more_pages = len(self.db_manager.search_image_ids(
+            self.search_query,
             self.current_page+1,
             int(self.page_size_combo_box.currentText())
         )) > 0
@@ -95,15 +110,21 @@ class ToolBar(QWidget):
         self.update_page_label()
 
     
-    def _get_max_page_count(self) -> int:
+    def _get_max_page_count(self) -> str:
         """
-        Calculate the last page based on the per_page value and round up
-        or set to one if there are no images.
+        Calculate the last page of the current search based on the
+        per_page value and round up or set to one if there are no images.
+        Very large results are shown as a lower bound, e.g. "200+".
         """
-        return max(
-            math.ceil(self.db_manager.get_images_count() / self.get_current_page_size()),
+        image_count = self.db_manager.count_images(
+            self.search_query,
+            at_least=self.MAX_EXACT_COUNT
+        )
+        max_page_count = max(
+            math.ceil(image_count.count / self.get_current_page_size()),
             1
         )
+        return str(max_page_count) if image_count.exact else f"{max_page_count}+"
     
 
     def get_current_page_size(self) -> int:
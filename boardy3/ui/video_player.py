@@ -1,70 +1,114 @@
-import os
-import re
-
-# # Add dll to PATH before running code
-# dll_directory = os.path.abspath("bin")
-# os.environ["PATH"] = dll_directory + os.pathsep + os.environ["PATH"]
-# import mpv
-
-import cv2
-from PyQt6.QtCore import pyqtSignal, Qt, QUrl, QSize
-from PyQt6.QtGui import QMouseEvent, QPixmap
+from PyQt6.QtCore import Qt, QUrl, QSize
+from PyQt6.QtGui import QPixmap, QResizeEvent
 from PyQt6.QtMultimedia import QAudioOutput, QMediaPlayer
 from PyQt6.QtMultimediaWidgets import QVideoWidget
 from PyQt6.QtWidgets import (
-    QDialog,
     QLabel,
     QHBoxLayout,
-    QMainWindow,
-    QMessageBox,
-    QPlainTextEdit,
     QPushButton,
     QVBoxLayout,
     QWidget
 )
 
 from boardy3.database.database_manager import DatabaseManager
-from boardy3.database.models import Tag
+from boardy3.database.models import ImageRecord, Tag
+from boardy3.utils import LazyModule
+
+
+cv2 = LazyModule("cv2")
+
+
+class MediaPlayerPool:
+    """
+    Keeps a few idle QMediaPlayer and QAudioOutput pairs for reuse.
+
+    Setting up a media pipeline is slow, so video windows borrow a
+    player when playback starts and hand it back when they close
+    instead of building their own.
+    """
+
+    def __init__(self, max_idle: int = 2) -> None:
+        self.max_idle = max_idle
+        self._idle: list[QMediaPlayer] = []
+        self.in_use = 0
+
+
+    def acquire(self) -> QMediaPlayer:
+        if self._idle:
+            player = self._idle.pop()
+        else:
+            player = QMediaPlayer()
+            # The audio output is owned by its player
+            player.setAudioOutput(QAudioOutput(player))
+
+        self.in_use += 1
+        return player
+
+
+    def release(self, player: QMediaPlayer) -> None:
+        player.stop()
+        player.setVideoOutput(None)
+        player.setSource(QUrl())
+        self.in_use -= 1
+
+        if len(self._idle) < self.max_idle:
+            self._idle.append(player)
+        else:
+            player.deleteLater()
+
+
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+
+# Players shared by all video windows
+player_pool = MediaPlayerPool()
 
 
 class VideoPlayerWidget(QWidget):
 
     def __init__(
             self,
-            db_id: int=0,
+            video: ImageRecord | int = 0,
             width: int | None = None,
             height: int | None = None,
             db_manager: DatabaseManager | None = None,
-            video_path = ""
+            video_path = "",
+            pool: MediaPlayerPool | None = None
     ):
         super().__init__()
 
-        # Video id from database
-        self.db_id = db_id
-        
         self.db_manager = db_manager or DatabaseManager()
+        self.pool = pool or player_pool
 
         # Grab video from database
-        self.video_ = self.db_manager.get_image(self.db_id)
+        if isinstance(video, ImageRecord):
+            self.video_ = video
+        else:
+            self.video_ = self.db_manager.get_image_record(video)
         if self.video_ is None:
-            raise ValueError(f"Invalid video id: {self.db_id}.")
+            raise ValueError(f"Invalid video id: {video}.")
+
+        # Video id from database
+        self.db_id = self.video_.id
 
-        self.video_path = self.db_manager.get_image_path(self.video_.filename)
+        self.video_path = self.db_manager.get_cached_image_path(self.video_.filename)
+        # Large videos are previewed from a low resolution copy when one
+        # exists. Proxies have no audio.
+        self.proxy_path = self.db_manager.get_proxy_path(self.video_.filename)
 
         self.layout_ = QVBoxLayout()
 
-        # Video container
-        self.video_container = QVideoWidget()
         self.video_width = 0
         self.video_height = 0
 
-        # Audio output
-        self.audio_output = QAudioOutput()
-
-        self.player = QMediaPlayer()
-        self.player.setVideoOutput(self.video_container)
-        self.player.setAudioOutput(self.audio_output)
-        self.player.setSource(QUrl.fromLocalFile(self.video_path))
+        # The thumbnail stands in for the video until it is played. The
+        # player and video output are only set up on the first play.
+        self.player: QMediaPlayer | None = None
+        self.video_container: QVideoWidget | None = None
+        self.preview_label = QLabel()
+        self.preview_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.preview_pixmap = QPixmap(self.db_manager.get_cached_path(self.video_.thumbnail_path))
 
         # Button to play video
         self.play_button = QPushButton("Play")
@@ -79,11 +123,18 @@ class VideoPlayerWidget(QWidget):
         self.media_control_layout = QHBoxLayout()
         self.media_control_layout.addWidget(self.play_button)
         self.media_control_layout.addWidget(self.stop_button)
+
+        # Button to switch between the proxy and the original
+        if self.proxy_path is not None:
+            self.original_button = QPushButton("Original")
+            self.original_button.setCheckable(True)
+            self.original_button.toggled.connect(self.use_original)
+            self.media_control_layout.addWidget(self.original_button)
         self.media_control_widget.setLayout(self.media_control_layout)
 
         self.resize_video_widget()
 
-        self.layout_.addWidget(self.video_container)
+        self.layout_.addWidget(self.preview_label, stretch=1)
         self.layout_.addWidget(self.media_control_widget)
 
         self.setLayout(self.layout_)
@@ -101,11 +152,69 @@ class VideoPlayerWidget(QWidget):
 
 
     def play_video(self):
+        if self.player is None:
+            self._attach_player()
         self.player.play()
     
 
     def stop_video(self):
-        self.player.stop()
+        if self.player is not None:
+            self.player.stop()
+
+
+    def use_original(self, checked: bool) -> None:
+        """Play the original file instead of the proxy, or back."""
+        if self.player is None:
+            # Picked up when playback starts
+            return
+
+        # Continue from the same point in the other file
+        position = self.player.position()
+        was_playing = self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+
+        self.player.setSource(QUrl.fromLocalFile(self._current_source()))
+        self.player.setPosition(position)
+        if was_playing:
+            self.player.play()
+
+
+    def release_player(self) -> None:
+        """Hand the player back to the pool. Safe to call repeatedly."""
+        if self.player is None:
+            return
+
+        self.pool.release(self.player)
+        self.player = None
+
+
+    def _attach_player(self) -> None:
+        if self.video_container is None:
+            self.video_container = QVideoWidget()
+            self.layout_.replaceWidget(self.preview_label, self.video_container)
+            self.preview_label.hide()
+
+        self.player = self.pool.acquire()
+        self.player.setVideoOutput(self.video_container)
+        self.player.setSource(QUrl.fromLocalFile(self._current_source()))
+
+
+    def _current_source(self) -> str:
+        if self.proxy_path is None:
+            return self.video_path
+        if getattr(self, "original_button", None) and self.original_button.isChecked():
+            return self.video_path
+        return self.proxy_path
+
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        # Keep the thumbnail fitted to the space left by the controls
+        if not self.preview_pixmap.isNull():
+            self.preview_label.setPixmap(self.preview_pixmap.scaled(
+                self.preview_label.size(),
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            ))
+        super().resizeEvent(event)
 
     
     # def get_width(self):
@@ -142,6 +251,13 @@ class VideoPlayerWidget(QWidget):
 
     
     def get_video_dimensions(self) -> tuple[int, int]:
+        # Dimensions are stored on import. Only probe the file for
+        # videos imported before they were.
+        if self.video_.width and self.video_.height:
+            self.video_width = int(self.video_.width)
+            self.video_height = int(self.video_.height)
+            return self.video_width, self.video_height
+
         cap = cv2.VideoCapture(self.video_path)
         self.video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         self.video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -1,4 +1,7 @@
+import importlib
 import logging
+from types import ModuleType
+from typing import Any
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -16,4 +19,32 @@ def get_logger(name: str) -> logging.Logger:
 
     logger.addHandler(stream_handler)
 
-    return logger
\ No newline at end of file
+    return logger
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Heavy modules such as cv2 are only needed by a few code paths, so
+    deferring them keeps them out of the start up time. Annotations
+    using a lazy module must be quoted, or they import it when the
+    function is defined.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: ModuleType | None = None
+
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only called for attributes not set in __init__
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
@@ -0,0 +1,170 @@
+"""
+Load test for the library server.
+
+Start a server first, then run this against it:
+
+    python -m boardy3 serve
+    python scripts/load_test.py --connections 32 --duration 20
+
+Every connection is a keep-alive HTTP/1.1 connection on its own thread,
+sending a mix of search, thumbnail, image and tag requests. A share of
+the thumbnail requests revalidates with If-None-Match, as a browser
+with a warm cache would. Only the standard library is used.
+"""
+import argparse
+from collections import Counter, defaultdict
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+# Relative weights of the request kinds
+DEFAULT_MIX = "search=2,thumbnail=10,revalidate=5,image=1,tags=1"
+
+
+class Stats:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.bytes_received = 0
+        self.errors = Counter()
+
+
+    def record(self, kind: str, status: int, latency: float, size: int) -> None:
+        with self.lock:
+            self.latencies[kind].append(latency)
+            self.statuses[kind][status] += 1
+            self.bytes_received += size
+
+
+def percentile(values: list[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def fetch(connection: http.client.HTTPConnection, path: str, headers: dict[str, str] | None = None) -> tuple[int, bytes, dict[str, str]]:
+    connection.request("GET", path, headers=headers or {})
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, body, dict(response.getheaders())
+
+
+def collect_library(host: str, port: int, pages: int, page_size: int) -> tuple[list[str], list[str]]:
+    """Return the filenames and tags the requests are drawn from."""
+    connection = http.client.HTTPConnection(host, port)
+    filenames = []
+    for page in range(1, pages + 1):
+        _, body, _ = fetch(connection, f"/api/search?page={page}&page_size={page_size}")
+        results = json.loads(body)["results"]
+        filenames.extend(result["filename"] for result in results)
+        if len(results) < page_size:
+            break
+
+    _, body, _ = fetch(connection, "/api/tags")
+    tags = [tag["name"] for tag in json.loads(body)["tags"]]
+    connection.close()
+    return filenames, tags
+
+
+def worker(
+        host: str,
+        port: int,
+        deadline: float,
+        mix: list[tuple[str, int]],
+        filenames: list[str],
+        tags: list[str],
+        pages: int,
+        stats: Stats
+) -> None:
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    etags: dict[str, str] = {}
+    kinds = [kind for kind, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    while time.perf_counter() < deadline:
+        kind = random.choices(kinds, weights)[0]
+        headers = {}
+        if kind == "search":
+            path = f"/api/search?page={random.randint(1, pages)}"
+            if tags and random.random() < 0.5:
+                path += f"&tag={random.choice(tags)}"
+        elif kind == "tags":
+            path = "/api/tags"
+        elif kind == "image":
+            path = f"/images/{random.choice(filenames)}"
+        else:
+            path = f"/thumbnails/{random.choice(filenames)}"
+            if kind == "revalidate" and path in etags:
+                headers["If-None-Match"] = etags[path]
+
+        started = time.perf_counter()
+        try:
+            status, body, response_headers = fetch(connection, path, headers)
+        except (OSError, http.client.HTTPException) as e:
+            with stats.lock:
+                stats.errors[type(e).__name__] += 1
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        stats.record(kind, status, time.perf_counter() - started, len(body))
+
+        if "ETag" in response_headers:
+            etags[path] = response_headers["ETag"]
+
+    connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test a running library server.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="server url (default: http://127.0.0.1:8765)")
+    parser.add_argument("-c", "--connections", type=int, default=16)
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--pages", type=int, default=10, help="search pages requests are spread over")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"request weights (default: {DEFAULT_MIX})")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname or "127.0.0.1", url.port or 80
+    mix = [(kind, int(weight)) for kind, weight in (item.split("=") for item in args.mix.split(","))]
+
+    filenames, tags = collect_library(host, port, args.pages, 20)
+    if not filenames:
+        parser.error("the library is empty, import something first")
+
+    stats = Stats()
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(host, port, started + args.duration, mix, filenames, tags, args.pages, stats)
+        )
+        for _ in range(args.connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+    print(f"{total} requests in {elapsed:.1f}s over {args.connections} connections: "
+          f"{total / elapsed:.0f} req/s, {stats.bytes_received / elapsed / 1024 / 1024:.1f} MiB/s")
+    print(f"{'kind':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  statuses")
+    for kind, latencies in sorted(stats.latencies.items()):
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(stats.statuses[kind].items()))
+        print(
+            f"{kind:<12}{len(latencies):>8}"
+            f"{percentile(latencies, 0.50) * 1000:>10.1f}"
+            f"{percentile(latencies, 0.95) * 1000:>10.1f}"
+            f"{percentile(latencies, 0.99) * 1000:>10.1f}  {statuses}"
+        )
+    if stats.errors:
+        print(f"errors: {dict(stats.errors)}")
+
+
+if __name__ == "__main__":
+    main()
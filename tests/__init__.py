@@ -0,0 +1,19 @@
+import os
+import shutil
+
+from boardy3.database.database_manager import DatabaseManager
+
+
+def remove_test_library(db_manager: DatabaseManager) -> None:
+    """
+    Close a test database and delete it along with every store under
+    tests/db. Mipmaps and packs are keyed by row ids and filenames that
+    the next test reuses, so nothing may carry over.
+    """
+    assert db_manager.is_test
+    db_manager.close()
+
+    shutil.rmtree(os.path.dirname(db_manager.image_dir_path), ignore_errors=True)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_manager.db_filepath + suffix):
+            os.remove(db_manager.db_filepath + suffix)
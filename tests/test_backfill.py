@@ -0,0 +1,195 @@
+import logging
+import os
+import shutil
+import unittest
+
+from sqlalchemy import update
+
+from boardy3.database.backfill import BackfillRunner, MediaMetadataBackfill, MipmapBackfill, ProxyBackfill, StoryboardBackfill, ThumbnailBackfill, ThumbnailPackBackfill
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.models import Image
+from boardy3.database.packstore import pack_key
+from tests import remove_test_library
+
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+
+        self.test_images = [
+            os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg"),
+            os.path.join(os.getcwd(), "tests/static/images", "test_image2.jpg")
+        ]
+        self.test_video = os.path.join(os.getcwd(), "tests/static/videos", "stock_video1.mp4")
+
+        for test_image in self.test_images:
+            self.db_manager.add_image(test_image)
+        self.db_manager.add_image(self.test_video, is_video=True)
+
+        # Make the images look like they were imported by an older version
+        self.db_manager.submit_write(
+            lambda session: session.execute(update(Image).values(
+                width=None, height=None, file_size=None, mime_type=None,
+                frame_count=None, duration=None
+            ))
+        ).result()
+        shutil.rmtree(self.db_manager.thumbnail_dir_path)
+        for image_ in self.db_manager.get_all_images():
+            self.db_manager.thumbnail_pack.delete(pack_key(image_.filename))
+            self.db_manager.mipmap_store.remove(image_.id)
+
+        self._create_runner().reset()
+
+        return super().setUp()
+
+
+    def test_backfill_metadata_and_thumbnails(self):
+        self._create_runner().run()
+
+        images = self.db_manager.get_all_images()
+        self.assertEqual(len(images), 3)
+        for image_ in images:
+            self.assertIsNotNone(image_.width)
+            self.assertIsNotNone(image_.file_size)
+            self.assertTrue(os.path.exists(self.db_manager.get_thumbnail_path(image_.filename)))
+
+        # Thumbnails are packed, and the pack was compacted after the
+        # entries deleted in setUp
+        packed = self.db_manager.get_packed_thumbnails([image_.filename for image_ in images])
+        self.assertEqual(len(packed), 3)
+        for image_ in images:
+            with open(self.db_manager.get_thumbnail_path(image_.filename), "rb") as infile:
+                self.assertEqual(bytes(packed[image_.filename]), infile.read())
+        del packed
+        self.assertEqual(self.db_manager.thumbnail_pack.dead_bytes(), 0)
+
+        # Every image has an overview tile
+        _, present = self.db_manager.mipmap_store.get_many([image_.id for image_ in images])
+        self.assertTrue(present.all())
+
+        video = next(image_ for image_ in images if image_.is_video)
+        self.assertEqual(video.frame_count, 944)
+
+        # Only videos get storyboards
+        for image_ in images:
+            self.assertEqual(
+                all(os.path.exists(p) for p in self.db_manager.get_storyboard_paths(image_.filename)),
+                bool(image_.is_video)
+            )
+
+        # Deleting a video removes its storyboard
+        self.db_manager.delete_image(video.id)
+        self.assertFalse(any(
+            os.path.exists(p) for p in self.db_manager.get_storyboard_paths(video.filename)
+        ))
+
+
+    def test_backfill_proxies(self):
+        video = next(image_ for image_ in self.db_manager.get_all_images() if image_.is_video)
+        runner = BackfillRunner(self.db_manager, [ProxyBackfill(self.db_manager)], idle_delay=0)
+
+        # Disabled without a budget
+        runner.run()
+        self.assertIsNone(self.db_manager.get_proxy_path(video.filename))
+
+        self.db_manager.proxy_store.max_bytes = 100 * 1024 * 1024
+        runner = BackfillRunner(self.db_manager, [ProxyBackfill(self.db_manager)], idle_delay=0)
+        runner.reset()
+        runner.run()
+        proxy_path = self.db_manager.get_proxy_path(video.filename)
+        self.assertTrue(os.path.exists(proxy_path))
+
+        self.db_manager.delete_image(video.id)
+        self.assertFalse(os.path.exists(proxy_path))
+
+
+    def test_backfill_proxies_within_budget(self):
+        video = next(image_ for image_ in self.db_manager.get_all_images() if image_.is_video)
+
+        # Too small for any proxy, so none is kept and none evicted
+        self.db_manager.proxy_store.max_bytes = 1
+        runner = BackfillRunner(self.db_manager, [ProxyBackfill(self.db_manager)], idle_delay=0)
+        runner.run()
+        self.assertIsNone(self.db_manager.get_proxy_path(video.filename))
+        self.assertEqual(self.db_manager.proxy_store.usage(), 0)
+
+        # The batch it stopped in is gone over again once there is room
+        self.db_manager.proxy_store.max_bytes = 100 * 1024 * 1024
+        BackfillRunner(self.db_manager, [ProxyBackfill(self.db_manager)], idle_delay=0).run()
+        self.assertIsNotNone(self.db_manager.get_proxy_path(video.filename))
+
+
+    def test_backfill_resumes_from_checkpoint(self):
+        first_id = self.db_manager.get_all_images()[0].id
+
+        # Stop after the first batch
+        runner = self._create_runner(batch_size=1)
+        runner._throttle = lambda *args, **kwargs: runner._stop_event.set()
+        runner.run()
+        self.assertIsNotNone(self.db_manager.get_image(first_id).file_size)
+        self.assertEqual(
+            [image_.file_size for image_ in self.db_manager.get_all_images()[1:]],
+            [None, None]
+        )
+
+        runner = self._create_runner()
+        runner.run()
+        self.assertTrue(all(image_.file_size for image_ in self.db_manager.get_all_images()))
+        self.assertEqual(runner.progress(), None)
+
+
+    def test_backfill_progress(self):
+        runner = self._create_runner(batch_size=1)
+        progress = []
+        runner._throttle = lambda *args, **kwargs: progress.append(runner.progress())
+        runner.run()
+
+        metadata_progress = [p for p in progress if p.job == MediaMetadataBackfill.name]
+        self.assertEqual([p.processed for p in metadata_progress], [1, 2, 3])
+        self.assertTrue(all(p.total == 3 for p in metadata_progress))
+        self.assertIsNotNone(metadata_progress[0].eta)
+        self.assertTrue(metadata_progress[-1].done)
+
+
+    def test_backfill_waits_for_idle(self):
+        runner = self._create_runner(idle_delay=60)
+        runner.notify_activity()
+        runner.start()
+        runner.stop()
+
+        self.assertTrue(all(image_.file_size is None for image_ in self.db_manager.get_all_images()))
+
+
+    def _create_runner(self, **kwargs) -> BackfillRunner:
+        kwargs.setdefault("idle_delay", 0)
+        return BackfillRunner(
+            self.db_manager,
+            [
+                MediaMetadataBackfill(self.db_manager),
+                ThumbnailBackfill(self.db_manager),
+                ThumbnailPackBackfill(self.db_manager),
+                MipmapBackfill(self.db_manager),
+                StoryboardBackfill(self.db_manager)
+            ],
+            **kwargs
+        )
+
+
+    def tearDown(self) -> None:
+        self._create_runner().reset()
+        BackfillRunner(self.db_manager, [ProxyBackfill(self.db_manager)]).reset()
+
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,126 @@
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from boardy3.cli import EXIT_OK, EXIT_PROBLEMS, main
+from boardy3.database.database_manager import DatabaseManager
+from tests import remove_test_library
+
+
+class TestCli(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        self.images_dir = os.path.join(os.getcwd(), "tests/static/images")
+        self.test_video = os.path.join(os.getcwd(), "tests/static/videos", "stock_video1.mp4")
+
+        return super().setUp()
+
+
+    def test_import(self):
+        exit_code, events = self._run("--json", "import", self.images_dir, self.test_video, "-t", "nightly", "-j", "2")
+
+        self.assertEqual(exit_code, EXIT_OK)
+        self.assertEqual(events[-1]["event"], "summary")
+        self.assertEqual(events[-1]["counts"], {"added": 5})
+        self.assertEqual(self.db_manager.get_images_count(), 5)
+
+        # Importing again finds everything in place
+        exit_code, events = self._run("--json", "import", self.images_dir, "--no-videos")
+        self.assertEqual(events[-1]["counts"], {"exists": 4})
+
+        exit_code, events = self._run("--json", "import", os.path.join(self.tmp_dir.name, "missing.jpg"))
+        self.assertEqual(exit_code, EXIT_PROBLEMS)
+        self.assertEqual(events[0]["status"], "failed")
+
+
+    def test_search_and_tag(self):
+        self._run("import", self.images_dir, self.test_video)
+
+        exit_code, records = self._run("--json", "search", "--type", "videos")
+        self.assertEqual(exit_code, EXIT_OK)
+        self.assertEqual(len(records), 1)
+        self.assertTrue(records[0]["is_video"])
+        video_id = records[0]["id"]
+
+        self._run("tag", str(video_id), "--add", "clip", "stock")
+        self.assertEqual([r["id"] for r in self._run("--json", "search", "clip")[1]], [video_id])
+
+        exit_code, events = self._run("--json", "tag", str(video_id), "12345", "--remove", "clip")
+        self.assertEqual(exit_code, EXIT_PROBLEMS)
+        self.assertEqual([event["status"] for event in events[:-1]], ["tagged", "failed"])
+        self.assertEqual(
+            [tag.name for tag in self.db_manager.get_tag_records(video_id)],
+            ["stock"]
+        )
+
+
+    def test_export_and_verify(self):
+        self._run("import", self.images_dir)
+        destination = os.path.join(self.tmp_dir.name, "export")
+
+        exit_code, events = self._run("--json", "export", destination, "--limit", "2")
+        self.assertEqual(exit_code, EXIT_OK)
+        self.assertEqual(events[-1]["counts"], {"exported": 2})
+        self.assertEqual(len(os.listdir(destination)), 2)
+
+        exit_code, events = self._run("--json", "verify", "--hash")
+        self.assertEqual(exit_code, EXIT_OK)
+        self.assertEqual(events[-1]["counts"], {"ok": 4})
+
+        # Change the content of one stored file
+        record = self.db_manager.search_image_records([], 1, 1)[0]
+        shutil.copy2(
+            os.path.join(self.images_dir, "test_image2.jpg"),
+            self.db_manager.get_image_path(record.filename)
+        )
+
+        exit_code, events = self._run("--json", "verify")
+        self.assertEqual(exit_code, EXIT_OK)
+        exit_code, events = self._run("--json", "verify", "--hash")
+        self.assertEqual(exit_code, EXIT_PROBLEMS)
+        self.assertEqual(events[-1]["counts"], {"ok": 3, "corrupt": 1})
+
+
+    def test_no_qt_import(self):
+        code = (
+            "import sys, boardy3.cli, boardy3.database.importer;"
+            "sys.exit(any(name.startswith('PyQt6') for name in sys.modules))"
+        )
+        self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0)
+
+
+    def _run(self, *argv: str) -> tuple[int, list]:
+        """Run the command line and return its exit code and output."""
+        out = io.StringIO()
+        exit_code = main(list(argv), db_manager=self.db_manager, out=out)
+        lines = out.getvalue().splitlines()
+        if "--json" in argv:
+            return exit_code, [json.loads(line) for line in lines]
+        return exit_code, lines
+
+
+    def tearDown(self) -> None:
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+        self.db_manager.delete_all_tags()
+
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -1,11 +1,20 @@
+import gc
 import logging
 import os
 import random
-import shutil
+import sys
+import threading
 import unittest
 
-from boardy3.database.database_manager import DatabaseManager
+import tempfile
+
+from sqlalchemy import create_engine, delete, event, insert, inspect, text
+
+from boardy3.database.database_manager import DatabaseManager, migrate_schema
 import boardy3.database.exceptions as db_exc
+from boardy3.database.models import Image
+from boardy3.database.search import SearchQuery
+from tests import remove_test_library
 
 
 class TestDatabase(unittest.TestCase):
@@ -249,6 +258,45 @@ class TestDatabase(unittest.TestCase):
         )
     
 
+    def test_thumbnail_pack_and_mipmap(self):
+        self.db_manager.add_image(self.test_images[0])
+        db_image = self.db_manager.get_all_images(newest_first=True)[0]
+        filename = str(db_image.filename)
+
+        packed = self.db_manager.get_packed_thumbnails([filename, "missing.jpg"])
+        self.assertEqual(list(packed), [filename])
+        with open(self.db_manager.get_thumbnail_path(filename), "rb") as infile:
+            self.assertEqual(bytes(packed[filename]), infile.read())
+        del packed
+
+        # Imports also get an overview tile
+        self.assertTrue(self.db_manager.mipmap_store.has(db_image.id))
+
+        self.db_manager.delete_image(db_image.id)
+        self.assertEqual(self.db_manager.get_packed_thumbnails([filename]), {})
+        self.assertFalse(self.db_manager.mipmap_store.has(db_image.id))
+
+
+    def test_get_tag_records(self):
+        self.db_manager.add_image(self.test_images[0])
+        db_image = self.db_manager.get_all_images(newest_first=True)[0]
+
+        for tag_name in ("zebra", "apple"):
+            self.db_manager.add_tag_to_image(self.db_manager.add_tag(tag_name), db_image.id)
+        self.db_manager.add_tag("unused")
+
+        # Sorted by name, and readable from another thread
+        records = []
+        thread = threading.Thread(target=lambda: records.extend(self.db_manager.get_tag_records(db_image.id)))
+        thread.start()
+        thread.join()
+        self.assertEqual([record.name for record in records], ["apple", "zebra"])
+        self.assertEqual(
+            {record.id for record in records},
+            {tag.id for tag in self.db_manager.get_tags_by_image_id(db_image.id)}
+        )
+
+
     def test_delete_tag(self):
         tag_ = self.db_manager.add_tag("test_tag")
 
@@ -300,6 +348,322 @@ class TestDatabase(unittest.TestCase):
         self.assertFalse(tag_ in db_image.tags) # type: ignore
     
 
+    def test_search_results_cached(self):
+        for _image in self.test_images:
+            self.db_manager.add_image(_image)
+
+        # Count statements sent to SQLite
+        statements = []
+        for engine in [self.db_manager.engine, self.db_manager.read_engine]:
+            event.listen(
+                engine, "before_cursor_execute",
+                lambda *args: statements.append(args[2])
+            )
+
+        first_ids = self.db_manager.search_image_ids([], page=1, page_size=1)
+        queries_after_first_search = len(statements)
+
+        # Repeat navigation over the same search should not touch SQLite
+        self.db_manager.search_image_ids([], page=2, page_size=1)
+        self.assertEqual(self.db_manager.search_image_ids([], page=1, page_size=1), first_ids)
+        self.assertEqual(len(statements), queries_after_first_search)
+
+        cache_info = self.db_manager.get_result_cache_info()
+        self.assertGreaterEqual(cache_info["hits"], 2)
+        self.assertGreater(cache_info["bytes"], 0)
+
+        # Counting the searched results is a count hit, not an id hit
+        self.assertEqual(self.db_manager.count_images([]).count, len(self.test_images))
+        self.assertEqual(len(statements), queries_after_first_search)
+        count_info = self.db_manager.get_result_cache_info()
+        self.assertEqual(count_info["hits"], cache_info["hits"])
+        self.assertEqual(count_info["count_hits"], cache_info["count_hits"] + 1)
+
+    
+    def test_search_image_records(self):
+        for _image in self.test_images:
+            self.db_manager.add_image(_image)
+        self.db_manager.add_image(random.choice(self.test_videos), is_video=True)
+
+        # Cache the result ids and drop loaded images from the session
+        self.db_manager.search_image_ids([], page=1)
+        self.db_manager.session.expunge_all()
+
+        statements = []
+        for engine in [self.db_manager.engine, self.db_manager.read_engine]:
+            event.listen(
+                engine, "before_cursor_execute",
+                lambda *args: statements.append(args[2])
+            )
+
+        records = self.db_manager.search_image_records([], page=1)
+
+        # One query for the whole page and no ORM objects loaded
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(len(self.db_manager.session.identity_map), 0)
+
+        self.assertEqual(len(records), 3)
+        video_record = records[0]
+        self.assertTrue(video_record.is_video)
+        self.assertEqual(
+            video_record.thumbnail_path,
+            self.db_manager.get_thumbnail_path(video_record.filename)
+        )
+        self.assertEqual(
+            records[1].thumbnail_path,
+            self.db_manager.get_thumbnail_path(records[1].filename)
+        )
+
+        # Stills without a thumbnail are shown by the original
+        os.remove(records[1].thumbnail_path)
+        self.assertEqual(
+            self.db_manager.get_image_record(records[1].id).thumbnail_path,
+            self.db_manager.get_image_path(records[1].filename)
+        )
+
+    
+    def test_session_memory_stays_flat(self):
+        # Insert rows directly since browsing never touches the files
+        with self.db_manager.session_scope() as session:
+            session.execute(insert(Image), [
+                {"filename": f"soak_{i}.jpg", "is_video": False}
+                for i in range(1000)
+            ])
+        self.db_manager._bump_write_generation()
+
+        self.db_manager.SESSION_IDENTITY_LIMIT = 200
+        page_count = 1000 // self.db_manager.DEFAULT_PAGE_SIZE
+
+        def browse(pages: int) -> None:
+            for i in range(pages):
+                page = i % page_count + 1
+                if i % 10 == 0:
+                    self.db_manager.search_images([], page)
+                else:
+                    self.db_manager.search_image_records([], page)
+
+                self.assertLessEqual(
+                    len(self.db_manager.session.identity_map),
+                    self.db_manager.SESSION_IDENTITY_LIMIT + self.db_manager.DEFAULT_PAGE_SIZE
+                )
+
+        try:
+            # Warm up caches before measuring
+            browse(1000)
+            gc.collect()
+            baseline = sys.getallocatedblocks()
+
+            browse(10_000)
+            gc.collect()
+            current = sys.getallocatedblocks()
+        finally:
+            self.db_manager.session.expunge_all()
+            with self.db_manager.session_scope() as session:
+                session.execute(delete(Image).where(Image.filename.like("soak_%")))
+
+        # Allow for some noise from interpreter and driver caches
+        self.assertLess(current - baseline, 5000, "Memory grew while browsing.")
+
+    
+    def test_browse_during_import(self):
+        errors = []
+        counts = []
+        importing = threading.Event()
+        importing.set()
+
+        def browse() -> None:
+            try:
+                while importing.is_set():
+                    count = self.db_manager.count_images([]).count
+                    page_ids = self.db_manager.search_image_ids([], page=1)
+                    self.assertLessEqual(len(page_ids), self.db_manager.DEFAULT_PAGE_SIZE)
+                    counts.append(count)
+            except Exception as e:
+                errors.append(e)
+
+        reader = threading.Thread(target=browse)
+        reader.start()
+
+        try:
+            # Writes from several threads are serialized by the writer
+            def import_rows(batch: int) -> None:
+                self.db_manager.submit_write(lambda session: session.execute(
+                    insert(Image),
+                    [{"filename": f"soak_{batch}_{i}.jpg"} for i in range(50)]
+                )).result()
+
+            import_threads = [
+                threading.Thread(target=import_rows, args=(batch,))
+                for batch in range(20)
+            ]
+            for thread in import_threads:
+                thread.start()
+            for thread in import_threads:
+                thread.join()
+        finally:
+            importing.clear()
+            reader.join()
+
+            self.db_manager.submit_write(lambda session: session.execute(
+                delete(Image).where(Image.filename.like("soak_%"))
+            )).result()
+
+        self.assertEqual(errors, [])
+        # Counts seen while importing only ever grow
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(self.db_manager.count_images([]).count, 0)
+
+    
+    def test_search_cache_invalidated_by_write(self):
+        _image = random.choice(self.test_images)
+        self.db_manager.add_image(_image)
+        db_image = self.db_manager.get_all_images(newest_first=True)[0]
+
+        self.assertEqual(self.db_manager.search_image_ids(["test_tag"], page=1), [])
+
+        generation = self.db_manager.write_generation
+        tag_ = self.db_manager.add_tag("test_tag")
+        self.db_manager.add_tag_to_image(tag_, db_image.id)
+        self.assertGreater(self.db_manager.write_generation, generation)
+
+        self.assertEqual(
+            self.db_manager.search_image_ids(["test_tag"], page=1),
+            [db_image.id]
+        )
+
+    
+    def test_search_images_with_multiple_tags(self):
+        for _image in self.test_images:
+            self.db_manager.add_image(_image)
+        first_image, second_image = self.db_manager.get_all_images()[-2:]
+
+        tag1 = self.db_manager.add_tag("test_tag1")
+        tag2 = self.db_manager.add_tag("test_tag2")
+        self.db_manager.add_tag_to_image(tag1, first_image.id)
+        self.db_manager.add_tag_to_image(tag1, second_image.id)
+        self.db_manager.add_tag_to_image(tag2, second_image.id)
+
+        # Tag order should not matter
+        self.assertEqual(
+            self.db_manager.search_images(["test_tag2", "test_tag1"], page=1),
+            [second_image]
+        )
+        self.assertEqual(
+            self.db_manager.search_images(["test_tag1"], page=1, sort="oldest"),
+            [first_image, second_image]
+        )
+
+
+    def test_count_images(self):
+        for _image in self.test_images:
+            self.db_manager.add_image(_image)
+        first_image, second_image = self.db_manager.get_all_images()[-2:]
+
+        tag1 = self.db_manager.add_tag("test_tag1")
+        tag2 = self.db_manager.add_tag("test_tag2")
+        self.db_manager.add_tag_to_image(tag1, first_image.id)
+        self.db_manager.add_tag_to_image(tag1, second_image.id)
+        self.db_manager.add_tag_to_image(tag2, second_image.id)
+
+        # Large results are reported as a lower bound
+        self.assertEqual(self.db_manager.count_images([], at_least=1), (1, False))
+
+        self.assertEqual(self.db_manager.count_images([]).count, len(self.db_manager.get_all_images()))
+        self.assertEqual(self.db_manager.count_images(["test_tag1"]), (2, True))
+        self.assertEqual(self.db_manager.count_images(["test_tag1"], at_least=1), (2, True))
+        self.assertEqual(self.db_manager.count_images(["test_tag1", "test_tag2"]), (1, True))
+        self.assertEqual(self.db_manager.count_images(["missing_tag"]), (0, True))
+
+
+    def test_insert_media_metadata(self):
+        self.db_manager.add_image(self.test_images[0])
+        self.db_manager.add_image(self.test_videos[0], is_video=True)
+        video, image_ = self.db_manager.get_all_images(newest_first=True)[:2]
+
+        self.assertEqual((image_.width, image_.height), (1200, 800))
+        self.assertEqual(image_.file_size, os.path.getsize(self.test_images[0]))
+        self.assertEqual(image_.mime_type, "image/jpeg")
+        self.assertIsNotNone(image_.imported_at)
+
+        self.assertEqual((video.width, video.height), (700, 394))
+        self.assertEqual(video.frame_count, 944)
+        self.assertAlmostEqual(video.duration, 31.47, places=1)
+
+        record = self.db_manager.get_image_record(video.id)
+        self.assertEqual((record.width, record.height), (700, 394))
+
+
+    def test_search_media_filters(self):
+        self.db_manager.add_image(self.test_images[0])
+        self.db_manager.add_image(self.test_videos[0], is_video=True)
+        video, image_ = self.db_manager.get_all_images(newest_first=True)[:2]
+
+        videos_query = SearchQuery(is_video=True)
+        self.assertEqual(self.db_manager.search_image_ids(videos_query, page=1), [video.id])
+        self.assertEqual(self.db_manager.count_images(videos_query), (1, True))
+        self.assertEqual(
+            self.db_manager.search_image_ids(SearchQuery(mime_type="image/"), page=1),
+            [image_.id]
+        )
+        self.assertEqual(
+            self.db_manager.search_image_ids(SearchQuery(min_width=1000, min_height=800), page=1),
+            [image_.id]
+        )
+        self.assertEqual(
+            self.db_manager.search_image_ids(SearchQuery(min_duration=30, max_duration=40), page=1),
+            [video.id]
+        )
+
+        # Filters combine with tags
+        tag = self.db_manager.add_tag("test_tag")
+        self.db_manager.add_tag_to_image(tag, image_.id)
+        self.db_manager.add_tag_to_image(tag, video.id)
+        self.assertEqual(
+            self.db_manager.count_images(SearchQuery(tags=("test_tag",), is_video=False)),
+            (1, True)
+        )
+
+        # Images without a duration are sorted last
+        self.assertEqual(
+            self.db_manager.search_image_ids(SearchQuery(sort="longest"), page=1)[0],
+            video.id
+        )
+        largest_ids = self.db_manager.search_image_ids(SearchQuery(sort="largest"), page=1)
+        self.assertLess(largest_ids.index(video.id), largest_ids.index(image_.id))
+
+
+    def test_migrate_schema(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'old.db')}")
+            with engine.begin() as connection:
+                connection.execute(text(
+                    "CREATE TABLE image ("
+                    "id INTEGER PRIMARY KEY, "
+                    "filename VARCHAR(255) NOT NULL UNIQUE, "
+                    "is_video BOOLEAN NOT NULL)"
+                ))
+                connection.execute(text(
+                    "INSERT INTO image (filename, is_video) VALUES ('old.jpg', 0)"
+                ))
+
+            migrate_schema(engine)
+
+            columns = {c["name"] for c in inspect(engine).get_columns("image")}
+            self.assertTrue({"width", "height", "file_size", "mime_type", "duration"} <= columns)
+            self.assertIn("ix_image_file_size", {i["name"] for i in inspect(engine).get_indexes("image")})
+
+            # Existing rows are kept with empty metadata
+            with engine.connect() as connection:
+                self.assertEqual(
+                    connection.execute(text("SELECT filename, width FROM image")).all(),
+                    [("old.jpg", None)]
+                )
+
+            # Migrating again does nothing
+            migrate_schema(engine)
+            engine.dispose()
+
+
     def test_remove_tags_from_image(self):
         raise NotImplementedError
     
@@ -321,11 +685,8 @@ class TestDatabase(unittest.TestCase):
         self.db_manager.delete_all_tags()
         self.db_manager.delete_all_images()
 
-        # Clear all images from image directory
-        if os.path.exists(self.db_manager.image_dir_path):
-            shutil.rmtree(self.db_manager.image_dir_path)
-
-        self.db_manager.session.close()
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
 
         # Re-enable logging after running all tests
         logging.disable(logging.NOTSET)
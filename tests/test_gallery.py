@@ -0,0 +1,139 @@
+import logging
+import os
+import unittest
+
+from PyQt6.QtCore import QCoreApplication
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.search import SearchQuery
+from boardy3.database.snapshot import GallerySnapshot, read_snapshot, write_snapshot
+from boardy3.ui.gallery import GALLERY_CELL_SIZE, GalleryLoader, GalleryPage
+from tests import remove_test_library
+
+
+class TestGallery(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Loaded pages are delivered through the event loop
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+
+        self.test_images = [
+            os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg"),
+            os.path.join(os.getcwd(), "tests/static/images", "test_image2.jpg")
+        ]
+        self.test_video = os.path.join(os.getcwd(), "tests/static/videos", "stock_video1.mp4")
+
+        return super().setUp()
+
+
+    def test_snapshot_file(self):
+        self.db_manager.add_image(self.test_images[0])
+        self.db_manager.add_image(self.test_video, is_video=True)
+
+        snapshot = self.db_manager.save_gallery_snapshot(10)
+        self.assertEqual(len(snapshot.records), 2)
+        self.assertEqual(self.db_manager.load_gallery_snapshot(), snapshot)
+
+        # Damaged snapshots are ignored
+        with open(self.db_manager.snapshot_path, "r+b") as outfile:
+            outfile.truncate(os.path.getsize(self.db_manager.snapshot_path) - 1)
+        self.assertIsNone(self.db_manager.load_gallery_snapshot())
+        self.assertIsNone(read_snapshot(self.db_manager.snapshot_path + ".missing"))
+
+        empty = GallerySnapshot(20, [], [])
+        write_snapshot(self.db_manager.snapshot_path, empty)
+        self.assertEqual(read_snapshot(self.db_manager.snapshot_path), empty)
+
+
+    def test_load_page(self):
+        for test_image in self.test_images:
+            self.db_manager.add_image(test_image)
+        self.db_manager.add_image(self.test_video, is_video=True)
+
+        pages = self._load(SearchQuery(), 1, 2)
+        self.assertEqual(len(pages), 1)
+        page = pages[0]
+        self.assertFalse(page.from_snapshot)
+        self.assertEqual(
+            [record.id for record in page.records],
+            list(self.db_manager.get_result_ids(SearchQuery())[:2])
+        )
+        for thumbnail in page.thumbnails:
+            self.assertFalse(thumbnail.isNull())
+            self.assertLessEqual(max(thumbnail.width(), thumbnail.height()), GALLERY_CELL_SIZE)
+
+
+    def test_snapshot_shown_first(self):
+        self.db_manager.add_image(self.test_images[0])
+        self.db_manager.save_gallery_snapshot(2)
+        self.db_manager.add_image(self.test_images[1])
+
+        # The snapshot is shown first, then replaced by the current page.
+        # It is dropped if the query happens to finish first.
+        pages = self._load(SearchQuery(), 1, 2, use_snapshot=True)
+        if len(pages) == 2:
+            self.assertTrue(pages[0].from_snapshot)
+            self.assertEqual(len(pages[0].records), 1)
+        self.assertFalse(pages[-1].from_snapshot)
+        self.assertEqual(len(pages[-1].records), 2)
+
+        # Snapshots of another page size, or for other searches, are not used
+        self.assertFalse(any(page.from_snapshot for page in self._load(SearchQuery(), 1, 3, use_snapshot=True)))
+        self.assertFalse(any(page.from_snapshot for page in self._load(SearchQuery(sort="oldest"), 1, 2, use_snapshot=True)))
+
+
+    def test_only_newest_request_delivered(self):
+        self.db_manager.add_image(self.test_images[0])
+
+        loader = GalleryLoader(self.db_manager)
+        pages: list[GalleryPage] = []
+        loader.page_loaded.connect(pages.append)
+
+        loader.load(SearchQuery(), 1, 10)
+        loader.load(SearchQuery(sort="oldest"), 1, 10)
+        self._wait()
+        self.assertEqual([page.query.sort for page in pages], ["oldest"])
+
+        loader.load(SearchQuery(), 1, 10)
+        loader.stop()
+        self._wait()
+        self.assertEqual(len(pages), 1)
+
+
+    def _load(self, query: SearchQuery, page: int, page_size: int, use_snapshot: bool = False) -> list[GalleryPage]:
+        loader = GalleryLoader(self.db_manager)
+        pages: list[GalleryPage] = []
+        loader.page_loaded.connect(pages.append)
+
+        loader.load(query, page, page_size, use_snapshot)
+        self._wait()
+        return pages
+
+
+    def _wait(self) -> None:
+        GalleryLoader.loader_pool().waitForDone()
+        QCoreApplication.processEvents()
+
+
+    def tearDown(self) -> None:
+        # Let loads still running finish before the database goes away
+        GalleryLoader.loader_pool().waitForDone()
+
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,133 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import select
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.models import ImportJournal
+from tests import remove_test_library
+
+
+class TestImportJournal(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+        self.tmp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(self.db_manager.image_dir_path))
+
+        self.test_image = os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg")
+        self.filename = self.db_manager.sha256_hash_image_data(self.test_image) + ".jpeg"
+        self.staging_path = os.path.join(self.db_manager.staging_dir_path, self.filename)
+
+        return super().setUp()
+
+
+    def test_roll_back_uncommitted_import(self):
+        # Staged and thumbnailed, then the process died before the insert
+        source = self._source_file("moved.jpeg")
+        self._journal(source, "move")
+        os.makedirs(self.db_manager.staging_dir_path, exist_ok=True)
+        os.rename(source, self.staging_path)
+        self.db_manager.generate_thumbnail(self.filename, False, source_path=self.staging_path)
+
+        self.assertEqual(self.db_manager.recover_imports(), 1)
+
+        # The moved file is back where it came from
+        self.assertTrue(os.path.exists(source))
+        self.assertFalse(os.path.exists(self.staging_path))
+        self.assertFalse(os.path.exists(self.db_manager.get_thumbnail_path(self.filename)))
+        self.assertEqual(self._journal_entries(), [])
+
+        self.db_manager.add_image(source, mode="move")
+        self.assertEqual(self.db_manager.get_images_count(), 1)
+        self.assertEqual(self._journal_entries(), [])
+
+
+    def test_finish_committed_import(self):
+        self.db_manager.add_image(self.test_image)
+        save_path = self.db_manager.get_image_path(self.filename)
+
+        # The record was committed, then the process died before the
+        # file was renamed into place
+        os.makedirs(self.db_manager.staging_dir_path, exist_ok=True)
+        os.rename(save_path, self.staging_path)
+
+        self.assertEqual(self.db_manager.recover_imports(), 1)
+        self.assertTrue(os.path.exists(save_path))
+        self.assertFalse(os.path.exists(self.staging_path))
+
+
+    def test_imports_of_other_processes_are_kept(self):
+        self._journal(self._source_file("other.jpeg"), "copy", pid=os.getppid())
+        os.makedirs(self.db_manager.staging_dir_path, exist_ok=True)
+        shutil.copyfile(self.test_image, self.staging_path)
+
+        self.assertEqual(self.db_manager.recover_imports(), 0)
+        self.assertTrue(os.path.exists(self.staging_path))
+        self.assertEqual(self._journal_entries(), [self.filename])
+
+
+    def test_quarantine_unjournaled_file(self):
+        # A power loss rolled back the journal entry of a moved file
+        os.makedirs(self.db_manager.staging_dir_path, exist_ok=True)
+        os.rename(self._source_file("moved.jpeg"), self.staging_path)
+
+        self.assertEqual(self.db_manager.recover_imports(), 1)
+        self.assertFalse(os.path.exists(self.staging_path))
+        self.assertTrue(os.path.exists(os.path.join(self.db_manager.quarantine_dir_path, self.filename)))
+
+
+    def test_replace_orphaned_file(self):
+        # Left by a crash before imports were journaled
+        save_path = self.db_manager.get_image_path(self.filename)
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        with open(save_path, "wb") as outfile:
+            outfile.write(b"partial")
+
+        self.db_manager.add_image(self.test_image)
+        self.assertEqual(self.db_manager.get_images_count(), 1)
+        self.assertEqual(os.path.getsize(save_path), os.path.getsize(self.test_image))
+
+
+    def _source_file(self, name: str) -> str:
+        path = os.path.join(self.tmp_dir.name, name)
+        shutil.copyfile(self.test_image, path)
+        return path
+
+
+    def _journal(self, source_path: str, mode: str, pid: int | None = None) -> None:
+        self.db_manager.submit_write(
+            lambda session: session.merge(ImportJournal(
+                filename=self.filename,
+                source_path=source_path,
+                storage_mode=mode,
+                packed=False,
+                pid=pid or os.getpid()
+            ))
+        ).result()
+
+
+    def _journal_entries(self) -> list[str]:
+        with self.db_manager.read_connection() as connection:
+            return list(connection.execute(select(ImportJournal.filename)).scalars())
+
+
+    def tearDown(self) -> None:
+        self.db_manager.submit_write(lambda session: session.query(ImportJournal).delete()).result()
+
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+
+        # Clear all files and the database itself
+        self.tmp_dir.cleanup()
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,69 @@
+import subprocess
+import sys
+import unittest
+
+from boardy3.utils import LazyModule
+
+
+class TestImportTime(unittest.TestCase):
+    # Modules only some code paths need, which must not slow down start up
+    DEFERRED_MODULES = (
+        "cv2",
+        "numpy",
+        "magic",
+        "requests",
+        "requests_ratelimiter",
+        "PyQt6.QtMultimedia",
+        "PyQt6.QtMultimediaWidgets",
+    )
+    # Seconds the GUI modules may take to import, reported by -X importtime.
+    # About half of it is SQLAlchemy and Qt.
+    MAIN_WINDOW_BUDGET = 1.0
+
+
+    def test_main_window_imports(self):
+        imports = self._import_times("boardy3.ui.main_window")
+
+        for module in self.DEFERRED_MODULES:
+            self.assertNotIn(module, imports)
+        self.assertLess(imports["boardy3.ui.main_window"], self.MAIN_WINDOW_BUDGET)
+
+
+    def test_cli_imports(self):
+        imports = self._import_times(
+            "boardy3.cli", "boardy3.database.importer", "boardy3.database.database_manager"
+        )
+
+        for module in self.DEFERRED_MODULES:
+            self.assertNotIn(module, imports)
+        self.assertFalse(any(module.startswith("PyQt6") for module in imports))
+
+
+    def test_lazy_module(self):
+        # Not imported by the application or the tests
+        colorsys = LazyModule("colorsys")
+        self.assertIn("not loaded", repr(colorsys))
+
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn("(loaded)", repr(colorsys))
+
+
+    @staticmethod
+    def _import_times(*modules: str) -> dict[str, float]:
+        """
+        Import modules in a new interpreter and return the cumulative
+        import time in seconds of every module it imported.
+        """
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+            capture_output=True, text=True, check=True
+        )
+
+        # Lines look like "import time: self [us] | cumulative | name"
+        imports = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            imports[name.strip()] = int(cumulative) / 1_000_000
+        return imports
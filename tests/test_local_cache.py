@@ -0,0 +1,128 @@
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.local_cache import LocalCache
+from tests import remove_test_library
+
+
+class TestLocalCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.library_dir = os.path.join(self.tmp_dir.name, "library")
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        os.makedirs(self.library_dir)
+
+        return super().setUp()
+
+
+    def test_read_through(self):
+        cache = LocalCache(self.cache_dir, 1024)
+        source_path = self._library_file("a", 100)
+
+        # Missed files are read from the library while they are copied
+        self.assertEqual(cache.read_path(source_path), source_path)
+        cache.wait()
+
+        cached_path = cache.read_path(source_path)
+        self.assertNotEqual(cached_path, source_path)
+        self.assertTrue(cached_path.startswith(self.cache_dir))
+        with open(cached_path, "rb") as infile, open(source_path, "rb") as source:
+            self.assertEqual(infile.read(), source.read())
+
+        info = cache.info()
+        self.assertEqual((info["hits"], info["misses"]), (1, 1))
+        self.assertEqual(info["hit_rate"], 0.5)
+        self.assertEqual(info["bytes_saved"], 100)
+        self.assertEqual(info["bytes"], 100)
+
+        cache.remove(source_path)
+        self.assertFalse(os.path.exists(cached_path))
+        self.assertEqual(cache.read_path(source_path), source_path)
+        cache.close()
+
+
+    def test_lru_eviction(self):
+        cache = LocalCache(self.cache_dir, 250)
+        paths = [self._library_file(name, 100) for name in "abc"]
+
+        for path in paths[:2]:
+            cache.populate(path)
+        # Reading "a" leaves "b" the least recently used
+        cache.read_path(paths[0])
+        cache.populate(paths[2])
+
+        self.assertEqual(cache.usage(), 200)
+        self.assertEqual(cache.info()["evictions"], 1)
+        self.assertEqual([self._is_cached(cache, path) for path in paths], [True, False, True])
+
+        # Files larger than the whole budget are never cached
+        self.assertFalse(cache.populate(self._library_file("d", 300)))
+        cache.close()
+
+        # The order is restored from the files after a restart
+        os.utime(cache.get_path(paths[2]), (time.time() - 60, time.time() - 60))
+        cache = LocalCache(self.cache_dir, 250)
+        self.assertEqual(cache.usage(), 200)
+        cache.populate(self._library_file("e", 100))
+        self.assertEqual([self._is_cached(cache, path) for path in paths], [True, False, False])
+        cache.close()
+
+
+    def test_disabled(self):
+        source_path = self._library_file("a", 10)
+        for cache in (LocalCache(None, 1024), LocalCache(self.cache_dir, 0)):
+            self.assertFalse(cache.enabled)
+            self.assertEqual(cache.read_path(source_path), source_path)
+            self.assertFalse(cache.populate(source_path))
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+
+    def test_database_manager(self):
+        db_manager = DatabaseManager(is_test=True, local_cache_dir=self.cache_dir)
+        try:
+            db_manager.add_image(os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg"))
+            record = db_manager.search_image_records([], 1)[0]
+
+            image_path = db_manager.get_image_path(record.filename)
+            self.assertEqual(db_manager.get_cached_image_path(record.filename), image_path)
+            db_manager.local_cache.wait()
+            cached_path = db_manager.get_cached_image_path(record.filename)
+            self.assertNotEqual(cached_path, image_path)
+            self.assertEqual(db_manager.get_local_cache_info()["hits"], 1)
+
+            # Deleted images leave nothing behind in the cache
+            db_manager.delete_image(record.id)
+            self.assertFalse(os.path.exists(cached_path))
+        finally:
+            db_manager.delete_all_images()
+            remove_test_library(db_manager)
+
+
+    def _library_file(self, name: str, size: int) -> str:
+        # Named like stored files, by a content hash. name is a hex digit.
+        path = os.path.join(self.library_dir, f"{name * 64}.jpg")
+        with open(path, "wb") as outfile:
+            outfile.write(os.urandom(size))
+        return path
+
+
+    @staticmethod
+    def _is_cached(cache: LocalCache, path: str) -> bool:
+        return os.path.exists(cache.get_path(path))
+
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
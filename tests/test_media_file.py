@@ -3,7 +3,23 @@ import random
 import os
 import unittest
 
+import tempfile
+
+import cv2
+import numpy as np
+
 from boardy3.database.image_loader import is_image, is_video
+from boardy3.database.media_info import probe_media
+from boardy3.database.thumbnails import (
+    GRID_THUMBNAIL_SIZE,
+    STORYBOARD_FRAME_COUNT,
+    VIDEO_SEEK_THREADS,
+    StoryboardIndex,
+    _seek_slots,
+    create_image_thumbnail,
+    create_storyboard,
+    create_video_thumbnail
+)
 
 
 class TestMediaFile(unittest.TestCase):
@@ -60,4 +76,129 @@ class TestMediaFile(unittest.TestCase):
         ))
         self.assertTrue(all(
             is_video(test_image)==False for test_image in self.test_images_with_incorrect_extensions
-        ))
\ No newline at end of file
+        ))
+
+
+    def test_probe_image(self):
+        for test_image in self.test_images_with_correct_extensions + self.test_images_with_incorrect_extensions:
+            media_info = probe_media(test_image)
+            height, width = cv2.imread(test_image).shape[:2]
+
+            self.assertEqual((media_info.width, media_info.height), (width, height))
+            self.assertEqual(media_info.file_size, os.path.getsize(test_image))
+            self.assertTrue(media_info.mime_type.startswith("image/"))
+            self.assertIsNone(media_info.duration)
+
+
+    def test_probe_truncated_image(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Ends inside the fill bytes before a marker
+            image_path = os.path.join(tmp_dir, "truncated.jpg")
+            with open(image_path, "wb") as outfile:
+                outfile.write(b"\xff\xd8\xff\xff")
+
+            media_info = probe_media(image_path)
+            self.assertIsNone(media_info.width)
+            self.assertEqual(media_info.file_size, 4)
+
+
+    def test_probe_video(self):
+        for test_video in self.test_videos:
+            media_info = probe_media(test_video, is_video=True)
+
+            self.assertGreater(media_info.width, 0)
+            self.assertGreater(media_info.height, 0)
+            self.assertGreater(media_info.frame_count, 0)
+            self.assertGreater(media_info.duration, 0)
+            self.assertTrue(media_info.mime_type.startswith("video/"))
+
+
+    def test_image_thumbnail(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i, test_image in enumerate(self.test_images_with_correct_extensions):
+                thumbnail_path = os.path.join(tmp_dir, f"{i}.jpg")
+                create_image_thumbnail(test_image, thumbnail_path)
+
+                thumbnail = cv2.imread(thumbnail_path)
+                self.assertEqual(max(thumbnail.shape[:2]), GRID_THUMBNAIL_SIZE)
+
+
+    def test_video_thumbnail(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i, test_video in enumerate(self.test_videos):
+                thumbnail_path = os.path.join(tmp_dir, f"{i}.jpg")
+                create_video_thumbnail(test_video, thumbnail_path)
+
+                thumbnail = cv2.imread(thumbnail_path)
+                self.assertEqual(max(thumbnail.shape[:2]), GRID_THUMBNAIL_SIZE)
+
+
+    def test_video_thumbnail_after_deadline(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Takes a frame from the start once the deadline has passed
+            thumbnail_path = os.path.join(tmp_dir, "thumbnail.jpg")
+            create_video_thumbnail(self.test_videos[0], thumbnail_path, deadline=0)
+
+            thumbnail = cv2.imread(thumbnail_path)
+            self.assertEqual(max(thumbnail.shape[:2]), GRID_THUMBNAIL_SIZE)
+
+
+    def test_video_thumbnail_while_seeks_are_stuck(self):
+        # Every slot is held by a search still seeking
+        for _ in range(VIDEO_SEEK_THREADS):
+            _seek_slots.acquire()
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                thumbnail_path = os.path.join(tmp_dir, "thumbnail.jpg")
+                create_video_thumbnail(self.test_videos[0], thumbnail_path)
+                self.assertIsNotNone(cv2.imread(thumbnail_path))
+        finally:
+            for _ in range(VIDEO_SEEK_THREADS):
+                _seek_slots.release()
+
+
+    def test_video_thumbnail_skips_black_frames(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Black for the first 60% of the video
+            video_path = os.path.join(tmp_dir, "fade_in.avi")
+            writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (320, 240))
+            rng = np.random.default_rng(0)
+            for i in range(50):
+                if i < 30:
+                    frame = np.zeros((240, 320, 3), np.uint8)
+                else:
+                    frame = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+                writer.write(frame)
+            writer.release()
+
+            thumbnail_path = os.path.join(tmp_dir, "thumbnail.jpg")
+            create_video_thumbnail(video_path, thumbnail_path)
+
+            thumbnail = cv2.imread(thumbnail_path)
+            self.assertEqual(thumbnail.shape[:2], (188, 250))
+            self.assertGreater(thumbnail.mean(), 16)
+
+
+    def test_video_storyboard(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sprite_path = os.path.join(tmp_dir, "storyboard.jpg")
+            index_path = os.path.join(tmp_dir, "storyboard.json")
+            index = create_storyboard(self.test_videos[0], sprite_path, index_path)
+
+            self.assertEqual(StoryboardIndex.load(index_path), index)
+            self.assertEqual(len(index.timestamps), STORYBOARD_FRAME_COUNT)
+            self.assertEqual(index.timestamps, sorted(index.timestamps))
+
+            sprite = cv2.imread(sprite_path)
+            rows = STORYBOARD_FRAME_COUNT // index.columns
+            self.assertEqual(
+                sprite.shape[:2],
+                (rows * index.tile_height, index.columns * index.tile_width)
+            )
+            self.assertEqual(index.tile_rect(STORYBOARD_FRAME_COUNT - 1)[:2], (
+                (index.columns - 1) * index.tile_width,
+                (rows - 1) * index.tile_height
+            ))
+
+            self.assertEqual(index.frame_at(0), 0)
+            self.assertEqual(index.frame_at(1), STORYBOARD_FRAME_COUNT - 1)
@@ -0,0 +1,80 @@
+import logging
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from boardy3.database.mipmaps import MIPMAP_GROWTH, MIPMAP_SIZE, MISSING_TILE_COLOR, MipmapStore, compose_tiles, create_mipmap
+
+
+class TestMipmaps(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+
+        return super().setUp()
+
+
+    def test_create_mipmap(self):
+        tile = create_mipmap(os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg"))
+
+        self.assertEqual(tile.shape, (MIPMAP_SIZE, MIPMAP_SIZE, 3))
+        self.assertEqual(tile.dtype, np.uint8)
+        self.assertIsNone(create_mipmap(os.path.join(self.directory, "missing.jpg")))
+
+
+    def test_store(self):
+        store = MipmapStore(self.directory, size=4)
+        red = np.zeros((4, 4, 3), dtype=np.uint8)
+        red[..., 0] = 255
+
+        store.put(3, red)
+        # Grows to fit higher ids
+        store.put(MIPMAP_GROWTH + 1, red)
+        self.assertTrue(store.has(3))
+        self.assertFalse(store.has(2))
+        self.assertFalse(store.has(10 * MIPMAP_GROWTH))
+        np.testing.assert_array_equal(store.get(MIPMAP_GROWTH + 1), red)
+
+        tiles, present = store.get_many([3, 2, 10 * MIPMAP_GROWTH])
+        self.assertEqual(present.tolist(), [True, False, False])
+        np.testing.assert_array_equal(tiles[0], red)
+        self.assertEqual(tuple(tiles[1, 0, 0]), MISSING_TILE_COLOR)
+
+        store.remove(3)
+        self.assertFalse(store.has(3))
+        store.close()
+
+        # Tiles are kept on disk
+        store = MipmapStore(self.directory, size=4)
+        self.assertFalse(store.has(3))
+        np.testing.assert_array_equal(store.get(MIPMAP_GROWTH + 1), red)
+        store.close()
+
+        with self.assertRaises(ValueError):
+            MipmapStore(self.directory, size=4).put(1, np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+    def test_compose_tiles(self):
+        tiles = np.stack([np.full((2, 2, 3), i, dtype=np.uint8) for i in range(5)])
+        pixels = compose_tiles(tiles, 3)
+
+        self.assertEqual(pixels.shape, (4, 6, 3))
+        self.assertEqual(pixels[0, :, 0].tolist(), [0, 0, 1, 1, 2, 2])
+        self.assertEqual(pixels[3, :4, 0].tolist(), [3, 3, 4, 4])
+        # The rest of the last row is padded
+        self.assertEqual(tuple(pixels[3, 5]), MISSING_TILE_COLOR)
+
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,145 @@
+import io
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import update
+
+from boardy3.cli import EXIT_OK, main
+from boardy3.database.backfill import BackfillRunner, OriginalPackBackfill
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.exceptions import DatabaseItemExists
+from boardy3.database.models import Image
+from tests import remove_test_library
+
+
+class TestOriginalPack(unittest.TestCase):
+    # Packs test_image2.jpg but not test_image1.jpeg
+    PACK_MAX_BYTES = 64 * 1024
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True, pack_max_bytes=self.PACK_MAX_BYTES)
+
+        self.small_image = os.path.join(os.getcwd(), "tests/static/images", "test_image2.jpg")
+        self.large_image = os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg")
+        self.test_video = os.path.join(os.getcwd(), "tests/static/videos", "stock_video2.mp4")
+
+        return super().setUp()
+
+
+    def test_small_originals_are_packed(self):
+        for test_image in (self.small_image, self.large_image):
+            self.db_manager.add_image(test_image)
+        self.db_manager.add_image(self.test_video, is_video=True)
+        small, large, video = sorted(
+            self.db_manager.search_image_records([], 1),
+            key=lambda record: record.id
+        )
+
+        self.assertTrue(self.db_manager.is_packed(small.filename))
+        self.assertFalse(os.path.exists(self.db_manager.get_image_path(small.filename)))
+        self.assertFalse(self.db_manager.is_packed(large.filename))
+        self.assertFalse(self.db_manager.is_packed(video.filename))
+
+        with open(self.small_image, "rb") as infile:
+            original = infile.read()
+        self.assertEqual(bytes(self.db_manager.read_image_data(small.filename)), original)
+        with self.db_manager.open_image(small.filename) as stream:
+            self.assertEqual(stream.read(), original)
+        with open(self.db_manager.get_cached_image_path(small.filename), "rb") as infile:
+            self.assertEqual(infile.read(), original)
+        with self.db_manager.image_file(small.filename) as image_path:
+            self.assertEqual(os.path.getsize(image_path), len(original))
+        self.assertFalse(os.path.exists(image_path))
+
+        # Packed stills get their thumbnail and media info from the import
+        self.assertTrue(os.path.exists(self.db_manager.get_thumbnail_path(small.filename)))
+        self.assertEqual(self.db_manager.get_image(small.id).file_size, len(original))
+
+        with self.assertRaises(DatabaseItemExists):
+            self.db_manager.add_image(self.small_image)
+
+        self.db_manager.delete_image(small.id)
+        self.assertFalse(self.db_manager.is_packed(small.filename))
+        self.assertEqual(len(self.db_manager.original_pack), 0)
+
+
+    def test_same_content_with_other_extension(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for extension in (".jpeg", ".jpg"):
+                path = os.path.join(tmp_dir, f"copy{extension}")
+                shutil.copyfile(self.small_image, path)
+                self.db_manager.add_image(path)
+        first, second = sorted(self.db_manager.search_image_records([], 1), key=lambda record: record.id)
+
+        # Each row has its own entry, so deleting one keeps the other
+        self.db_manager.delete_image(first.id)
+        with open(self.small_image, "rb") as infile:
+            self.assertEqual(bytes(self.db_manager.read_image_data(second.filename)), infile.read())
+
+
+    def test_repack_existing_originals(self):
+        # Imported before packing was turned on
+        self.db_manager.pack_max_bytes = 0
+        self.db_manager.add_image(self.small_image)
+        self.db_manager.add_image(self.large_image)
+        self.db_manager.pack_max_bytes = self.PACK_MAX_BYTES
+
+        runner = BackfillRunner(self.db_manager, [OriginalPackBackfill(self.db_manager)], idle_delay=0)
+        runner.reset()
+        runner.run()
+
+        small, large = sorted(self.db_manager.search_image_records([], 1), key=lambda record: record.id)
+        self.assertTrue(self.db_manager.is_packed(small.filename))
+        self.assertFalse(os.path.exists(self.db_manager.get_image_path(small.filename)))
+        self.assertTrue(os.path.exists(self.db_manager.get_image_path(large.filename)))
+
+        # Packed originals verify and export like files
+        self.assertEqual(main(["verify", "--hash"], self.db_manager, io.StringIO()), EXIT_OK)
+        with tempfile.TemporaryDirectory() as destination:
+            self.assertEqual(main(["export", destination], self.db_manager, io.StringIO()), EXIT_OK)
+            with open(os.path.join(destination, small.filename), "rb") as exported, \
+                    open(self.small_image, "rb") as original:
+                self.assertEqual(exported.read(), original.read())
+
+
+    def test_repack_after_raising_the_limit(self):
+        self.db_manager.pack_max_bytes = 1024
+        self.db_manager.add_image(self.small_image)
+        # Not probed yet
+        self.db_manager.submit_write(lambda session: session.execute(update(Image).values(file_size=None))).result()
+        record = self.db_manager.search_image_records([], 1)[0]
+
+        runner = BackfillRunner(self.db_manager, [OriginalPackBackfill(self.db_manager)], idle_delay=0)
+        runner.run()
+        self.assertFalse(self.db_manager.is_packed(record.filename))
+
+        # Rows scanned under the old limit are scanned again
+        self.db_manager.pack_max_bytes = self.PACK_MAX_BYTES
+        BackfillRunner(self.db_manager, [OriginalPackBackfill(self.db_manager)], idle_delay=0).run()
+        self.assertTrue(self.db_manager.is_packed(record.filename))
+
+        # Forget the checkpoint saved under the old limit
+        self.db_manager.pack_max_bytes = 1024
+        runner.reset()
+        self.db_manager.pack_max_bytes = self.PACK_MAX_BYTES
+
+
+    def tearDown(self) -> None:
+        BackfillRunner(self.db_manager, [OriginalPackBackfill(self.db_manager)]).reset()
+
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+import tempfile
+import unittest
+
+from boardy3.database.packstore import KEY_SIZE, PackStore, pack_key
+
+
+class TestPackStore(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+
+        return super().setUp()
+
+
+    def test_pack_key(self):
+        digest = hashlib.sha256(b"data").hexdigest()
+
+        self.assertEqual(pack_key(f"{digest}.jpeg"), bytes.fromhex(digest))
+        self.assertEqual(pack_key(f"thumbnails/sample_{digest}.jpg"), pack_key(f"sample_{digest}.jpg"))
+        self.assertEqual(len(pack_key("not_a_digest.png")), KEY_SIZE)
+
+
+    def test_put_and_get(self):
+        store = PackStore(self.directory)
+        store.put(self._key(1), b"first")
+        store.put(self._key(2), b"second")
+
+        self.assertEqual(bytes(store.get(self._key(1))), b"first")
+        self.assertIsNone(store.get(self._key(3)))
+        self.assertIsInstance(store.get(self._key(2)), memoryview)
+
+        # Later puts replace earlier ones
+        store.put(self._key(1), b"replaced")
+        self.assertEqual(bytes(store.get(self._key(1))), b"replaced")
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.dead_bytes(), len(b"first"))
+
+        self.assertEqual(
+            {key: bytes(data) for key, data in store.get_many([self._key(2), self._key(1), self._key(3)]).items()},
+            {self._key(1): b"replaced", self._key(2): b"second"}
+        )
+        store.close()
+
+
+    def test_reopen(self):
+        store = PackStore(self.directory, segment_max_bytes=10)
+        for i in range(5):
+            store.put(self._key(i), b"x" * 6)
+        store.delete(self._key(0))
+        store.close()
+
+        store = PackStore(self.directory, segment_max_bytes=10)
+        self.assertEqual(len(store), 4)
+        self.assertNotIn(self._key(0), store)
+        self.assertEqual(bytes(store.get(self._key(4))), b"x" * 6)
+        # Each entry got its own segment
+        self.assertEqual(store.stats()["segments"], 5)
+        store.close()
+
+
+    def test_torn_writes_are_ignored(self):
+        store = PackStore(self.directory)
+        store.put(self._key(1), b"complete")
+        store.put(self._key(2), b"truncated")
+        store.close()
+
+        # Cut the last entry's data and leave half an index entry behind
+        segment_path = os.path.join(self.directory, "segment_00000.pack")
+        os.truncate(segment_path, os.path.getsize(segment_path) - 1)
+        with open(os.path.join(self.directory, PackStore.INDEX_FILENAME), "ab") as index_file:
+            index_file.write(b"\0" * 10)
+
+        store = PackStore(self.directory)
+        self.assertEqual(bytes(store.get(self._key(1))), b"complete")
+        self.assertIsNone(store.get(self._key(2)))
+        store.close()
+
+
+    def test_compact(self):
+        store = PackStore(self.directory, segment_max_bytes=20)
+        for i in range(6):
+            store.put(self._key(i), bytes([i]) * 8)
+        for i in range(4):
+            store.delete(self._key(i))
+        self.assertTrue(store.should_compact())
+
+        # A view handed out before compacting stays readable
+        view = store.get(self._key(5))
+        self.assertEqual(store.compact(), 32)
+        self.assertEqual(bytes(view), bytes([5]) * 8)
+
+        self.assertFalse(store.should_compact())
+        self.assertEqual(store.dead_bytes(), 0)
+        self.assertEqual(bytes(store.get(self._key(4))), bytes([4]) * 8)
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [PackStore.INDEX_FILENAME, PackStore.LOCK_FILENAME, "segment_00003.pack"]
+        )
+        store.close()
+
+        store = PackStore(self.directory, segment_max_bytes=20)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(bytes(store.get(self._key(5))), bytes([5]) * 8)
+        store.put(self._key(6), b"appended")
+        self.assertEqual(bytes(store.get(self._key(6))), b"appended")
+        store.close()
+
+
+    def test_refresh(self):
+        # Two stores on one directory, as in two processes
+        writer = PackStore(self.directory, segment_max_bytes=20, durable=True)
+        reader = PackStore(self.directory, segment_max_bytes=20)
+        writer.put(self._key(1), b"first")
+        writer.put(self._key(2), b"second")
+        self.assertNotIn(self._key(1), reader)
+
+        reader.refresh()
+        self.assertEqual(bytes(reader.get(self._key(2))), b"second")
+
+        writer.delete(self._key(1))
+        writer.compact()
+        writer.put(self._key(3), b"third")
+        reader.refresh()
+        self.assertEqual(len(reader), 2)
+        self.assertNotIn(self._key(1), reader)
+        self.assertEqual(bytes(reader.get(self._key(3))), b"third")
+
+        writer.close()
+        reader.close()
+
+
+    def test_concurrent_writers(self):
+        # Two stores on one directory, as in two processes
+        first = PackStore(self.directory, segment_max_bytes=20, durable=True)
+        second = PackStore(self.directory, segment_max_bytes=20, durable=True)
+        first.put(self._key(1), b"AAAA")
+        second.put(self._key(2), b"BBBBBB")
+        first.put(self._key(3), b"CCCCCCCCCCCC")
+
+        for store in (first, second):
+            store.refresh()
+            self.assertEqual(bytes(store.get(self._key(1))), b"AAAA")
+            self.assertEqual(bytes(store.get(self._key(2))), b"BBBBBB")
+            self.assertEqual(bytes(store.get(self._key(3))), b"CCCCCCCCCCCC")
+
+        # Reads find the data again after a compaction elsewhere
+        first.delete(self._key(1))
+        first.compact()
+        self.assertEqual(bytes(second.get(self._key(3))), b"CCCCCCCCCCCC")
+        second.put(self._key(4), b"DDDD")
+        self.assertNotIn(self._key(1), second)
+        first.refresh()
+        self.assertEqual(bytes(first.get(self._key(4))), b"DDDD")
+
+        first.close()
+        second.close()
+
+
+    @staticmethod
+    def _key(i: int) -> bytes:
+        return hashlib.sha256(str(i).encode()).digest()
+
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
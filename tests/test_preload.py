@@ -0,0 +1,101 @@
+import logging
+import os
+import unittest
+
+from PyQt6.QtCore import QCoreApplication, QSize
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.search import SearchQuery
+from boardy3.ui.preload import NeighborPreloader, neighbor_ids
+from tests import remove_test_library
+
+
+class TestPreload(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Loaded entries are delivered through the event loop
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+
+        self.test_images = [
+            os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg"),
+            os.path.join(os.getcwd(), "tests/static/images", "test_image2.jpg")
+        ]
+        self.test_video = os.path.join(os.getcwd(), "tests/static/videos", "stock_video1.mp4")
+
+        return super().setUp()
+
+
+    def test_neighbor_ids(self):
+        result_ids = [10, 11, 12, 13, 14]
+
+        self.assertEqual(neighbor_ids(result_ids, 2, 2), [13, 11, 14, 10])
+        self.assertEqual(neighbor_ids(result_ids, 0, 2), [11, 12])
+        self.assertEqual(neighbor_ids(result_ids, 4, 1), [13])
+        self.assertEqual(neighbor_ids([10], 0, 3), [])
+
+
+    def test_preload_neighbors(self):
+        self.db_manager.add_image(self.test_images[0])
+        self.db_manager.add_image(self.test_video, is_video=True)
+        self.db_manager.add_image(self.test_images[1])
+        result_ids = self.db_manager.get_result_ids(SearchQuery(sort="oldest"))
+        image_id, video_id, last_id = result_ids
+
+        tag_ = self.db_manager.add_tag("test_tag")
+        self.db_manager.add_tag_to_image(tag_, image_id)
+
+        preloader = NeighborPreloader(self.db_manager, 400, 400, count=1)
+        preloader.preload(result_ids, 1)
+        self._wait(preloader)
+
+        self.assertEqual(set(preloader.entries), {image_id, last_id})
+        entry = preloader.get(image_id)
+        self.assertEqual(entry.record.id, image_id)
+        self.assertEqual([tag.name for tag in entry.tags], ["test_tag"])
+        # 1200x800 fitted in 400x400
+        self.assertEqual(entry.image.size(), QSize(400, 266))
+        self.assertIsNone(preloader.get(video_id))
+        self.assertEqual((preloader.hits, preloader.misses), (1, 1))
+
+        # Tags written after preloading are read again
+        self.db_manager.add_tag_to_image(self.db_manager.add_tag("another_tag"), image_id)
+        self.assertEqual(
+            [tag.name for tag in preloader.get(image_id).tags],
+            ["another_tag", "test_tag"]
+        )
+
+        # Moving to the start drops the entries that are no longer close
+        preloader.preload(result_ids, 0)
+        self._wait(preloader)
+        self.assertEqual(set(preloader.entries), {video_id})
+        self.assertTrue(preloader.get(video_id).image.isNull())
+
+
+    def _wait(self, preloader: NeighborPreloader) -> None:
+        preloader.preload_pool().waitForDone()
+        QCoreApplication.processEvents()
+
+
+    def tearDown(self) -> None:
+        # Let loads still running finish before the database goes away
+        NeighborPreloader.preload_pool().waitForDone()
+
+        # Clear all images and tags from database
+        self.db_manager.delete_all_tags()
+        self.db_manager.delete_all_images()
+
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,94 @@
+import logging
+import os
+import tempfile
+import unittest
+
+import cv2
+
+from boardy3.database.proxies import PROXY_MAX_SIZE, ProxyStore, create_proxy, needs_proxy
+
+
+class TestProxies(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        # 700x394
+        self.test_video = os.path.join(os.getcwd(), "tests/static/videos", "stock_video1.mp4")
+
+        return super().setUp()
+
+
+    def test_create_proxy(self):
+        proxy_path = os.path.join(self.tmp_dir.name, "proxy.mp4")
+        self.assertTrue(create_proxy(self.test_video, proxy_path))
+
+        cap = cv2.VideoCapture(proxy_path)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        self.assertEqual(width, PROXY_MAX_SIZE)
+        self.assertEqual(height, 360)
+        self.assertEqual(frame_count, 944)
+        self.assertEqual(os.listdir(self.tmp_dir.name), ["proxy.mp4"])
+
+
+    def test_small_video_has_no_proxy(self):
+        proxy_path = os.path.join(self.tmp_dir.name, "proxy.mp4")
+        self.assertFalse(create_proxy(self.test_video, proxy_path, max_size=720))
+        self.assertFalse(os.path.exists(proxy_path))
+
+        self.assertFalse(needs_proxy(640, 360))
+        self.assertTrue(needs_proxy(1920, 1080))
+        self.assertTrue(needs_proxy(None, None))
+
+
+    def test_evict_least_recently_used(self):
+        store = ProxyStore(self.tmp_dir.name, max_bytes=250)
+        filenames = [f"{i}{i}{i}{i}abcdef.mp4" for i in range(3)]
+        for age, filename in zip((300, 200, 100), filenames):
+            proxy_path = store.get_path(filename)
+            os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+            with open(proxy_path, "wb") as outfile:
+                outfile.write(b"\0" * 100)
+            mtime = os.path.getmtime(proxy_path) - age
+            os.utime(proxy_path, (mtime, mtime))
+
+        self.assertEqual(store.usage(), 300)
+        self.assertTrue(store.is_full())
+
+        # Opening the oldest proxy makes it the most recently used
+        self.assertEqual(store.open(filenames[0]), store.get_path(filenames[0]))
+        self.assertEqual(store.evict(), 100)
+
+        self.assertIsNotNone(store.open(filenames[0]))
+        self.assertIsNone(store.open(filenames[1]))
+        self.assertIsNotNone(store.open(filenames[2]))
+        self.assertEqual(store.usage(), 200)
+
+
+    def test_scan_removes_unfinished_proxies(self):
+        store = ProxyStore(self.tmp_dir.name, max_bytes=250)
+        proxy_path = store.get_path("0000abcdef.mp4")
+        os.makedirs(os.path.dirname(proxy_path), exist_ok=True)
+        # Left by a killed run
+        tmp_path = f"{proxy_path}.tmp.mp4"
+        with open(tmp_path, "wb") as outfile:
+            outfile.write(b"\0" * 100)
+
+        self.assertEqual(store.usage(), 0)
+        self.assertFalse(os.path.exists(tmp_path))
+
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
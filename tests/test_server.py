@@ -0,0 +1,141 @@
+import asyncio
+import http.client
+import json
+import logging
+import os
+import sqlite3
+import threading
+import unittest
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.server import IMMUTABLE_CACHE_CONTROL, GalleryServer
+from tests import remove_test_library
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+
+        self.test_images = [
+            os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg"),
+            os.path.join(os.getcwd(), "tests/static/images", "test_image2.jpg")
+        ]
+        self.test_video = os.path.join(os.getcwd(), "tests/static/videos", "stock_video1.mp4")
+
+        # The server runs on its own event loop thread, as under serve()
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+        self.server = GalleryServer(self.db_manager, port=0)
+        asyncio.run_coroutine_threadsafe(self.server.start(), self.loop).result()
+
+        self.connection = http.client.HTTPConnection(self.server.host, self.server.port, timeout=10)
+
+        return super().setUp()
+
+
+    def test_search(self):
+        self.db_manager.add_image(self.test_images[0], tags=["cat"])
+        self.db_manager.add_image(self.test_images[1], tags=["cat", "pet"])
+        self.db_manager.add_image(self.test_video, is_video=True)
+
+        status, headers, body = self._get("/api/search?tag=cat&page_size=1")
+        self.assertEqual(status, 200)
+        result = json.loads(body)
+        self.assertEqual(result["total"], 2)
+        self.assertEqual(len(result["results"]), 1)
+
+        status, _, body = self._get("/api/search?type=videos")
+        self.assertEqual([r["is_video"] for r in json.loads(body)["results"]], [True])
+
+        # Unchanged results revalidate
+        status, _, _ = self._get("/api/search?tag=cat&page_size=1", {"If-None-Match": headers["ETag"]})
+        self.assertEqual(status, 304)
+
+        for path in ("/api/search?sort=sideways", "/api/search?page=0", "/api/search?type=audio"):
+            self.assertEqual(self._get(path)[0], 400)
+
+        image_id = result["results"][0]["id"]
+        status, _, body = self._get(f"/api/images/{image_id}")
+        self.assertEqual(json.loads(body)["tags"], ["cat", "pet"])
+        self.assertEqual(self._get("/api/images/12345")[0], 404)
+
+
+    def test_tags_see_external_writes(self):
+        self.db_manager.add_image(self.test_images[0], tags=["cat"])
+
+        status, _, body = self._get("/api/tags?prefix=c")
+        self.assertEqual(json.loads(body)["tags"], [{"name": "cat", "count": 1}])
+
+        # Written by another process, such as the GUI
+        with sqlite3.connect(self.db_manager.db_filepath) as connection:
+            connection.execute("INSERT INTO tag (name) VALUES ('cow')")
+
+        status, _, body = self._get("/api/tags?prefix=c")
+        self.assertEqual([tag["name"] for tag in json.loads(body)["tags"]], ["cat", "cow"])
+
+
+    def test_files(self):
+        self.db_manager.add_image(self.test_images[0])
+        record = self.db_manager.search_image_records([], 1)[0]
+        with open(self.test_images[0], "rb") as infile:
+            original = infile.read()
+
+        status, headers, body = self._get(f"/images/{record.filename}")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, original)
+        self.assertEqual(headers["Content-Type"], "image/jpeg")
+        self.assertEqual(headers["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(headers["ETag"], f'"{record.filename[:64]}"')
+
+        status, _, body = self._get(f"/images/{record.filename}", {"If-None-Match": headers["ETag"]})
+        self.assertEqual((status, body), (304, b""))
+
+        status, headers, body = self._get(f"/images/{record.filename}", {"Range": "bytes=10-19"})
+        self.assertEqual((status, body), (206, original[10:20]))
+        self.assertEqual(headers["Content-Range"], f"bytes 10-19/{len(original)}")
+        self.assertEqual(self._get(f"/images/{record.filename}", {"Range": "bytes=-5"})[2], original[-5:])
+        self.assertEqual(self._get(f"/images/{record.filename}", {"Range": f"bytes={len(original)}-"})[0], 416)
+
+        status, headers, body = self._get(f"/thumbnails/{record.filename}")
+        self.assertEqual(status, 200)
+        self.assertEqual(bytes(self.db_manager.get_packed_thumbnails([record.filename])[record.filename]), body)
+
+        self.connection.request("HEAD", f"/images/{record.filename}")
+        response = self.connection.getresponse()
+        self.assertEqual(response.read(), b"")
+        self.assertEqual(int(response.getheader("Content-Length")), len(original))
+
+        # Only stored files are served
+        for path in ("/images/..%2F..%2Fimage_database.db", f"/images/{'0' * 64}.jpg", "/unknown"):
+            self.assertEqual(self._get(path)[0], 404)
+
+
+    def _get(self, path: str, headers: dict[str, str] | None = None) -> tuple[int, dict[str, str], bytes]:
+        self.connection.request("GET", path, headers=headers or {})
+        response = self.connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+
+
+    def tearDown(self) -> None:
+        self.connection.close()
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+        self.loop.close()
+
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+        self.db_manager.delete_all_tags()
+
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,115 @@
+import logging
+import os
+import random
+import unittest
+
+from PyQt6.QtCore import QCoreApplication, QSize
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.search import SearchQuery
+from boardy3.ui.slideshow import LATE_TOLERANCE, SlideshowQueue, SlideshowStats
+from tests import remove_test_library
+
+
+class TestSlideshow(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Decoded slides are delivered through the event loop
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+
+        for filename in ("test_image1.jpeg", "test_image2.jpg"):
+            self.db_manager.add_image(os.path.join(os.getcwd(), "tests/static/images", filename))
+        self.db_manager.add_image(
+            os.path.join(os.getcwd(), "tests/static/videos", "stock_video1.mp4"),
+            is_video=True
+        )
+        self.result_ids = list(self.db_manager.get_result_ids(SearchQuery(sort="oldest")))
+
+        return super().setUp()
+
+
+    def test_decode_ahead_is_bounded(self):
+        queue = SlideshowQueue(self.db_manager, self.result_ids, QSize(300, 300), ahead=2)
+        self.assertEqual(queue.in_flight(), 2)
+        self._wait(queue)
+
+        sizes = []
+        for _ in range(7):
+            image = queue.take()
+            self.assertIsNotNone(image)
+            sizes.append(image.size())
+            self.assertLessEqual(queue.in_flight(), 2)
+            self._wait(queue)
+
+        # Slides are fitted to the screen and loop over the results in
+        # order. The first image is 1200x800.
+        self.assertEqual(sizes[0], QSize(300, 200))
+        self.assertTrue(all(max(size.width(), size.height()) == 300 for size in sizes))
+        self.assertEqual(sizes[3:6], sizes[0:3])
+
+
+    def test_missing_slides_are_dropped(self):
+        self.db_manager.delete_image(self.result_ids[1])
+
+        queue = SlideshowQueue(self.db_manager, self.result_ids, QSize(300, 300), ahead=3)
+        self._wait(queue)
+
+        self.assertEqual(queue.take().size(), QSize(300, 200))
+        # The deleted image is skipped
+        self.assertIsNotNone(queue.take())
+        self.assertEqual(queue.dropped, 1)
+
+
+    def test_shuffle(self):
+        queue = SlideshowQueue(
+            self.db_manager, self.result_ids, QSize(300, 300),
+            shuffle=True, rng=random.Random(1)
+        )
+
+        expected = list(self.result_ids)
+        random.Random(1).shuffle(expected)
+        self.assertEqual(queue.order, expected)
+
+        # Nothing is decoded once stopped
+        queue.stop()
+        self._wait(queue)
+        self.assertIsNone(queue.take())
+
+
+    def test_stats(self):
+        stats = SlideshowStats()
+        stats.add_shown(0.0)
+        stats.add_shown(LATE_TOLERANCE / 2)
+        stats.add_shown(0.5)
+
+        self.assertEqual((stats.shown, stats.late), (3, 1))
+        self.assertEqual(stats.worst_lateness, 0.5)
+
+
+    def _wait(self, queue: SlideshowQueue) -> None:
+        queue.decode_pool().waitForDone()
+        QCoreApplication.processEvents()
+
+
+    def tearDown(self) -> None:
+        # Let loads still running finish before the database goes away
+        SlideshowQueue.decode_pool().waitForDone()
+
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+
+        # Clear all files and the database itself
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
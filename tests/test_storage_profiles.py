@@ -0,0 +1,106 @@
+import logging
+import os
+import random
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import create_engine, insert, select, text
+
+from boardy3.database.models import Base, Image
+from boardy3.database.storage import STORAGE_PROFILES, configure_engine, get_storage_profile
+
+
+class TestStorageProfiles(unittest.TestCase):
+    # Rows ingested with one commit each, like per-image imports
+    INGEST_ROWS = 300
+    # Pages read per query benchmark
+    QUERY_PAGES = 300
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        return super().setUp()
+
+
+    def test_profile_applied_on_checkout(self):
+        profile = get_storage_profile("durable")
+        engine = self._create_engine("switch.db", lambda: profile)
+
+        with engine.connect() as connection:
+            # FULL
+            self.assertEqual(connection.scalar(text("PRAGMA synchronous")), 2)
+            self.assertEqual(connection.scalar(text("PRAGMA journal_mode")), "wal")
+
+        # Pooled connections pick up a new profile on the next checkout
+        profile = get_storage_profile("bulk-import")
+        with engine.connect() as connection:
+            # OFF
+            self.assertEqual(connection.scalar(text("PRAGMA synchronous")), 0)
+
+        engine.dispose()
+
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            get_storage_profile("missing")
+
+
+    def test_benchmark_profiles(self):
+        results = []
+        for name, profile in STORAGE_PROFILES.items():
+            engine = self._create_engine(f"{name}.db", lambda: profile)
+            Base.metadata.create_all(engine)
+
+            # Ingest throughput
+            start = time.perf_counter()
+            for i in range(self.INGEST_ROWS):
+                with engine.begin() as connection:
+                    connection.execute(insert(Image).values(filename=f"{name}_{i}.jpg"))
+            ingest_rate = self.INGEST_ROWS / (time.perf_counter() - start)
+
+            # Query throughput
+            page_count = self.INGEST_ROWS // 20
+            start = time.perf_counter()
+            with engine.connect() as connection:
+                for _ in range(self.QUERY_PAGES):
+                    page_ids = connection.scalars(
+                        select(Image.id)
+                        .order_by(Image.id.desc())
+                        .offset(random.randrange(page_count) * 20)
+                        .limit(20)
+                    ).all()
+                    self.assertEqual(len(page_ids), 20)
+            query_rate = self.QUERY_PAGES / (time.perf_counter() - start)
+
+            with engine.connect() as connection:
+                self.assertEqual(
+                    connection.scalar(select(Image.id).order_by(Image.id.desc()).limit(1)),
+                    self.INGEST_ROWS
+                )
+
+            engine.dispose()
+            results.append((name, ingest_rate, query_rate))
+
+        print()
+        print(f"{'profile':<12} {'ingest rows/s':>14} {'query pages/s':>14}")
+        for name, ingest_rate, query_rate in results:
+            print(f"{name:<12} {ingest_rate:>14.0f} {query_rate:>14.0f}")
+
+
+    def _create_engine(self, filename: str, get_profile):
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, filename)}")
+        configure_engine(engine, get_profile)
+        return engine
+
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
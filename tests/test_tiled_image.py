@@ -0,0 +1,89 @@
+import logging
+import os
+import unittest
+
+from PyQt6.QtCore import QRect, QRectF, QSize
+from PyQt6.QtGui import QImage
+
+from boardy3.ui.tiled_image import TILE_SIZE, TileCache, _DecodeSignals, _RegionDecode, tile_level, tile_rect, tiles_for_rect
+
+
+class TestTiledImage(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        # 1200x800
+        self.test_image = os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg")
+
+        return super().setUp()
+
+
+    def test_tile_level(self):
+        self.assertEqual(tile_level(4.0), 1)
+        self.assertEqual(tile_level(1.0), 1)
+        self.assertEqual(tile_level(0.6), 1)
+        self.assertEqual(tile_level(0.5), 2)
+        self.assertEqual(tile_level(0.3), 2)
+        self.assertEqual(tile_level(0.1), 8)
+
+
+    def test_tiles_for_rect(self):
+        image_size = QSize(1200, 800)
+
+        self.assertEqual(
+            tiles_for_rect(QRectF(0, 0, 1200, 800), image_size, 1),
+            [(1, 0, 0), (1, 1, 0), (1, 2, 0), (1, 0, 1), (1, 1, 1), (1, 2, 1)]
+        )
+        self.assertEqual(tiles_for_rect(QRectF(600, 100, 100, 100), image_size, 1), [(1, 1, 0)])
+        self.assertEqual(tiles_for_rect(QRectF(0, 0, 1200, 800), image_size, 2), [(2, 0, 0), (2, 1, 0)])
+
+        # Edge tiles are cut to the image
+        self.assertEqual(tile_rect((1, 2, 1), image_size), QRect(1024, 512, 176, 288))
+
+
+    def test_region_decode(self):
+        decoded = []
+        signals = _DecodeSignals()
+        signals.decoded.connect(lambda key, generation, image: decoded.append((key, image)))
+
+        key = (2, 1, 0)
+        clip_rect = tile_rect(key, QSize(1200, 800))
+        _RegionDecode(self.test_image, key, clip_rect, QSize(88, 400), signals).run()
+
+        self.assertEqual(len(decoded), 1)
+        self.assertEqual(decoded[0][0], key)
+        self.assertEqual(decoded[0][1].size(), QSize(88, 400))
+
+        # Cancelled tiles are skipped, the whole image is not
+        cancelled = _RegionDecode(self.test_image, key, clip_rect, QSize(88, 400), signals)
+        base = _RegionDecode(self.test_image, None, None, QSize(300, 200), signals)
+        signals.generation += 1
+        cancelled.run()
+        base.run()
+
+        self.assertEqual(len(decoded), 2)
+        self.assertIsNone(decoded[1][0])
+
+
+    def test_tile_cache_memory_bound(self):
+        tile_bytes = QImage(TILE_SIZE, TILE_SIZE, QImage.Format.Format_RGB32).sizeInBytes()
+        cache = TileCache(max_bytes=tile_bytes * 3)
+
+        for column in range(4):
+            cache.put((1, column, 0), QImage(TILE_SIZE, TILE_SIZE, QImage.Format.Format_RGB32))
+            # Keep the first tile in use
+            cache.get((1, 0, 0))
+
+        self.assertEqual(len(cache), 3)
+        self.assertLessEqual(cache.bytes, cache.max_bytes)
+        self.assertIn((1, 0, 0), cache)
+        self.assertNotIn((1, 1, 0), cache)
+
+
+    def tearDown(self) -> None:
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
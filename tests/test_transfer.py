@@ -0,0 +1,106 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.exceptions import ThumbnailCreationException
+from boardy3.database.transfer import transfer_file
+from tests import remove_test_library
+
+
+class TestTransfer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+        # On the library's filesystem, so links do not fall back to copies
+        self.tmp_dir = tempfile.TemporaryDirectory(dir=os.path.dirname(self.db_manager.image_dir_path))
+
+        self.test_image = os.path.join(os.getcwd(), "tests/static/images", "test_image1.jpeg")
+        with open(self.test_image, "rb") as infile:
+            self.original = infile.read()
+
+        return super().setUp()
+
+
+    def test_transfer_modes(self):
+        for mode in ("copy", "reflink", "hardlink", "move"):
+            source = self._source_file(f"{mode}.jpeg")
+            destination = os.path.join(self.tmp_dir.name, f"{mode}_stored.jpeg")
+
+            used_mode = transfer_file(source, destination, mode)
+            with open(destination, "rb") as infile:
+                self.assertEqual(infile.read(), self.original)
+
+            if mode == "reflink":
+                # Falls back to a copy where the filesystem cannot clone
+                self.assertIn(used_mode, ("reflink", "copy"))
+            else:
+                self.assertEqual(used_mode, mode)
+            self.assertEqual(os.path.exists(source), mode != "move")
+            if mode == "hardlink":
+                self.assertTrue(os.path.samefile(source, destination))
+            elif mode != "move":
+                self.assertFalse(os.path.samefile(source, destination))
+
+        with self.assertRaises(ValueError):
+            transfer_file(self._source_file("other.jpeg"), destination, "symlink")
+
+
+    def test_import_modes(self):
+        source = self._source_file("linked.jpeg")
+        self.db_manager.add_image(source, mode="hardlink")
+        record = self.db_manager.search_image_records([], 1)[0]
+
+        self.assertEqual(self.db_manager.get_image(record.id).storage_mode, "hardlink")
+        self.assertTrue(os.path.samefile(source, self.db_manager.get_image_path(record.filename)))
+
+        # Deleting drops the library's link only
+        self.db_manager.delete_image(record.id)
+        self.assertFalse(os.path.exists(self.db_manager.get_image_path(record.filename)))
+        with open(source, "rb") as infile:
+            self.assertEqual(infile.read(), self.original)
+
+        self.db_manager.add_image(source, mode="move")
+        record = self.db_manager.search_image_records([], 1)[0]
+        self.assertEqual(self.db_manager.get_image(record.id).storage_mode, "move")
+        self.assertFalse(os.path.exists(source))
+
+
+    def test_failed_move_is_undone(self):
+        # Not a video, so creating its thumbnail fails
+        source = os.path.join(self.tmp_dir.name, "broken.mp4")
+        with open(source, "wb") as outfile:
+            outfile.write(b"not a video" * 100)
+
+        with self.assertRaises(ThumbnailCreationException):
+            self.db_manager.add_image(source, is_video=True, mode="move")
+
+        self.assertTrue(os.path.exists(source))
+        self.assertEqual(self.db_manager.get_images_count(), 0)
+        for _, _, filenames in os.walk(self.db_manager.image_dir_path):
+            self.assertEqual(filenames, [])
+
+
+    def _source_file(self, name: str) -> str:
+        path = os.path.join(self.tmp_dir.name, name)
+        shutil.copyfile(self.test_image, path)
+        return path
+
+
+    def tearDown(self) -> None:
+        # Clear all images from database
+        self.db_manager.delete_all_images()
+
+        # Clear all files and the database itself
+        self.tmp_dir.cleanup()
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()
@@ -0,0 +1,80 @@
+import logging
+import threading
+import unittest
+
+from sqlalchemy import select, text
+
+from boardy3.database.database_manager import DatabaseManager
+from boardy3.database.models import Tag
+from boardy3.database.writer import DatabaseWriter
+from tests import remove_test_library
+
+
+class TestWriter(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Disable logging during testing
+        logging.disable(logging.ERROR)
+
+        self.db_manager = DatabaseManager(is_test=True)
+        self.commits = 0
+
+        return super().setUp()
+
+
+    def test_group_commit(self):
+        writer = DatabaseWriter(self.db_manager.session_factory, on_commit=self._count_commit, name="test-writer")
+        started, release = threading.Event(), threading.Event()
+
+        # Jobs queue up behind the first one
+        first = writer.submit(lambda session: started.set() or release.wait())
+        started.wait()
+        futures = [writer.submit(self._insert_tag(name)) for name in ("a", "b", "a", "c")]
+        release.set()
+        writer.drain()
+
+        self.assertTrue(first.result())
+        self.assertEqual(self.commits, 2)
+        self.assertIsInstance(futures[0].result(), int)
+        # A failed job only rolls back its own writes
+        self.assertIsNotNone(futures[2].exception())
+        with self.db_manager.read_connection() as connection:
+            names = connection.execute(select(Tag.name).order_by(Tag.name)).scalars().all()
+        self.assertEqual(names, ["a", "b", "c"])
+
+        writer.close()
+
+
+    def test_durable_jobs_sync_fully(self):
+        writer = DatabaseWriter(self.db_manager.session_factory, name="test-writer")
+        synchronous = lambda session: session.execute(text("PRAGMA synchronous")).scalar()
+
+        self.assertEqual(writer.submit(synchronous, durable=True).result(), 2)
+        # Later jobs go back to the connection's own setting
+        self.assertNotEqual(writer.submit(synchronous).result(), 2)
+
+        writer.close()
+
+
+    def _count_commit(self) -> None:
+        self.commits += 1
+
+
+    @staticmethod
+    def _insert_tag(name: str):
+        def insert(session) -> int:
+            tag = Tag(name=name)
+            session.add(tag)
+            session.flush()
+            return int(tag.id)
+        return insert
+
+
+    def tearDown(self) -> None:
+        self.db_manager.delete_all_tags()
+        remove_test_library(self.db_manager)
+
+        # Re-enable logging after running all tests
+        logging.disable(logging.NOTSET)
+
+        return super().tearDown()